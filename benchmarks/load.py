@@ -0,0 +1,423 @@
+""" End-to-end load benchmark.
+
+Starts the server the way `tests/integration/test_integration.py` does,
+with a callback receiver next to it and a throwaway `redis-server` on its
+own port, then drives a weighted mix of /testset, /submit and /subscribe
+requests at a fixed rate for a while:
+
+    python -m benchmarks.load --rate 20 --duration 30 \\
+        --mix testset=1,submit=8,subscribe=1 --json result.json
+
+Reported are the throughput of submissions, the end-to-end latency of a
+submission (submit sent -> final callback received), the latency of every
+request kind and the time spent per phase of the testing as seen through
+the callbacks. Given `--baseline` with the json of an earlier run, the
+exit code is 1 if the throughput dropped or the p99 latency grew by more
+than `--tolerance`.
+"""
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import subprocess
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from aiohttp import web, ClientSession, TCPConnector
+import redis.asyncio
+
+import main
+from config import TestingConfig
+
+
+HOST = "localhost"
+SERVER_PORT = 8090
+RECEIVER_PORT = 8091
+REDIS_PORT = 6390
+SERVER_URL = f"http://{HOST}:{SERVER_PORT}"
+RECEIVER_URL = f"http://{HOST}:{RECEIVER_PORT}"
+# Sources with their test sets, a directory with `source` and
+# `testset.json` each.
+DATA_DIRS = (Path(__file__).resolve().parent / "data",
+             Path(__file__).resolve().parent.parent / "tests" / "integration"
+             / "data")
+
+FINAL_STATUSES = ("Finished", "CompilationFailed", "Failed")
+# Status reached at the start of the phase, in order.
+PHASES = (("queued", "Waiting"), ("compilation", "Compilation"),
+          ("running", "Running"))
+OPERATIONS = ("testset", "submit", "subscribe")
+
+
+class BenchmarkConfig(TestingConfig):
+
+    REDIS_PORT              = REDIS_PORT
+    # Every status change is a callback, so the phases can be timed.
+    NOTIFY_INTERVAL         = 0
+    SCHEDULER_QUEUE_SIZE    = 1 << 16
+
+
+class RedisStandIn:
+    """ A `redis-server` without persistence on `port`, or nothing if
+    `external` is set and the configured Redis is used instead. """
+
+    port: int
+    external: bool
+    proc: Optional[subprocess.Popen] = None
+
+    def __init__(self, port: int, external: bool = False):
+        self.port = port
+        self.external = external
+
+    async def __aenter__(self):
+        if self.external:
+            return self
+        if not (binary := shutil.which("redis-server")):
+            sys.exit("redis-server isn't installed, use --external-redis")
+        self.proc = subprocess.Popen(
+            [binary, "--port", str(self.port), "--save", "",
+             "--appendonly", "no"],
+            stdout=subprocess.DEVNULL)
+        r = redis.asyncio.Redis(host=HOST, port=self.port)
+        try:
+            for _ in range(50):
+                try:
+                    await r.ping()
+                    return self
+                except redis.exceptions.ConnectionError:
+                    await asyncio.sleep(0.1)
+        finally:
+            await r.aclose()
+        self.proc.kill()
+        sys.exit("redis-server didn't start")
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.proc is not None:
+            self.proc.terminate()
+            self.proc.wait()
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """ Nearest-rank percentile, `q` in [0, 100]. """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summary(values: List[float]) -> Dict:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+@dataclass
+class Submission:
+
+    sent_at: float
+    accepted_at: Optional[float] = None
+    # Monotonic time each status was first reported at.
+    statuses: Dict[str, float] = field(default_factory=dict)
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+    @property
+    def final_at(self) -> Optional[float]:
+        return next((self.statuses[s] for s in FINAL_STATUSES
+                     if s in self.statuses), None)
+
+    def phases(self) -> Dict[str, float]:
+        """ Seconds spent in every phase whose start and end were both
+        reported. """
+        marks = [(name, self.statuses.get(status) if status != "Waiting"
+                  else self.accepted_at) for name, status in PHASES]
+        marks.append(("final", self.final_at))
+        phases = dict()
+        for (name, start), (_, end) in zip(marks, marks[1:]):
+            if start is not None and end is not None:
+                phases[name] = end - start
+        return phases
+
+
+class LoadBenchmark:
+
+    source: str
+    testset: Dict
+    rate: float
+    duration: float
+    mix: Dict[str, float]
+    rng: random.Random
+    session: ClientSession
+    testset_ids: List[str]
+    submissions: Dict[str, Submission]
+    latencies: Dict[str, List[float]]
+    errors: Dict[str, Dict[str, int]]
+    # Statuses reported before the response to the submit request came.
+    early: Dict[str, Dict[str, float]]
+    callbacks: int = 0
+    lag: float = 0.0
+
+    def __init__(self, source: str, testset: Dict, rate: float,
+            duration: float, mix: Dict[str, float], seed: int):
+        self.source = source
+        self.testset = testset
+        self.rate = rate
+        self.duration = duration
+        self.mix = mix
+        self.rng = random.Random(seed)
+        self.testset_ids = list()
+        self.submissions = dict()
+        self.latencies = {op: [] for op in OPERATIONS}
+        self.errors = {op: {} for op in OPERATIONS}
+        self.early = dict()
+
+    def receiver(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([web.post("/{kind}/{submition_id}", self.__callback)])
+        return app
+
+    async def __callback(self, request):
+        now = time.monotonic()
+        self.callbacks += 1
+        report = await request.json()
+        _id = request.match_info["submition_id"]
+        if request.match_info["kind"] != "submit":
+            return web.Response(status=200)
+        if (sub := self.submissions.get(_id)) is None:
+            self.early.setdefault(_id, {}).setdefault(report["status"], now)
+            return web.Response(status=200)
+        sub.statuses.setdefault(report["status"], now)
+        if report["status"] in FINAL_STATUSES:
+            sub.done.set()
+        return web.Response(status=200)
+
+    async def __post(self, op: str, path: str, obj: Dict) -> Optional[Dict]:
+        started_at = time.monotonic()
+        try:
+            async with self.session.post(f"{SERVER_URL}{path}", json=obj) as resp:
+                body = await resp.read()
+                status = resp.status
+        except Exception as err:
+            status = type(err).__name__
+        self.latencies[op].append(time.monotonic() - started_at)
+        if status != 200:
+            self.errors[op][str(status)] = self.errors[op].get(str(status), 0) + 1
+            return None
+        return json.loads(body) if body else {}
+
+    async def upload(self):
+        if resp := await self.__post("testset", "/testset", self.testset):
+            self.testset_ids.append(resp["_id"])
+
+    async def submit(self):
+        sub = Submission(sent_at=time.monotonic())
+        resp = await self.__post("submit", "/submit", {
+            "testset_id": self.rng.choice(self.testset_ids),
+            "language": "python3",
+            "source": self.source,
+            "callback_url_template": f"{RECEIVER_URL}/submit/$submition_id"})
+        if resp is not None:
+            sub.accepted_at = time.monotonic()
+            sub.statuses = self.early.pop(resp["id"], {})
+            if sub.final_at is not None:
+                sub.done.set()
+            self.submissions[resp["id"]] = sub
+
+    async def subscribe(self):
+        running = [_id for _id, sub in self.submissions.items()
+                   if not sub.done.is_set()]
+        if not running:
+            return
+        _id = self.rng.choice(running)
+        await self.__post("subscribe", "/subscribe", {
+            "submition_id": _id,
+            "callback_url": f"{RECEIVER_URL}/subscribe/{_id}"})
+
+    async def run(self, warmup_testsets: int, drain_timeout: float) -> Dict:
+        async with ClientSession(connector=TCPConnector(limit=0)) as session:
+            self.session = session
+            setup_started = time.monotonic()
+            await asyncio.gather(*(self.upload()
+                                   for _ in range(warmup_testsets)))
+            if not self.testset_ids:
+                sys.exit("Couldn't upload a test set")
+            setup_time = time.monotonic() - setup_started
+            for op in OPERATIONS:
+                self.latencies[op].clear()
+            methods = {"testset": self.upload, "submit": self.submit,
+                       "subscribe": self.subscribe}
+            ops = [op for op in OPERATIONS if self.mix.get(op)]
+            weights = [self.mix[op] for op in ops]
+            tasks = set()
+            started_at = time.monotonic()
+            sent = 0
+            while (now := time.monotonic()) < started_at + self.duration:
+                # Behind the schedule if the loop can't keep up the rate.
+                self.lag = max(self.lag, now - (started_at + sent / self.rate))
+                task = asyncio.create_task(
+                    methods[self.rng.choices(ops, weights)[0]]())
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                sent += 1
+                await asyncio.sleep(max(0.0,
+                    started_at + sent / self.rate - time.monotonic()))
+            driving_time = time.monotonic() - started_at
+            if tasks:
+                await asyncio.gather(*tasks)
+            pending = [sub.done.wait() for sub in self.submissions.values()]
+            try:
+                await asyncio.wait_for(asyncio.gather(*pending), drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+            total_time = time.monotonic() - started_at
+            async with session.get(f"{SERVER_URL}/stats") as resp:
+                server_stats = await resp.json()
+        return self.report(sent, setup_time, driving_time, total_time,
+                           server_stats)
+
+    def report(self, sent: int, setup_time: float, driving_time: float,
+            total_time: float, server_stats: Dict) -> Dict:
+        finished = [sub for sub in self.submissions.values()
+                    if sub.final_at is not None]
+        phases = {name: [] for name, _ in PHASES}
+        for sub in finished:
+            for name, seconds in sub.phases().items():
+                phases[name].append(seconds)
+        return {
+            "rate": self.rate,
+            "sent": sent,
+            "achieved_rate": sent / driving_time,
+            "max_lag": self.lag,
+            "setup_time": setup_time,
+            "total_time": total_time,
+            "submissions": {
+                "accepted": len(self.submissions),
+                "finished": len(finished),
+                "lost": len(self.submissions) - len(finished),
+                "statuses": {s: sum(1 for sub in finished if s in sub.statuses)
+                             for s in FINAL_STATUSES},
+            },
+            "throughput": len(finished) / total_time,
+            "end_to_end": summary([sub.final_at - sub.sent_at for sub in finished]),
+            "requests": {op: summary(v) for op, v in self.latencies.items()},
+            "errors": self.errors,
+            "phases": {name: summary(v) for name, v in phases.items()},
+            "callbacks": self.callbacks,
+            "server": server_stats,
+        }
+
+
+def print_report(result: Dict):
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:9.1f}"
+
+    subs = result["submissions"]
+    print(f"sent {result['sent']} requests at {result['achieved_rate']:.1f}/s "
+          f"(target {result['rate']:.1f}/s, max lag {ms(result['max_lag']).strip()} ms)")
+    print(f"submissions: {subs['accepted']} accepted, {subs['finished']} "
+          f"finished, {subs['lost']} lost, {result['throughput']:.2f}/s")
+    print(f"{'':>16} {'count':>7} {'mean':>9} {'p50':>9} {'p90':>9} "
+          f"{'p99':>9} {'max':>9}  (ms)")
+    rows = [("end-to-end", result["end_to_end"])]
+    rows += [(f"{op} request", s) for op, s in result["requests"].items()]
+    rows += [(f"{name} phase", s) for name, s in result["phases"].items()]
+    for name, s in rows:
+        print(f"{name:>16} {s['count']:>7} {ms(s['mean'])} {ms(s['p50'])} "
+              f"{ms(s['p90'])} {ms(s['p99'])} {ms(s['max'])}")
+    for op, errors in result["errors"].items():
+        if errors:
+            print(f"{op} errors: {errors}")
+
+
+def regressions(result: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    found = list()
+    if result["throughput"] < baseline["throughput"] * (1 - tolerance):
+        found.append(f"throughput {result['throughput']:.2f}/s, baseline "
+                     f"{baseline['throughput']:.2f}/s")
+    p99, base_p99 = result["end_to_end"]["p99"], baseline["end_to_end"]["p99"]
+    if p99 is not None and base_p99 is not None \
+            and p99 > base_p99 * (1 + tolerance):
+        found.append(f"end-to-end p99 {p99:.3f}s, baseline {base_p99:.3f}s")
+    return found
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = dict()
+    for part in text.split(","):
+        op, _, weight = part.partition("=")
+        if op not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {op}")
+        mix[op] = float(weight or 1)
+    if not mix.get("submit"):
+        raise argparse.ArgumentTypeError("The mix needs submissions")
+    return mix
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=10,
+                        help="requests per second")
+    parser.add_argument("--duration", type=float, default=10,
+                        help="seconds of load")
+    parser.add_argument("--mix", type=parse_mix,
+                        default=parse_mix("testset=1,submit=8,subscribe=1"))
+    parser.add_argument("--data", default="sum",
+                        help="source and test set, a directory of "
+                             + " or ".join(map(str, DATA_DIRS)))
+    parser.add_argument("--testsets", type=int, default=4,
+                        help="test sets uploaded before the load")
+    parser.add_argument("--drain-timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--config", default="benchmarks.load:BenchmarkConfig",
+                        help="server config, module:Class")
+    parser.add_argument("--external-redis", action="store_true",
+                        help="use the Redis of the config instead of starting one")
+    parser.add_argument("--json", type=Path, help="write the result here")
+    parser.add_argument("--baseline", type=Path,
+                        help="json of an earlier run to compare to")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    return parser.parse_args(argv)
+
+
+async def benchmark(args: argparse.Namespace) -> Dict:
+    data_dir = next((d / args.data for d in DATA_DIRS
+                     if (d / args.data / "source").exists()), None)
+    if data_dir is None:
+        sys.exit(f"No {args.data} data")
+    source = (data_dir / "source").read_text()
+    testset = json.loads((data_dir / "testset.json").read_text())
+    bench = LoadBenchmark(source, testset, args.rate, args.duration,
+                          args.mix, args.seed)
+    async with RedisStandIn(REDIS_PORT, args.external_redis):
+        server = web.AppRunner(main.main(["--config", args.config]))
+        receiver = web.AppRunner(bench.receiver())
+        for runner, port in ((server, SERVER_PORT), (receiver, RECEIVER_PORT)):
+            await runner.setup()
+            await web.TCPSite(runner, HOST, port).start()
+        try:
+            return await bench.run(args.testsets, args.drain_timeout)
+        finally:
+            await receiver.cleanup()
+            await server.cleanup()
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    result = asyncio.run(benchmark(args))
+    print_report(result)
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=2))
+    if args.baseline:
+        if found := regressions(result, json.loads(args.baseline.read_text()),
+                                args.tolerance):
+            print("Regressions:", *found, sep="\n  ")
+            sys.exit(1)
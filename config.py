@@ -5,13 +5,150 @@ class DefaultConfig:
     ROOT_DIR        = Path(__file__).parent.resolve()
     VAR_DIR         = ROOT_DIR / "var"
     RUNNERS_DIR     = VAR_DIR / "default" / "runners"
+    ARTIFACTS_DIR   = VAR_DIR / "default" / "artifacts"
+    TESTDATA_DIR    = VAR_DIR / "default" / "testdata"
     REDIS_HOST      = "localhost"
     REDIS_PORT      = 6379
+    REDIS_POOL_SIZE         = 32
+    # Seconds to wait for a free connection of the pool.
+    REDIS_POOL_TIMEOUT      = 5
+    REDIS_SOCKET_TIMEOUT    = 5
+    REDIS_CONNECT_TIMEOUT   = 2
+
+    # `python main.py` serving, more than one worker process needs
+    # SHARED_SUBMISSIONS.
+    SERVER_HOST             = "localhost"
+    SERVER_PORT             = 8080
+    SERVER_WORKERS          = 1
+
+    # None means one worker per CPU core.
+    SCHEDULER_WORKERS       = None
+    SCHEDULER_QUEUE_SIZE    = 1024
+    SCHEDULER_RETRY_AFTER   = 5
+    # Test runs executing at once across all submissions, None means one
+    # per CPU core. The SERVER_WORKERS processes split it, a judge worker
+    # has the whole of it.
+    CPU_BUDGET              = None
+    # Submissions accepted by a single POST /submit/batch, a batch is queued
+    # whole or rejected.
+    SUBMIT_BATCH_MAX        = 1024
+    TESTER_MAX_PARALLEL     = 8
+    # Limits of a test run: CPU and wall clock seconds, address space in
+    # bytes. A submission may ask for other limits up to the maximums.
+    TIME_LIMIT              = 2
+    TIME_LIMIT_MAX          = 10
+    WALL_TIME_LIMIT         = 5
+    WALL_TIME_LIMIT_MAX     = 30
+    MEMORY_LIMIT            = 256 * 1024 * 1024
+    MEMORY_LIMIT_MAX        = 1024 * 1024 * 1024
+    # Bytes of stdout, and of stderr, a test run may write.
+    OUTPUT_LIMIT            = 64 * 1024 * 1024
+    # Minimal interval between two callbacks to the same subscriber.
+    NOTIFY_INTERVAL         = 0.5
+    # Seconds a finished submission stays in memory. With the hand-off its
+    # report is moved to Redis for RESULT_STORE_TTL seconds afterwards.
+    TASKS_POOL_TTL          = 600
+    TASKS_POOL_HANDOFF      = False
+    # Save reports to Redis for GET /submission/{id}, along with the submit
+    # requests for POST /testset/{id}/rejudge. A report is saved on every
+    # status change and on test results at most once in
+    # RESULT_STORE_INTERVAL seconds.
+    RESULT_STORE            = True
+    RESULT_STORE_TTL        = 7 * 24 * 3600
+    RESULT_STORE_INTERVAL   = 1.0
+    # Events buffered for a slow /submission/{id}/events reader before
+    # they are replaced by a snapshot.
+    EVENTS_BUFFER_SIZE      = 64
+
+    # Make submissions reachable from every API process through Redis:
+    # subscriptions, /submission/{id} and its events. Needs RESULT_STORE.
+    SHARED_SUBMISSIONS      = False
+
+    # Hand submissions over to judge workers (worker.py) through Redis
+    # streams instead of testing them in the API process. Needs
+    # RESULT_STORE and SHARED_SUBMISSIONS.
+    JOB_QUEUE               = False
+    # Seconds a job may go untouched before another worker takes it over,
+    # and deliveries of a job before it is given up.
+    JOB_VISIBILITY_TIMEOUT  = 60
+    JOB_MAX_DELIVERIES      = 3
+    # Submissions a judge worker tests at once.
+    JUDGE_WORKER_JOBS       = 4
+
+    # Outgoing notifications, timeouts are in seconds.
+    HTTP_CLIENT_LIMIT               = 100
+    HTTP_CLIENT_LIMIT_PER_HOST      = 8
+    HTTP_CLIENT_DNS_TTL             = 300
+    HTTP_CLIENT_TIMEOUT             = 10
+    HTTP_CLIENT_CONNECT_TIMEOUT     = 3
+
+    # Run python3 tests on pre-started fork-server workers.
+    PYTHON3_FORKSERVER      = False
+    FORKSERVER_WORKERS      = 4
+    FORKSERVER_PYTHON       = "python3"
+
+    # C and C++ ("c" and "cpp") are compiled by at most COMPILE_WORKERS
+    # compilers at once, apart from CPU_BUDGET, None means one per CPU
+    # core. The PCH headers are precompiled once per toolchain into PCH_DIR,
+    # at startup with PCH_WARMUP, for the sources which include them.
+    COMPILE_WORKERS         = None
+    COMPILE_TIME_LIMIT      = 30
+    PCH_DIR                 = VAR_DIR / "default" / "pch"
+    PCH_WARMUP              = True
+    C_COMPILER              = "gcc"
+    C_FLAGS                 = ("-std=c11", "-O2", "-pipe")
+    C_LDFLAGS               = ("-lm",)
+    C_PCH_HEADERS           = ("stdio.h", "stdlib.h", "string.h", "math.h")
+    CPP_COMPILER            = "g++"
+    CPP_FLAGS               = ("-std=c++17", "-O2", "-pipe")
+    CPP_LDFLAGS             = ()
+    CPP_PCH_HEADERS         = ("bits/stdc++.h",)
+
+    # Reuse compiled sources across submissions, size is in bytes.
+    ARTIFACT_CACHE          = True
+    ARTIFACT_CACHE_SIZE     = 512 * 1024 * 1024
+
+    # Test inputs kept on disk and given to the runs as their stdin, size
+    # is in bytes.
+    TESTDATA_CACHE          = True
+    TESTDATA_CACHE_SIZE     = 1024 * 1024 * 1024
+
+    # Deserialized test sets kept in memory, size is in bytes.
+    TESTSET_CACHE           = True
+    TESTSET_CACHE_SIZE      = 256 * 1024 * 1024
+    # Streaming uploads: tests written to Redis at once and the biggest
+    # accepted test, in bytes.
+    TESTSET_UPLOAD_BATCH    = 64
+    TESTSET_MAX_TEST_SIZE   = 64 * 1024 * 1024
+    # Tests fetched from Redis at once while testing a submission. Test
+    # sets read this way are cached if they're no bigger than
+    # TESTSET_CACHE_FILL bytes.
+    TESTSET_LOAD_BATCH      = 16
+    TESTSET_CACHE_FILL      = 16 * 1024 * 1024
+
+    # Prometheus metrics on GET /metrics: testing phases, verdicts,
+    # notifications and Redis commands. Bucket bounds are in seconds, a
+    # judge worker serves its metrics on WORKER_METRICS_PORT if it's set.
+    METRICS                 = True
+    METRICS_BUCKETS         = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                               0.5, 1, 2.5, 5, 10, 30)
+    WORKER_METRICS_PORT     = None
+
+    # Submissions asking for it with `"trace": true`, or all of them with
+    # TRACE_SUBMISSIONS, get a span tree of their testing in the final
+    # report. With TRACE_DIR it's also written there as <id>.json in the
+    # Chrome Trace Event Format.
+    TRACE_SUBMISSIONS       = False
+    TRACE_DIR               = None
     
 
 class TestingConfig(DefaultConfig):
     
     RUNNERS_DIR     = DefaultConfig.VAR_DIR / "testing" / "runners"
+    ARTIFACTS_DIR   = DefaultConfig.VAR_DIR / "testing" / "artifacts"
+    TESTDATA_DIR    = DefaultConfig.VAR_DIR / "testing" / "testdata"
+    PCH_DIR         = DefaultConfig.VAR_DIR / "testing" / "pch"
+    PCH_WARMUP      = False
     REDIS_HOST      = "localhost"
     REDIS_PORT      = 6379
 
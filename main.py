@@ -1,5 +1,88 @@
+import os
+import sys
+import signal
+import logging
+
+from aiohttp import web
+
 from src.routes import routes
-from src.application import create_app
+from src.application import create_app, get_config
+from src.modules import scheduler, tasks_pool, redis_client, forkserver_pool, \
+        artifact_cache, testset_cache, testdata_cache, http_client, job_queue, \
+        shared_subscriptions, metrics, compile_pool
 
 def main(argv):
-    return create_app(argv, routes)
+    app = create_app(argv, routes)
+    scheduler.init_app(app, app["config"].SERVER_WORKERS)
+    tasks_pool.init_app(app)
+    redis_client.init_app(app)
+    http_client.init_app(app)
+    compile_pool.init_app(app)
+    if app["config"].SHARED_SUBMISSIONS:
+        shared_subscriptions.init_app(app)
+    if app["config"].JOB_QUEUE:
+        job_queue.init_app(app)
+    if app["config"].ARTIFACT_CACHE:
+        artifact_cache.init_app(app)
+    if app["config"].TESTSET_CACHE:
+        testset_cache.init_app(app)
+    if app["config"].TESTDATA_CACHE:
+        testdata_cache.init_app(app)
+    if app["config"].PYTHON3_FORKSERVER:
+        forkserver_pool.init_app(app)
+    if app["config"].METRICS:
+        metrics.init_app(app)
+    return app
+
+
+def serve(argv):
+    """ Runs SERVER_WORKERS processes accepting connections on the same
+    port with SO_REUSEPORT. Workers which exit are restarted until the
+    server gets SIGINT or SIGTERM. """
+    config = get_config(argv)
+    if config.SERVER_WORKERS == 1:
+        web.run_app(main(argv), host=config.SERVER_HOST, port=config.SERVER_PORT)
+        return
+    if not config.SHARED_SUBMISSIONS:
+        sys.exit("More than one SERVER_WORKERS needs SHARED_SUBMISSIONS")
+
+    def spawn() -> int:
+        if (pid := os.fork()) == 0:
+            code = 0
+            try:
+                web.run_app(main(argv), host=config.SERVER_HOST,
+                            port=config.SERVER_PORT, reuse_port=True)
+            except (KeyboardInterrupt, SystemExit):
+                pass
+            except Exception:
+                logging.exception("Server worker failed")
+                code = 1
+            finally:
+                os._exit(code)
+        return pid
+
+    stopping = False
+    workers = {spawn() for _ in range(config.SERVER_WORKERS)}
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    while workers:
+        pid, status = os.wait()
+        workers.discard(pid)
+        if not stopping:
+            logging.warning(f"Server worker {pid} exited with {status}, restarting")
+            workers.add(spawn())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    serve(sys.argv[1:])
@@ -1,7 +1,7 @@
 import os
 import argparse
 import importlib
-from asyncio import coroutine
+import inspect
 from contextlib import contextmanager
 from contextvars import ContextVar
 
@@ -51,9 +51,10 @@ def get_config(argv):
     return load_module("config:DevelopmentConfig")
 
 
-def on_cleanup_custom(app: web.Application):
+async def on_cleanup_custom(app: web.Application):
     for cleanup_cb in app["custom_cleanups"]:
-        cleanup_cb(app)
+        if inspect.isawaitable(result := cleanup_cb(app)):
+            await result
 
 
 def create_app(argv, routes=[]) -> web.Application:
@@ -69,4 +70,5 @@ def create_app(argv, routes=[]) -> web.Application:
         set_app_context(app)
 
     app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup_custom)
     return app
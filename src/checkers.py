@@ -0,0 +1,420 @@
+""" Answer checking shared by the testing strategies.
+
+A `Checker` is picked per test set by a spec string:
+
+    tokens          whitespace separated tokens are equal (the default)
+    lines           lines are equal up to the trailing whitespace
+    float[:<eps>]   numeric tokens differ by at most `eps`, absolute or
+                    relative, the others are equal
+    program         a python3 checker program stored with the test set
+
+For every test run the checker starts a `Check` which is fed the output
+as it arrives and can reject it before the run is over.
+"""
+import re
+import math
+import sys
+import shutil
+import tempfile
+from uuid import uuid1
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . import sandbox
+from .sandbox import Limits
+from .testset import Test, write_input
+
+
+__all__ = ("Checker", "Check", "CheckerError", "TokenMatcher", "create",
+        "validate", "DEFAULT_SPEC")
+
+
+DEFAULT_SPEC = "tokens"
+DEFAULT_EPSILON = 1e-6
+# Checker programs get the test input, the expected output and the output
+# of the run as file paths.
+PROGRAM_LIMITS = Limits(cpu_time=5, wall_time=10, memory=512 * 1024 * 1024,
+                        output=64 * 1024)
+# The bytes continuing a token, whitespace as `bytes.split` sees it.
+NOT_SPACE = re.compile(rb"[^ \t\n\r\x0b\x0c]*")
+
+
+class CheckerError(Exception):
+    """ The checker couldn't judge the output. """
+
+    messages: List[str]
+
+    def __init__(self, messages: List[str]):
+        super().__init__(*messages)
+        self.messages = messages
+
+
+class Check:
+    """ Checks the output of a single test run. """
+
+    messages: List[str]
+
+    def __init__(self):
+        self.messages = list()
+
+    def feed(self, chunk: bytes) -> bool:
+        """ Returns `False` once the output can't be accepted anymore. """
+        raise NotImplementedError
+
+    async def finish(self) -> bool:
+        """ Whether the output is accepted, raises `CheckerError` if it
+        can't be told. """
+        raise NotImplementedError
+
+
+class Checker:
+
+    async def prepare(self) -> List[str]:
+        """ Returns the errors which make the checker unusable. """
+        return list()
+
+    def start(self, test: Test) -> Check:
+        raise NotImplementedError
+
+    async def cleanup(self):
+        pass
+
+
+class Tokenizer:
+    """ Splits chunks into whitespace separated tokens, keeping the last
+    one until it's known to be complete. The last one grows in place, so a
+    long token is not copied on every chunk. """
+
+    partial: bytearray
+
+    def __init__(self):
+        self.partial = bytearray()
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        tokens = list()
+        start = 0
+        if self.partial:
+            start = NOT_SPACE.match(chunk).end()
+            self.partial += chunk[:start]
+            if start == len(chunk):
+                return tokens
+            tokens.append(bytes(self.partial))
+            self.partial.clear()
+        # Starts with whitespace if it follows the partial token.
+        rest = chunk[start:].split()
+        if rest and not chunk[-1:].isspace():
+            self.partial += rest.pop()
+        return tokens + rest
+
+    def finish(self) -> List[bytes]:
+        tokens = [bytes(self.partial)] if self.partial else []
+        self.partial.clear()
+        return tokens
+
+
+class TokenMatcher(Check):
+    """ Compares the whitespace separated tokens of an output arriving in
+    chunks with the expected ones, so the output is never kept whole. A
+    mismatch is detected as soon as the chunk showing it is fed. """
+
+    matches: bool = True
+    _expected: List[bytes]
+    _index: int = 0
+    # Bytes of the partial token known to match.
+    _checked: int = 0
+    _tokenizer: Tokenizer
+
+    def __init__(self, expected: List[str]):
+        super().__init__()
+        self._expected = [token.encode() for token in expected]
+        self._tokenizer = Tokenizer()
+
+    def feed(self, chunk: bytes) -> bool:
+        if not self.matches:
+            return False
+        for token in self._tokenizer.feed(chunk):
+            self.__match(token)
+        if (partial := self._tokenizer.partial) and not self.__may_continue(partial):
+            self.matches = False
+        return self.matches
+
+    async def finish(self) -> bool:
+        for token in self._tokenizer.finish():
+            self.__match(token)
+        if self._index != len(self._expected):
+            self.matches = False
+        return self.matches
+
+    def __match(self, token: bytes):
+        if self._index >= len(self._expected) \
+                or self._expected[self._index] != token:
+            self.matches = False
+        self._index += 1
+        self._checked = 0
+
+    def __may_continue(self, partial: bytearray) -> bool:
+        """ Compares only the bytes added to `partial` since the last
+        chunk. """
+        if self._index >= len(self._expected):
+            return False
+        expected = self._expected[self._index]
+        if len(partial) > len(expected) or not partial.startswith(
+                expected[self._checked:len(partial)], self._checked):
+            return False
+        self._checked = len(partial)
+        return True
+
+
+class TokensChecker(Checker):
+
+    def start(self, test: Test) -> Check:
+        return TokenMatcher(test.output)
+
+
+class LineMatcher(Check):
+    """ Compares lines with the trailing whitespace stripped, `test.output`
+    being the expected lines. Trailing empty lines don't matter. """
+
+    matches: bool = True
+    _expected: List[bytes]
+    _index: int = 0
+    # The last line, growing in place until it's complete.
+    _partial: bytearray
+
+    def __init__(self, expected: List[str]):
+        super().__init__()
+        self._expected = [line.encode().rstrip() for line in expected]
+        self._partial = bytearray()
+
+    def feed(self, chunk: bytes) -> bool:
+        if not self.matches:
+            return False
+        if (end := chunk.find(b"\n")) < 0:
+            self._partial += chunk
+            return self.matches
+        self._partial += chunk[:end]
+        self.__match(self._partial.rstrip())
+        *lines, last = chunk[end + 1:].split(b"\n")
+        for line in lines:
+            self.__match(line.rstrip())
+        self._partial = bytearray(last)
+        return self.matches
+
+    async def finish(self) -> bool:
+        if self._partial:
+            self.__match(self._partial.rstrip())
+        if any(self._expected[self._index:]):
+            self.matches = False
+        return self.matches
+
+    def __match(self, line: bytes):
+        if self._index < len(self._expected):
+            expected = self._expected[self._index]
+        else:
+            expected = b""
+        if line != expected:
+            self.matches = False
+        self._index += 1
+
+
+class LinesChecker(Checker):
+
+    def start(self, test: Test) -> Check:
+        return LineMatcher(test.output)
+
+
+def _close(actual: bytes, expected: bytes, epsilon: float) -> bool:
+    try:
+        a, e = float(actual), float(expected)
+    except ValueError:
+        return actual == expected
+    # Infinities are only equal to themselves.
+    return a == e or (math.isfinite(e)
+                      and abs(a - e) <= epsilon * max(1.0, abs(e)))
+
+
+def _close_batch(actual: List[bytes], expected: List[bytes],
+        epsilon: float) -> bool:
+    """ Compares a whole batch with numpy when it's available and every
+    token is a number. """
+    if numpy is not None:
+        try:
+            a = numpy.array(actual, dtype=numpy.bytes_).astype(numpy.float64)
+            e = numpy.array(expected, dtype=numpy.bytes_).astype(numpy.float64)
+        except ValueError:
+            pass
+        else:
+            with numpy.errstate(invalid="ignore"):
+                close = numpy.abs(a - e) <= epsilon * numpy.maximum(1.0, numpy.abs(e))
+            return bool(numpy.all((a == e) | (numpy.isfinite(e) & close)))
+    return all(_close(a, e, epsilon) for a, e in zip(actual, expected))
+
+
+class FloatMatcher(Check):
+    """ Compares tokens as numbers in batches of `BATCH` tokens, nan is
+    never equal. """
+
+    BATCH = 4096
+
+    matches: bool = True
+    epsilon: float
+    _expected: List[bytes]
+    _index: int = 0
+    _pending: List[bytes]
+    _tokenizer: Tokenizer
+
+    def __init__(self, expected: List[str], epsilon: float):
+        super().__init__()
+        self.epsilon = epsilon
+        self._expected = [token.encode() for token in expected]
+        self._pending = list()
+        self._tokenizer = Tokenizer()
+
+    def feed(self, chunk: bytes) -> bool:
+        if not self.matches:
+            return False
+        self._pending.extend(self._tokenizer.feed(chunk))
+        if len(self._pending) >= self.BATCH:
+            self.__compare()
+        return self.matches
+
+    async def finish(self) -> bool:
+        self._pending.extend(self._tokenizer.finish())
+        self.__compare()
+        if self._index != len(self._expected):
+            self.matches = False
+        return self.matches
+
+    def __compare(self):
+        if not self.matches or not self._pending:
+            return
+        end = self._index + len(self._pending)
+        if end > len(self._expected) or not _close_batch(
+                self._pending, self._expected[self._index:end], self.epsilon):
+            self.matches = False
+        self._index = end
+        self._pending.clear()
+
+
+class FloatChecker(Checker):
+
+    epsilon: float
+
+    def __init__(self, epsilon: float = DEFAULT_EPSILON):
+        self.epsilon = epsilon
+
+    def start(self, test: Test) -> Check:
+        return FloatMatcher(test.output, self.epsilon)
+
+
+class ProgramCheck(Check):
+    """ Keeps the output in a file and runs the checker program on it at
+    the end. The output is bounded by the output limit of the run. """
+
+    checker: "ProgramChecker"
+    test: Test
+    _output: tempfile.SpooledTemporaryFile
+
+    def __init__(self, checker: "ProgramChecker", test: Test):
+        super().__init__()
+        self.checker = checker
+        self.test = test
+        self._output = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+
+    def feed(self, chunk: bytes) -> bool:
+        self._output.write(chunk)
+        return True
+
+    async def finish(self) -> bool:
+        try:
+            self._output.seek(0)
+            ok, self.messages = await self.checker.check(
+                self.test, self._output.read())
+        finally:
+            self._output.close()
+        return ok
+
+
+class ProgramChecker(Checker):
+    """ A python3 checker program run as
+    `checker.py <input> <expected output> <output>`, exit code 0 accepts
+    and 1 rejects, anything else is a `CheckerError`. Its stdout goes to
+    the messages of the test result. The program is written once and
+    reused for all the tests of the submission. """
+
+    source: str
+    workdir: Path
+    python: str
+    path: Optional[Path] = None
+
+    def __init__(self, source: str, workdir: Path, python: str = sys.executable):
+        self.source = source
+        self.workdir = workdir
+        self.python = python
+
+    async def prepare(self) -> List[str]:
+        checker_dir = self.workdir / f"checker-{uuid1()}"
+        checker_dir.mkdir(parents=True)
+        self.path = checker_dir / "checker.py"
+        self.path.write_text(self.source)
+        try:
+            compile(self.source, str(self.path), "exec")
+        except SyntaxError as err:
+            return [f"Checker program doesn't compile: {err}"]
+        return list()
+
+    def start(self, test: Test) -> Check:
+        return ProgramCheck(self, test)
+
+    async def check(self, test: Test, output: bytes) -> Tuple[bool, List[str]]:
+        with tempfile.TemporaryDirectory(dir=self.path.parent) as tmp:
+            with (Path(tmp) / "input").open("wb") as f:
+                write_input(test, f)
+            (Path(tmp) / "answer").write_text("\n".join(test.output))
+            (Path(tmp) / "output").write_bytes(output)
+            usage, stdout, stderr = await sandbox.run(
+                [self.python, str(self.path)] +
+                [str(Path(tmp) / name) for name in ("input", "answer", "output")],
+                b"", PROGRAM_LIMITS)
+        if usage.returncode not in (0, 1):
+            raise CheckerError([f"Checker failed with {usage.returncode}",
+                                stderr.decode(errors="replace")])
+        messages = [stdout.decode(errors="replace")] if stdout.strip() else []
+        return usage.returncode == 0, messages
+
+    async def cleanup(self):
+        if self.path is not None:
+            shutil.rmtree(self.path.parent, ignore_errors=True)
+
+
+def validate(spec: str, source: Optional[str] = None):
+    """ Raises `ValueError` if the spec can't make a checker. """
+    name, _, argument = spec.partition(":")
+    if name in ("tokens", "lines") and not argument:
+        return
+    if name == "float":
+        if argument and not float(argument) >= 0:
+            raise ValueError(f"Wrong epsilon {argument}")
+        return
+    if name == "program" and not argument:
+        if not source:
+            raise ValueError("The program checker needs its source")
+        return
+    raise ValueError(f"Unknown checker {spec}")
+
+
+def create(spec: str, source: Optional[str], workdir: Path) -> Checker:
+    validate(spec, source)
+    name, _, argument = spec.partition(":")
+    if name == "lines":
+        return LinesChecker()
+    if name == "float":
+        return FloatChecker(float(argument) if argument else DEFAULT_EPSILON)
+    if name == "program":
+        return ProgramChecker(source, workdir)
+    return TokensChecker()
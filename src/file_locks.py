@@ -0,0 +1,52 @@
+import os
+import fcntl
+import shutil
+from uuid import uuid1
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+# Advisory locks of the cache directories shared by the processes. An
+# entry of a cache is locked shared while it's in use and exclusively while
+# it's removed, no process waits for an exclusive lock. Every process stages
+# its entries in a directory of its own, locked exclusively while it's
+# alive.
+
+
+def lock(path: Path, exclusive: bool = False, wait: bool = False) -> Optional[int]:
+    """ A descriptor of the file or directory at `path` holding the lock,
+    `None` if there is nothing at `path` or, unless `wait`, if it's locked
+    by someone else. What was at `path` when it got locked is checked to
+    be still there, so a removed entry is never locked. """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+    try:
+        fcntl.flock(fd, operation if wait else operation | fcntl.LOCK_NB)
+        if os.stat(path).st_ino == os.fstat(fd).st_ino:
+            return fd
+    except (BlockingIOError, FileNotFoundError):
+        pass
+    os.close(fd)
+    return None
+
+
+def staging_dir(root: Path) -> Tuple[Path, int]:
+    """ A new directory under `root` and the descriptor holding its lock.
+    The directories left by the processes which are gone are removed. """
+    root.mkdir(parents=True, exist_ok=True)
+    for path in root.iterdir():
+        if (fd := lock(path, exclusive=True)) is not None:
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+            os.close(fd)
+    while True:
+        path = root / str(uuid1())
+        path.mkdir()
+        # Another process may clean it up before it's locked.
+        if (fd := lock(path, exclusive=True)) is not None:
+            return path, fd
@@ -0,0 +1,205 @@
+""" Fork-server worker for the python3 testing strategy.
+
+The script is started as a standalone interpreter (it doesn't import the
+`src` package) and serves requests from its stdin. Every request forks a
+fresh child from this already warm interpreter which runs the source as
+`__main__`. Frames on both directions are a 4 bytes big-endian length
+followed by the payload:
+
+    request:  header (json: {"path": ..., "limits": {...}, "stdin": ...}),
+              stdin data, empty if the header names the `stdin` file
+    response: json: {"pid": ...} of the child as soon as it's forked, the
+              id of its process group as well, then the header (json:
+              {"returncode": ..., "cpu_time": ..., "wall_time": ...,
+              "peak_rss": ..., "timed_out": ..., "output_exceeded": ...}),
+              stdout, stderr
+
+The limits and the usage have the meaning of `src.sandbox.Limits` and
+`src.sandbox.Usage`.
+"""
+import gc
+import io
+import os
+import sys
+import json
+import math
+import time
+import runpy
+import select
+import signal
+import struct
+import resource
+import tempfile
+import traceback
+
+# Modules most sources start with, imported once here instead of once per
+# test in every child.
+import re
+import heapq
+import bisect
+import typing
+import functools
+import itertools
+import collections
+
+
+LENGTH = struct.Struct(">I")
+
+
+def read_frame(stream) -> bytes:
+    header = stream.read(LENGTH.size)
+    if len(header) < LENGTH.size:
+        return None
+    (length,) = LENGTH.unpack(header)
+    return stream.read(length)
+
+
+def write_frame(stream, data: bytes):
+    stream.write(LENGTH.pack(len(data)))
+    stream.write(data)
+
+
+def exit_code(err: SystemExit) -> int:
+    if err.code is None:
+        return 0
+    if isinstance(err.code, int):
+        return err.code
+    print(err.code, file=sys.stderr)
+    return 1
+
+
+def execute(path: str):
+    """ Runs in the forked child with 0, 1 and 2 already redirected. """
+    sys.stdin = sys.__stdin__ = io.TextIOWrapper(
+        io.BufferedReader(io.FileIO(0, "r", closefd=False)))
+    sys.stdout = sys.__stdout__ = io.TextIOWrapper(
+        io.BufferedWriter(io.FileIO(1, "w", closefd=False)))
+    sys.stderr = sys.__stderr__ = io.TextIOWrapper(
+        io.BufferedWriter(io.FileIO(2, "w", closefd=False)),
+        line_buffering=True)
+    sys.argv = [path]
+    sys.path[0] = os.path.dirname(path)
+    code = 0
+    try:
+        runpy.run_path(path, run_name="__main__")
+    except SystemExit as err:
+        code = exit_code(err)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except BaseException:
+        code = code or 120
+    os._exit(code)
+
+
+def set_limits(limits: dict):
+    if (cpu_time := limits.get("cpu_time")) is not None:
+        seconds = math.ceil(cpu_time)
+        resource.setrlimit(resource.RLIMIT_CPU, (seconds, seconds + 1))
+    if (memory := limits.get("memory")) is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    if (output := limits.get("output")) is not None:
+        # Bounds the stdout and stderr files. Python ignores SIGXFSZ, so
+        # the writes fail with EFBIG instead.
+        resource.setrlimit(resource.RLIMIT_FSIZE, (output, output))
+
+
+def wait_exit(pid: int, timeout: float) -> bool:
+    """ Kills the child's process group if it doesn't exit in `timeout`
+    seconds, returns whether it was killed. """
+    if timeout is None:
+        return False
+    pidfd = os.pidfd_open(pid)
+    try:
+        ready, _, _ = select.select([pidfd], [], [], timeout)
+    finally:
+        os.close(pidfd)
+    if ready:
+        return False
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    return True
+
+
+def open_stdin(path: str, data: bytes):
+    if path is not None:
+        return open(path, "rb")
+    stdin = tempfile.TemporaryFile()
+    stdin.write(data)
+    stdin.seek(0)
+    return stdin
+
+
+def run(path: str, stdin_path: str, data: bytes, limits: dict,
+        on_start=lambda pid: None):
+    with open_stdin(stdin_path, data) as stdin, \
+            tempfile.TemporaryFile() as stdout, \
+            tempfile.TemporaryFile() as stderr:
+        started_at = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                try:
+                    os.setsid()
+                except PermissionError:
+                    # The parent made it a group leader first.
+                    pass
+                os.dup2(stdin.fileno(), 0)
+                os.dup2(stdout.fileno(), 1)
+                os.dup2(stderr.fileno(), 2)
+                set_limits(limits)
+                execute(path)
+            finally:
+                os._exit(121)
+        try:
+            # The group exists before its id is reported.
+            os.setpgid(pid, pid)
+        except (PermissionError, ProcessLookupError):
+            pass
+        on_start(pid)
+        timed_out = wait_exit(pid, limits.get("wall_time"))
+        _, status, rusage = os.wait4(pid, 0)
+        returncode = os.waitstatus_to_exitcode(status)
+        usage = {
+            "returncode": returncode,
+            "cpu_time": rusage.ru_utime + rusage.ru_stime,
+            "wall_time": time.monotonic() - started_at,
+            "peak_rss": rusage.ru_maxrss * 1024,
+            "timed_out": timed_out,
+            "output_exceeded": limits.get("output") is not None and max(
+                os.fstat(stdout.fileno()).st_size,
+                os.fstat(stderr.fileno()).st_size) >= limits["output"],
+        }
+        stdout.seek(0)
+        stderr.seek(0)
+        return usage, stdout.read(), stderr.read()
+
+
+def main():
+    requests = sys.stdin.buffer
+    responses = sys.stdout.buffer
+    gc.collect()
+    gc.freeze()
+    while (header := read_frame(requests)) is not None:
+        request = json.loads(header)
+        data = read_frame(requests)
+
+        def started(pid: int):
+            write_frame(responses, json.dumps({"pid": pid}).encode())
+            responses.flush()
+
+        usage, stdout, stderr = run(request["path"], request.get("stdin"),
+                                    data, request.get("limits", {}), started)
+        write_frame(responses, json.dumps(usage).encode())
+        write_frame(responses, stdout)
+        write_frame(responses, stderr)
+        responses.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from typing import Set
+
+import redis
+
+from . import result_store
+from . import shared_submissions
+from .modules import tasks_pool
+from .modules.job_queue import Job, JobQueue
+from .routes import create_tester, subscribe_callback
+from .tester import Report, Status, report_view
+
+
+__all__ = ("JudgeWorker",)
+
+
+class JudgeWorker:
+    """ Tests the submissions taken from the job queue, up to `jobs` at
+    once. A job is acknowledged once its final report is in the result
+    store, if the worker dies before that the job is redelivered to
+    another one. Running submissions are kept in the tasks pool to take
+    the subscriptions received by the API processes. """
+
+    queue: JobQueue
+    jobs: int
+    events_buffer: int
+    _slots: asyncio.Semaphore
+    _running: Set[asyncio.Task]
+
+    def __init__(self, queue: JobQueue, jobs: int = 4,
+            events_buffer: int = 64):
+        self.queue = queue
+        self.jobs = jobs
+        self.events_buffer = events_buffer
+        self._slots = asyncio.Semaphore(jobs)
+        self._running = set()
+
+    async def run(self):
+        """ Takes jobs until cancelled, then lets the running ones finish. """
+        try:
+            while True:
+                await self._slots.acquire()
+                try:
+                    job = await self.queue.get()
+                except BaseException:
+                    self._slots.release()
+                    raise
+                if job is None:
+                    self._slots.release()
+                    continue
+                task = asyncio.create_task(self.__handle(job))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+        finally:
+            if self._running:
+                await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def __handle(self, job: Job):
+        heartbeat = asyncio.create_task(self.__heartbeat(job))
+        try:
+            await self.__judge(job)
+            await self.queue.ack(job)
+        except Exception:
+            # Left pending, the job is redelivered after the visibility
+            # timeout.
+            logging.exception(f"Job {job.message_id} failed")
+        finally:
+            heartbeat.cancel()
+            self._slots.release()
+
+    async def __heartbeat(self, job: Job):
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 3)
+            try:
+                await self.queue.touch(job)
+            except (redis.exceptions.RedisError, OSError) as err:
+                # Tried again on the next tick, the job is only lost once
+                # the visibility timeout passes.
+                logging.warning(f"Couldn't extend job {job.message_id}: {err}")
+
+    async def __judge(self, job: Job):
+        _id = job.data["id"]
+        if self.queue.exhausted(job):
+            await self.__fail(_id, f"Given up after {job.deliveries - 1} attempts")
+            return
+        if (submition := await create_tester(job.data, _id)) is None:
+            await self.__fail(_id, "Couldn't find a testing strategy.")
+            return
+        with tasks_pool.running(submition):
+            await subscribe_callback(submition, job.data)
+            await shared_submissions.apply_subscriptions(submition)
+            relay = asyncio.create_task(
+                shared_submissions.relay(submition, self.events_buffer))
+            try:
+                await submition()
+            except BaseException:
+                relay.cancel()
+                raise
+            await relay
+
+    async def __fail(self, _id: str, message: str):
+        logging.error(f"Submission {_id}: {message}")
+        await result_store.save(_id, report_view(
+            Report(status=Status.Failed, messages=[message])))
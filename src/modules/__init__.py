@@ -1 +1,2 @@
+from . import scheduler
 from . import tasks_pool
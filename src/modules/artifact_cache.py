@@ -0,0 +1,183 @@
+import os
+import shutil
+import hashlib
+import logging
+from uuid import uuid1
+from pathlib import Path
+from collections import OrderedDict
+from contextvars import copy_context
+from typing import Dict, Optional
+
+import aiohttp.web
+
+from src.application import app_var
+from src import file_locks
+
+
+__all__ = ("init_app", "get_cache", "ArtifactCache")
+
+
+def dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+class ArtifactCache:
+    """ Build artifacts stored on disk under the hash of (language,
+    toolchain version, source). The least recently used entries are
+    removed once the total size exceeds `max_size`, except the ones which
+    are pinned by running submissions.
+
+    The directory may be shared by several processes, see
+    `src/file_locks.py`. A pinned entry holds a shared lock so the others
+    don't remove it, and the entries stored by the others are picked up on
+    lookup. """
+
+    root: Path
+    max_size: int
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    _entries: "OrderedDict[str, int]"
+    _pins: Dict[str, int]
+    # Descriptors holding the locks of the pinned entries.
+    _locks: Dict[str, int]
+    _staging: Path
+    _staging_lock: int
+
+    def __init__(self, root: Path, max_size: int):
+        self.root = root
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._pins = dict()
+        self._locks = dict()
+        self.__scan()
+
+    @staticmethod
+    def key(language: str, toolchain: str, source: str) -> str:
+        digest = hashlib.sha256()
+        for part in (language, toolchain, source):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @property
+    def size(self) -> int:
+        return sum(self._entries.values())
+
+    def __scan(self):
+        self._staging, self._staging_lock = file_locks.staging_dir(
+            self.root / ".staging")
+        entries = [p for p in self.root.iterdir() if p.is_dir()
+                   and not p.name.startswith(".")]
+        for path in sorted(entries, key=lambda p: p.stat().st_mtime):
+            self._entries[path.name] = dir_size(path)
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """ Returns the directory of the artifact and pins it, or `None`. """
+        if not self.pin(key):
+            # Removed by another process if it was known.
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.__add(key)
+        path = self.root / key
+        os.utime(path)
+        return path
+
+    def staging_dir(self) -> Path:
+        path = self._staging / str(uuid1())
+        path.mkdir()
+        return path
+
+    def store(self, key: str, staged: Path) -> Path:
+        """ Moves a built `staged` directory into the cache and pins it. If
+        the same artifact was stored meanwhile, by this process or another
+        one, the staged copy is dropped. """
+        path = self.root / key
+        while not self.pin(key):
+            # Locked before it's moved, so it can't be removed in between.
+            if (fd := file_locks.lock(staged)) is None:
+                raise FileNotFoundError(f"No staged artifact at {staged}")
+            try:
+                staged.rename(path)
+            except OSError:
+                # It's there already, unless it's being removed, pinning
+                # it tells which one.
+                os.close(fd)
+                continue
+            self._pins[key] = 1
+            self._locks[key] = fd
+            self._entries.pop(key, None)
+            break
+        if staged.exists():
+            shutil.rmtree(staged, ignore_errors=True)
+        self.__add(key)
+        self.__evict()
+        return path
+
+    def __add(self, key: str):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        else:
+            self._entries[key] = dir_size(self.root / key)
+
+    def pin(self, key: str) -> bool:
+        """ Pins the artifact, whether it's in the cache. Waits for another
+        process removing it to finish. """
+        if key not in self._pins:
+            if (fd := file_locks.lock(self.root / key, wait=True)) is None:
+                return False
+            self._locks[key] = fd
+        self._pins[key] = self._pins.get(key, 0) + 1
+        return True
+
+    def unpin(self, key: str):
+        if (count := self._pins.get(key, 0) - 1) > 0:
+            self._pins[key] = count
+        elif self._pins.pop(key, None) is not None:
+            os.close(self._locks.pop(key))
+            self.__evict()
+
+    def __evict(self):
+        size = self.size
+        for key in list(self._entries.keys()):
+            if size <= self.max_size:
+                return
+            if key in self._pins:
+                continue
+            fd = file_locks.lock(self.root / key, exclusive=True)
+            if fd is None and (self.root / key).exists():
+                # Pinned by another process.
+                continue
+            size -= self._entries.pop(key)
+            if fd is not None:
+                logging.debug(f"Evicting artifact {key}")
+                shutil.rmtree(self.root / key, ignore_errors=True)
+                os.close(fd)
+                self.evictions += 1
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "size": self.size,
+            "max_size": self.max_size,
+        }
+
+
+def init_app(app: aiohttp.web.Application):
+    config = app["config"]
+    app["global"]["artifact_cache"] = ArtifactCache(
+        config.ARTIFACTS_DIR, config.ARTIFACT_CACHE_SIZE)
+    app["modules"].append("artifact_cache")
+
+
+def get_cache() -> ArtifactCache:
+    assert app_var in copy_context(), "Not inside an app context"
+    app = app_var.get()
+    assert "artifact_cache" in app["modules"], \
+           "artifact_cache module wasn't loaded"
+    return app["global"]["artifact_cache"]
@@ -0,0 +1,250 @@
+import os
+import time
+import asyncio
+import hashlib
+import shutil
+import logging
+from uuid import uuid1
+from pathlib import Path
+from contextvars import copy_context
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp.web
+
+from src.application import app_var
+from src import tracing
+
+
+__all__ = ("init_app", "get_pool", "CompilePool", "Toolchain")
+
+
+@dataclass(frozen=True)
+class Toolchain:
+    """ How the sources of a language are compiled. The `pch_headers` are
+    precompiled with `flags` once, a source including one of them first
+    gets it precompiled. """
+
+    compiler: str
+    flags: Tuple[str, ...] = ()
+    ldflags: Tuple[str, ...] = ()
+    pch_headers: Tuple[str, ...] = ()
+    # The -x language of the precompiled header.
+    header_language: str = "c++-header"
+
+
+class CompilePool:
+    """ Compiles C and C++ sources, no more than `workers` at once. The
+    limit is apart from the CPU budget of the test runs, so compilations
+    don't hold the slots of the runs and the other way around.
+
+    The precompiled headers of a toolchain are built under `pch_dir` on
+    the first compilation, or by `warmup`, and reused by the processes
+    sharing the directory. Their directory is searched ahead of the system
+    ones, so the compiler only picks one up for a source which includes
+    that header. A toolchain whose headers fail to build compiles without
+    them. """
+
+    workers: int
+    pch_dir: Path
+    toolchains: Dict[str, Toolchain]
+    time_limit: float
+    compiled: int = 0
+    failed: int = 0
+    waiting: int = 0
+    wait_time: float = 0.0
+    _slots: asyncio.Semaphore
+    _versions: Dict[str, str]
+    _pch: Dict[str, Optional[Path]]
+    _pch_locks: Dict[str, asyncio.Lock]
+
+    def __init__(self, workers: int, pch_dir: Path,
+            toolchains: Dict[str, Toolchain], time_limit: float = 30):
+        self.workers = workers
+        self.pch_dir = pch_dir
+        self.toolchains = toolchains
+        self.time_limit = time_limit
+        self._slots = asyncio.Semaphore(workers)
+        self._versions = dict()
+        self._pch = dict()
+        self._pch_locks = {language: asyncio.Lock() for language in toolchains}
+
+    async def __exec(self, *argv: str) -> Tuple[int, bytes]:
+        """ The exit code and the output of `argv`. It's killed once it
+        runs out of time, which raises `asyncio.TimeoutError`. """
+        proc = await asyncio.create_subprocess_exec(
+            *argv, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT)
+        try:
+            output, _ = await asyncio.wait_for(proc.communicate(),
+                                               self.time_limit)
+        except BaseException:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            raise
+        return proc.returncode, output
+
+    async def version(self, language: str) -> str:
+        """ The compiler version and the flags, what the artifacts of the
+        language depend on. """
+        if language not in self._versions:
+            toolchain = self.toolchains[language]
+            try:
+                _, output = await self.__exec(toolchain.compiler, "--version")
+            except (OSError, asyncio.TimeoutError):
+                output = toolchain.compiler.encode()
+            self._versions[language] = " ".join(
+                [output.decode().partition("\n")[0], *toolchain.flags,
+                 *toolchain.ldflags])
+        return self._versions[language]
+
+    async def __precompiled_header(self, language: str) -> Optional[Path]:
+        """ The directory of the precompiled headers, each one is next to
+        where the header would be if the directory held it. """
+        async with self._pch_locks[language]:
+            if language in self._pch:
+                return self._pch[language]
+            toolchain = self.toolchains[language]
+            if not toolchain.pch_headers:
+                self._pch[language] = None
+                return None
+            digest = hashlib.sha256()
+            for part in (await self.version(language), *toolchain.pch_headers):
+                digest.update(part.encode())
+                digest.update(b"\0")
+            directory = self.pch_dir / f"{language}-{digest.hexdigest()[:16]}"
+            if not directory.exists():
+                with tracing.span("pch", language=language):
+                    built = await self.__build_pch(toolchain, directory)
+                if not built:
+                    directory = None
+            self._pch[language] = directory
+            return directory
+
+    async def __build_pch(self, toolchain: Toolchain, directory: Path) -> bool:
+        logging.info(f"Precompiling the headers into {directory}")
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        staged = directory.parent / f".{uuid1()}"
+        staged.mkdir()
+        source = staged / "pch.h"
+        try:
+            for name in toolchain.pch_headers:
+                source.write_text(f"#include <{name}>\n")
+                (staged / name).parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    returncode, output = await self.__exec(
+                        toolchain.compiler, *toolchain.flags,
+                        "-x", toolchain.header_language, str(source),
+                        "-o", str(staged / f"{name}.gch"))
+                except (OSError, asyncio.TimeoutError) as err:
+                    returncode, output = None, repr(err).encode()
+                if returncode != 0:
+                    logging.warning(f"Couldn't precompile {name} of "
+                                    f"{toolchain.compiler}: {output.decode()}")
+                    return False
+            source.unlink()
+            try:
+                staged.rename(directory)
+            except OSError:
+                # Built by another process meanwhile.
+                if not directory.exists():
+                    raise
+            return True
+        finally:
+            shutil.rmtree(staged, ignore_errors=True)
+
+    async def warmup(self):
+        """ Builds the precompiled headers of all the toolchains. """
+        for language in self.toolchains:
+            await self.__precompiled_header(language)
+
+    async def compile(self, language: str, source: Path,
+            output: Path) -> List[str]:
+        """ Compiles `source` into the executable `output`, the errors of
+        the compiler if it fails. """
+        toolchain = self.toolchains[language]
+        pch = await self.__precompiled_header(language)
+        argv = [toolchain.compiler, *toolchain.flags]
+        if pch is not None:
+            argv += ["-I", str(pch)]
+        argv += ["-o", str(output), str(source), *toolchain.ldflags]
+        self.waiting += 1
+        waiting_since = time.monotonic()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            self.wait_time += time.monotonic() - waiting_since
+            tracing.record("compile_wait", waiting_since)
+            logging.debug(f"Compiling the source: $ {' '.join(argv)}")
+            with tracing.span("compiler", pch=pch is not None):
+                returncode, stdout = await self.__exec(*argv)
+        except asyncio.TimeoutError:
+            self.failed += 1
+            return [f"Compilation took more than {self.time_limit} seconds"]
+        except OSError as err:
+            self.failed += 1
+            return [f"Couldn't run {toolchain.compiler}: {err}"]
+        finally:
+            self._slots.release()
+        if returncode != 0:
+            self.failed += 1
+            return [f"rc: {returncode}", stdout.decode()]
+        self.compiled += 1
+        return list()
+
+    def stats(self):
+        done = self.compiled + self.failed
+        return {
+            "workers": self.workers,
+            "waiting": self.waiting,
+            "compiled": self.compiled,
+            "failed": self.failed,
+            "wait_time_avg": self.wait_time / done if done else 0.0,
+            "pch": {language: pch is not None
+                    for language, pch in self._pch.items()},
+        }
+
+
+def __toolchains(config) -> Dict[str, Toolchain]:
+    return {
+        "c": Toolchain(config.C_COMPILER, tuple(config.C_FLAGS),
+                       tuple(config.C_LDFLAGS), tuple(config.C_PCH_HEADERS),
+                       "c-header"),
+        "cpp": Toolchain(config.CPP_COMPILER, tuple(config.CPP_FLAGS),
+                         tuple(config.CPP_LDFLAGS),
+                         tuple(config.CPP_PCH_HEADERS), "c++-header"),
+    }
+
+
+async def __startup(app: aiohttp.web.Application):
+    if app["config"].PCH_WARMUP:
+        app["global"]["compile_pool_warmup"] = asyncio.create_task(
+            app["global"]["compile_pool"].warmup())
+
+
+async def __cleanup(app: aiohttp.web.Application):
+    if (warmup := app["global"].get("compile_pool_warmup")) is None:
+        return
+    warmup.cancel()
+    await asyncio.gather(warmup, return_exceptions=True)
+
+
+def init_app(app: aiohttp.web.Application):
+    config = app["config"]
+    app["global"]["compile_pool"] = CompilePool(
+        config.COMPILE_WORKERS or os.cpu_count() or 1, config.PCH_DIR,
+        __toolchains(config), config.COMPILE_TIME_LIMIT)
+    app.on_startup.append(__startup)
+    app["custom_cleanups"].append(__cleanup)
+    app["modules"].append("compile_pool")
+
+
+def get_pool() -> CompilePool:
+    assert app_var in copy_context(), "Not inside an app context"
+    app = app_var.get()
+    assert "compile_pool" in app["modules"], \
+           "compile_pool module wasn't loaded"
+    return app["global"]["compile_pool"]
@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import signal
+import struct
+import asyncio
+import logging
+from pathlib import Path
+from contextvars import copy_context
+from dataclasses import asdict
+from typing import List, Optional, Tuple, Union
+
+import aiohttp.web
+
+from src.application import app_var
+from src.sandbox import Limits, Usage
+from src import forkserver_worker
+
+
+__all__ = ("init_app", "get_pool", "ForkServerPool", "ForkServerError")
+
+
+WORKER_SCRIPT = Path(forkserver_worker.__file__).resolve()
+LENGTH = struct.Struct(">I")
+
+
+class ForkServerError(Exception):
+
+    pass
+
+
+class ForkServer:
+    """ A single pre-started worker, see `src/forkserver_worker.py`. """
+
+    python: str
+    proc: asyncio.subprocess.Process = None
+    # The process group of the test run in progress, once it's reported.
+    child: Optional[int] = None
+    _response: Optional[asyncio.Future] = None
+
+    def __init__(self, python: str):
+        self.python = python
+
+    async def start(self):
+        self.proc = await asyncio.create_subprocess_exec(
+            self.python, str(WORKER_SCRIPT),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE)
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.returncode is None
+
+    async def __read_frame(self) -> bytes:
+        (length,) = LENGTH.unpack(await self.proc.stdout.readexactly(LENGTH.size))
+        return await self.proc.stdout.readexactly(length)
+
+    async def run(self, path: str, stdin: Union[bytes, Path],
+            limits: Limits) -> Tuple[Usage, bytes, bytes]:
+        request = {"path": path, "limits": asdict(limits)}
+        data = stdin
+        if isinstance(stdin, Path):
+            request["stdin"], data = str(stdin), b""
+        header = json.dumps(request).encode()
+        self.proc.stdin.write(LENGTH.pack(len(header)) + header)
+        self.proc.stdin.write(LENGTH.pack(len(data)))
+        self.proc.stdin.write(data)
+        await self.proc.stdin.drain()
+        # Read on even if the run is cancelled, see `abort`.
+        self._response = asyncio.ensure_future(self.__read_response())
+        return await asyncio.shield(self._response)
+
+    async def __read_response(self) -> Tuple[Usage, bytes, bytes]:
+        self.child = json.loads(await self.__read_frame())["pid"]
+        usage = Usage(**json.loads(await self.__read_frame()))
+        stdout = await self.__read_frame()
+        stderr = await self.__read_frame()
+        self.child = None
+        return (usage, stdout, stderr)
+
+    def kill_child(self):
+        if self.child is None:
+            return
+        try:
+            os.killpg(self.child, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    async def abort(self, timeout: float = 1) -> bool:
+        """ Kills the test run in progress and waits for the worker to reap
+        it, whether the worker can take the next request. """
+        if (response := self._response) is None:
+            return False
+
+        async def finish():
+            while self.child is None and not response.done():
+                await asyncio.sleep(0.01)
+            self.kill_child()
+            await response
+
+        try:
+            await asyncio.wait_for(finish(), timeout)
+        except Exception:
+            return False
+        return True
+
+    async def stop(self):
+        self.kill_child()
+        if not self.alive:
+            return
+        self.proc.stdin.close()
+        try:
+            await asyncio.wait_for(self.proc.wait(), timeout=1)
+        except asyncio.TimeoutError:
+            self.proc.kill()
+            await self.proc.wait()
+
+
+class ForkServerPool:
+    """ Hands out idle workers one request at a time and replaces the ones
+    that died. """
+
+    size: int
+    python: str
+    _idle: asyncio.Queue
+    _workers: List[ForkServer]
+
+    def __init__(self, size: int, python: str = sys.executable):
+        self.size = size
+        self.python = python
+        self._idle = asyncio.Queue()
+        self._workers = list()
+
+    async def start(self):
+        for _ in range(self.size):
+            worker = ForkServer(self.python)
+            await worker.start()
+            self._workers.append(worker)
+            self._idle.put_nowait(worker)
+
+    async def run(self, path: str, stdin: Union[bytes, Path],
+            limits: Limits = None) -> Tuple[Usage, bytes, bytes]:
+        """ Runs the source at `path` with `stdin` on its stdin, the data or
+        a file the worker opens. """
+        worker = await self._idle.get()
+        try:
+            if not worker.alive:
+                await self.__restart(worker)
+            worker._response = None
+            return await worker.run(path, stdin, limits or Limits())
+        except (asyncio.IncompleteReadError, ConnectionError) as err:
+            logging.warning(f"Fork-server worker died: {err}")
+            await self.__restart(worker)
+            raise ForkServerError("Fork-server worker died") from err
+        except asyncio.CancelledError:
+            # The test run is killed, the worker only if it isn't done with
+            # the response soon after.
+            if not await asyncio.shield(worker.abort()):
+                await self.__restart(worker)
+            raise
+        finally:
+            self._idle.put_nowait(worker)
+
+    async def __restart(self, worker: ForkServer):
+        """ Kills the test run of the worker along with it, so it doesn't
+        outlive the worker. """
+        worker.kill_child()
+        worker.child = None
+        if worker.alive:
+            worker.proc.kill()
+            await worker.proc.wait()
+        await worker.start()
+
+    async def close(self):
+        for worker in self._workers:
+            await worker.stop()
+        self._workers.clear()
+
+
+async def __startup(app: aiohttp.web.Application):
+    await app["global"]["forkserver_pool"].start()
+
+
+async def __cleanup(app: aiohttp.web.Application):
+    if "forkserver_pool" not in app["global"].keys():
+        return
+    await app["global"]["forkserver_pool"].close()
+
+
+def init_app(app: aiohttp.web.Application):
+    config = app["config"]
+    app["global"]["forkserver_pool"] = ForkServerPool(
+        config.FORKSERVER_WORKERS, config.FORKSERVER_PYTHON)
+    app.on_startup.append(__startup)
+    app["custom_cleanups"].append(__cleanup)
+    app["modules"].append("forkserver_pool")
+
+
+def get_pool() -> ForkServerPool:
+    assert app_var in copy_context(), "Not inside an app context"
+    app = app_var.get()
+    assert "forkserver_pool" in app["modules"], \
+           "forkserver_pool module wasn't loaded"
+    return app["global"]["forkserver_pool"]
@@ -0,0 +1,118 @@
+import time
+import asyncio
+from contextvars import copy_context
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import aiohttp
+import aiohttp.web
+from yarl import URL
+
+from src.application import app_var
+
+
+__all__ = ("init_app", "get_client", "HttpClient")
+
+
+@dataclass
+class HostStats:
+
+    requests: int = 0
+    errors: int = 0
+    latency_total: float = 0.0
+    latency_max: float = 0.0
+
+    def view(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_avg": self.latency_total / self.requests if self.requests else 0.0,
+            "latency_max": self.latency_max,
+        }
+
+
+class HttpClient:
+    """ A keep-alive session shared by everything the app sends out. """
+
+    limit: int
+    limit_per_host: int
+    dns_ttl: int
+    timeout: aiohttp.ClientTimeout
+    session: Optional[aiohttp.ClientSession] = None
+    hosts: Dict[str, HostStats]
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 8,
+            dns_ttl: int = 300, timeout: float = 10, connect_timeout: float = 3):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.hosts = dict()
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_ttl)
+        self.session = aiohttp.ClientSession(
+            connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def post_json(self, url: str, data: Dict) -> int:
+        """ Posts `data` and returns the response status. Connection errors
+        and timeouts are raised as is. """
+        assert self.session is not None, "HttpClient isn't started"
+        stats = self.hosts.setdefault(URL(url).host, HostStats())
+        stats.requests += 1
+        started_at = time.monotonic()
+        try:
+            async with self.session.post(url, json=data) as resp:
+                await resp.read()
+                if resp.status >= 400:
+                    stats.errors += 1
+                return resp.status
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            stats.errors += 1
+            raise
+        finally:
+            latency = time.monotonic() - started_at
+            stats.latency_total += latency
+            stats.latency_max = max(stats.latency_max, latency)
+
+    def stats(self) -> Dict:
+        return {host: stats.view() for host, stats in self.hosts.items()}
+
+
+async def __startup(app: aiohttp.web.Application):
+    await app["global"]["http_client"].start()
+
+
+async def __cleanup(app: aiohttp.web.Application):
+    if "http_client" not in app["global"].keys():
+        return
+    await app["global"]["http_client"].close()
+
+
+def init_app(app: aiohttp.web.Application):
+    config = app["config"]
+    app["global"]["http_client"] = HttpClient(
+        limit=config.HTTP_CLIENT_LIMIT,
+        limit_per_host=config.HTTP_CLIENT_LIMIT_PER_HOST,
+        dns_ttl=config.HTTP_CLIENT_DNS_TTL,
+        timeout=config.HTTP_CLIENT_TIMEOUT,
+        connect_timeout=config.HTTP_CLIENT_CONNECT_TIMEOUT)
+    app.on_startup.append(__startup)
+    app["custom_cleanups"].append(__cleanup)
+    app["modules"].append("http_client")
+
+
+def get_client() -> HttpClient:
+    assert app_var in copy_context(), "Not inside an app context"
+    app = app_var.get()
+    assert "http_client" in app["modules"], "http_client module wasn't loaded"
+    return app["global"]["http_client"]
@@ -0,0 +1,184 @@
+import os
+import json
+import socket
+import logging
+from contextvars import copy_context
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import aiohttp.web
+import redis.asyncio
+from redis.exceptions import ResponseError
+
+from src.application import app_var
+from src.modules.scheduler import Priority, QueueFull
+
+
+__all__ = ("init_app", "get_queue", "JobQueue", "Job")
+
+
+STREAM_PREFIX = "gtesting:jobs"
+GROUP = "judges"
+
+
+def stream_key(priority: Priority) -> str:
+    return f"{STREAM_PREFIX}:{priority.name.lower()}"
+
+
+@dataclass
+class Job:
+
+    stream: str
+    message_id: str
+    data: Dict
+    deliveries: int = 1
+
+
+class JobQueue:
+    """ Jobs kept in Redis streams, one per priority, and consumed by the
+    judge workers through a consumer group. A delivered job stays pending
+    until it is acknowledged. Jobs idle for longer than
+    `visibility_timeout` seconds, e.g. of a crashed worker, are claimed by
+    other workers, so a worker running a job has to `touch` it
+    periodically. """
+
+    redis: redis.asyncio.Redis
+    consumer: str
+    visibility_timeout: float
+    max_deliveries: int
+    max_length: Optional[int]
+    retry_after: int
+
+    def __init__(self, redis: redis.asyncio.Redis, consumer: str,
+            visibility_timeout: float = 60, max_deliveries: int = 3,
+            max_length: Optional[int] = None, retry_after: int = 5):
+        self.redis = redis
+        self.consumer = consumer
+        self.visibility_timeout = visibility_timeout
+        self.max_deliveries = max_deliveries
+        self.max_length = max_length
+        self.retry_after = retry_after
+
+    async def setup(self):
+        for priority in Priority:
+            try:
+                await self.redis.xgroup_create(stream_key(priority), GROUP,
+                                               id="0", mkstream=True)
+            except ResponseError as err:
+                if "BUSYGROUP" not in str(err):
+                    raise
+
+    async def put(self, data: Dict, priority: Priority = Priority.LIVE) -> str:
+        """ Raises `QueueFull` when `max_length` jobs of the priority are
+        waiting or running already. """
+        stream = stream_key(priority)
+        if self.max_length is not None \
+                and await self.redis.xlen(stream) >= self.max_length:
+            raise QueueFull(self.retry_after)
+        message_id = await self.redis.xadd(stream, {"job": json.dumps(data)})
+        return message_id.decode()
+
+    async def put_many(self, jobs: List[Dict],
+            priority: Priority = Priority.LIVE) -> List[str]:
+        """ Adds the jobs in a single round trip. Raises `QueueFull` adding
+        none of them if they don't fit under `max_length`. """
+        stream = stream_key(priority)
+        if self.max_length is not None \
+                and await self.redis.xlen(stream) + len(jobs) > self.max_length:
+            raise QueueFull(self.retry_after)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for data in jobs:
+                pipe.xadd(stream, {"job": json.dumps(data)})
+            message_ids = await pipe.execute()
+        return [message_id.decode() for message_id in message_ids]
+
+    async def get(self, block: float = 1.0) -> Optional[Job]:
+        """ Takes over a stale job or receives a new one, the higher
+        priorities first. Waits at most `block` seconds for a new live job
+        and returns `None` if nothing came. """
+        for priority in Priority:
+            if job := await self.__reclaim(stream_key(priority)):
+                return job
+        for priority in Priority:
+            if job := await self.__read(stream_key(priority)):
+                return job
+        return await self.__read(stream_key(Priority.LIVE), block)
+
+    async def __read(self, stream: str,
+            block: Optional[float] = None) -> Optional[Job]:
+        resp = await self.redis.xreadgroup(GROUP, self.consumer, {stream: ">"},
+                count=1, block=int(block * 1000) if block else None)
+        for _, messages in resp or ():
+            for message_id, fields in messages:
+                return Job(stream, message_id.decode(),
+                           json.loads(fields[b"job"]))
+        return None
+
+    async def __reclaim(self, stream: str) -> Optional[Job]:
+        resp = await self.redis.xautoclaim(stream, GROUP, self.consumer,
+                min_idle_time=int(self.visibility_timeout * 1000), count=1)
+        for message_id, fields in resp[1]:
+            if fields is None:
+                # Deleted while pending.
+                await self.redis.xack(stream, GROUP, message_id)
+                continue
+            pending = await self.redis.xpending_range(stream, GROUP,
+                    min=message_id, max=message_id, count=1)
+            deliveries = pending[0]["times_delivered"] if pending else 1
+            logging.warning(f"Job {message_id.decode()} of {stream} "
+                            f"redelivered, attempt {deliveries}")
+            return Job(stream, message_id.decode(),
+                       json.loads(fields[b"job"]), deliveries)
+        return None
+
+    def exhausted(self, job: Job) -> bool:
+        """ Whether the job was delivered too many times to try again. """
+        return job.deliveries > self.max_deliveries
+
+    async def touch(self, job: Job):
+        """ Resets the idle time of a running job. """
+        await self.redis.xclaim(job.stream, GROUP, self.consumer,
+                min_idle_time=0, message_ids=[job.message_id], justid=True)
+
+    async def ack(self, job: Job):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(job.stream, GROUP, job.message_id)
+            pipe.xdel(job.stream, job.message_id)
+            await pipe.execute()
+
+    async def stats(self) -> Dict:
+        stats = dict()
+        for priority in Priority:
+            stream = stream_key(priority)
+            pending = await self.redis.xpending(stream, GROUP)
+            stats[priority.name.lower()] = {
+                "length": await self.redis.xlen(stream),
+                "pending": pending["pending"],
+            }
+        return stats
+
+
+async def __startup(app: aiohttp.web.Application):
+    await app["global"]["job_queue"].setup()
+
+
+def init_app(app: aiohttp.web.Application):
+    """ Requires the redis_client module. """
+    config = app["config"]
+    assert "redis_client" in app["modules"], "redis_client module wasn't loaded"
+    app["global"]["job_queue"] = JobQueue(
+        app["global"]["redis_client"],
+        consumer=f"{socket.gethostname()}-{os.getpid()}",
+        visibility_timeout=config.JOB_VISIBILITY_TIMEOUT,
+        max_deliveries=config.JOB_MAX_DELIVERIES,
+        max_length=config.SCHEDULER_QUEUE_SIZE,
+        retry_after=config.SCHEDULER_RETRY_AFTER)
+    app.on_startup.append(__startup)
+    app["modules"].append("job_queue")
+
+
+def get_queue() -> JobQueue:
+    assert app_var in copy_context(), "Not inside an app context"
+    app = app_var.get()
+    assert "job_queue" in app["modules"], "job_queue module wasn't loaded"
+    return app["global"]["job_queue"]
@@ -0,0 +1,306 @@
+import time
+import bisect
+from contextvars import copy_context
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp.web
+
+from src.application import app_var
+from src.testset import Test
+from src.checkers import Checker
+from src.testing_strategy import TestingStrategy, TestResult
+
+
+__all__ = ("init_app", "get_metrics", "Metrics", "Counter", "Gauge",
+        "Histogram", "InstrumentedStrategy", "CONTENT_TYPE")
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str],
+        extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"'
+             for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """ A metric family in the Prometheus text exposition format, one
+    series per tuple of label values. """
+
+    kind: str
+    name: str
+    help: str
+    labels: Tuple[str, ...]
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}",
+                 f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+
+    kind = "counter"
+    _values: Dict[Labels, float]
+
+    def __init__(self, *argv, **kwargs):
+        super().__init__(*argv, **kwargs)
+        self._values = dict()
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labels, labels)} " \
+                  f"{_format_value(value)}"
+
+
+class Gauge(Counter):
+    """ Set by the code, or read from `collect` when rendered. """
+
+    kind = "gauge"
+    collect: Optional[Callable[[], Dict[Labels, float]]]
+
+    def __init__(self, *argv, collect: Callable[[], Dict[Labels, float]] = None,
+            **kwargs):
+        super().__init__(*argv, **kwargs)
+        self.collect = collect
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float):
+        self._values[labels] = value
+
+    def samples(self) -> Iterable[str]:
+        if self.collect is not None:
+            self._values = dict(self.collect())
+        return super().samples()
+
+
+class Histogram(Metric):
+    """ Observations counted into `buckets`, upper bounds in seconds. Only
+    the bucket an observation falls into is updated, the counts are made
+    cumulative when rendered. """
+
+    kind = "histogram"
+    buckets: Tuple[float, ...]
+    _series: Dict[Labels, Tuple[List[int], List[float]]]
+
+    def __init__(self, *argv, buckets: Iterable[float] = DEFAULT_BUCKETS,
+            **kwargs):
+        super().__init__(*argv, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._series = dict()
+
+    def observe(self, value: float, *labels: str):
+        if (series := self._series.get(labels)) is None:
+            series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def samples(self) -> Iterable[str]:
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket" \
+                      f"{_format_labels(self.labels, labels, le)} {cumulative}"
+            label_text = _format_labels(self.labels, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(total[0])}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+class Metrics:
+    """ The metrics of the process. """
+
+    phase_seconds: Histogram
+    verdicts: Counter
+    testers_in_flight: Gauge
+    runs_in_flight: Gauge
+    notification_seconds: Histogram
+    redis_seconds: Histogram
+    _metrics: List[Metric]
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self._metrics = list()
+        self.phase_seconds = self.add(Histogram(
+            "gtesting_phase_seconds",
+            "Duration of the testing phases: prepare, compile, run, cleanup.",
+            ("phase", "language"), buckets=buckets))
+        self.verdicts = self.add(Counter(
+            "gtesting_test_verdicts_total", "Test runs by verdict.",
+            ("language", "verdict")))
+        self.testers_in_flight = self.add(Gauge(
+            "gtesting_testers_in_flight", "Submissions being tested.",
+            ("language",)))
+        self.runs_in_flight = self.add(Gauge(
+            "gtesting_runs_in_flight", "Test runs executing.", ("language",)))
+        self.notification_seconds = self.add(Histogram(
+            "gtesting_notification_seconds",
+            "Duration of the subscriber notifications.",
+            ("mode", "outcome"), buckets=buckets))
+        self.redis_seconds = self.add(Histogram(
+            "gtesting_redis_command_seconds",
+            "Duration of the Redis commands, pipelines as a whole.",
+            ("command",), buckets=buckets))
+
+    def add(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+    def instrument(self, strategy: TestingStrategy,
+            language: str) -> "InstrumentedStrategy":
+        return InstrumentedStrategy(strategy, language, self)
+
+    def notification(self, seconds: float, delta: bool, ok: bool):
+        self.notification_seconds.observe(
+            seconds, "delta" if delta else "full", "ok" if ok else "error")
+
+    def redis_command(self, command: str, seconds: float):
+        self.redis_seconds.observe(seconds, command)
+
+
+class InstrumentedStrategy(TestingStrategy):
+    """ Times the phases of `strategy` and counts its runs and verdicts.
+    Everything else is looked up on the wrapped strategy. """
+
+    strategy: TestingStrategy
+    language: str
+    metrics: Metrics
+    _in_flight: bool = False
+
+    def __init__(self, strategy: TestingStrategy, language: str,
+            metrics: Metrics):
+        self.strategy = strategy
+        self.language = language
+        self.metrics = metrics
+
+    def __getattr__(self, name: str):
+        return getattr(self.strategy, name)
+
+    @property
+    def checker(self) -> Checker:
+        return self.strategy.checker
+
+    def __observe(self, phase: str, started_at: float):
+        self.metrics.phase_seconds.observe(time.monotonic() - started_at,
+                                           phase, self.language)
+
+    async def prepare(self, source: str) -> List[str]:
+        if not self._in_flight:
+            self._in_flight = True
+            self.metrics.testers_in_flight.inc(self.language)
+        started_at = time.monotonic()
+        try:
+            return await self.strategy.prepare(source)
+        finally:
+            self.__observe("prepare", started_at)
+
+    async def compile(self) -> List[str]:
+        started_at = time.monotonic()
+        try:
+            return await self.strategy.compile()
+        finally:
+            self.__observe("compile", started_at)
+
+    async def run(self, test: Test) -> TestResult:
+        self.metrics.runs_in_flight.inc(self.language)
+        started_at = time.monotonic()
+        try:
+            result = await self.strategy.run(test)
+        finally:
+            self.__observe("run", started_at)
+            self.metrics.runs_in_flight.dec(self.language)
+        self.metrics.verdicts.inc(self.language, result.verdict.name)
+        return result
+
+    async def cleanup(self):
+        started_at = time.monotonic()
+        try:
+            await self.strategy.cleanup()
+        finally:
+            self.__observe("cleanup", started_at)
+            if self._in_flight:
+                self._in_flight = False
+                self.metrics.testers_in_flight.dec(self.language)
+
+
+def __collectors(app: aiohttp.web.Application, metrics: Metrics):
+    """ Gauges read from the stats of the other modules when scraped. """
+    modules, state = app["modules"], app["global"]
+    if "scheduler" in modules:
+        metrics.add(Gauge("gtesting_scheduler_queue_depth",
+            "Submissions waiting for a scheduler worker.",
+            collect=lambda: {(): state["scheduler"].stats()["queue_depth"]}))
+    if "tasks_pool" in modules:
+        metrics.add(Gauge("gtesting_tasks_pool_active",
+            "Submissions registered in the tasks pool and not finished.",
+            collect=lambda: {(): state["tasks_pool"].stats()["active"]}))
+    if "compile_pool" in modules:
+        metrics.add(Gauge("gtesting_compile_waiting",
+            "Sources waiting for a compile worker.",
+            collect=lambda: {(): state["compile_pool"].waiting}))
+    if "redis_client" in modules:
+        pool = state["redis_client"].connection_pool
+        metrics.add(Gauge("gtesting_redis_pool_connections",
+            "Connections of the Redis pool by state.", ("state",),
+            collect=lambda: {("in_use",): pool.stats()["in_use"],
+                             ("idle",): pool.stats()["idle"]}))
+
+
+def init_app(app: aiohttp.web.Application):
+    """ Load after the modules whose state is exported, Redis commands are
+    timed if the redis_client module is loaded. """
+    metrics = Metrics(app["config"].METRICS_BUCKETS)
+    __collectors(app, metrics)
+    if "redis_client" in app["modules"]:
+        app["global"]["redis_client"].observer = metrics.redis_command
+    app["global"]["metrics"] = metrics
+    app["modules"].append("metrics")
+
+
+def get_metrics() -> Metrics:
+    assert app_var in copy_context(), "Not inside an app context"
+    app = app_var.get()
+    assert "metrics" in app["modules"], "metrics module wasn't loaded"
+    return app["global"]["metrics"]
@@ -1,22 +1,131 @@
+import time
+import logging
+
 import redis
+import redis.asyncio
+import redis.asyncio.client
 
 from aiohttp import web
 
 from src.application import app_var, config_var
 
 from contextvars import copy_context
+from typing import Callable, Optional
+
+
+class MeteredConnectionPool(redis.asyncio.BlockingConnectionPool):
+    """ Blocking pool which keeps track of how long callers wait for a free
+    connection. """
+
+    waiting: int = 0
+    acquired: int = 0
+    timeouts: int = 0
+    wait_time: float = 0.0
+    wait_time_max: float = 0.0
+
+    async def get_connection(self, *argv, **kwargs):
+        self.waiting += 1
+        started_at = time.monotonic()
+        try:
+            connection = await super().get_connection(*argv, **kwargs)
+        except redis.exceptions.ConnectionError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.waiting -= 1
+            waited = time.monotonic() - started_at
+            self.wait_time += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+        self.acquired += 1
+        return connection
+
+    def stats(self):
+        in_use = len(self._in_use_connections)
+        return {
+            "max_connections": self.max_connections,
+            "in_use": in_use,
+            "idle": len(self._available_connections),
+            "saturation": in_use / self.max_connections,
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "timeouts": self.timeouts,
+            "wait_time_avg": self.wait_time / self.acquired if self.acquired else 0.0,
+            "wait_time_max": self.wait_time_max,
+        }
+
+
+class MeteredRedis(redis.asyncio.Redis):
+    """ Reports how long every command takes to `observer`, a pipeline is
+    reported as a whole when it's executed. """
+
+    observer: Optional[Callable[[str, float], None]] = None
+
+    async def execute_command(self, *args, **options):
+        if self.observer is None:
+            return await super().execute_command(*args, **options)
+        started_at = time.monotonic()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            self.observer(str(args[0]).upper(), time.monotonic() - started_at)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None):
+        pipeline = MeteredPipeline(self.connection_pool, self.response_callbacks,
+                                   transaction, shard_hint)
+        pipeline.observer = self.observer
+        return pipeline
+
+
+class MeteredPipeline(redis.asyncio.client.Pipeline):
+
+    observer: Optional[Callable[[str, float], None]] = None
+
+    async def execute(self, raise_on_error: bool = True):
+        if self.observer is None:
+            return await super().execute(raise_on_error)
+        command = "MULTI" if self.is_transaction else "PIPELINE"
+        started_at = time.monotonic()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            self.observer(command, time.monotonic() - started_at)
+
+
+async def __startup(app: web.Application):
+    try:
+        await app["global"]["redis_client"].ping()
+    except redis.exceptions.RedisError as err:
+        logging.warning(f"Redis isn't available: {err}")
+
+
+async def __cleanup(app: web.Application):
+    if "redis_client" not in app["global"].keys():
+        return
+    await app["global"]["redis_client"].aclose(close_connection_pool=True)
 
 
 def init_app(app: web.Application):
+    config = app["config"]
+    pool = MeteredConnectionPool(
+        host=config.REDIS_HOST,
+        port=config.REDIS_PORT,
+        max_connections=config.REDIS_POOL_SIZE,
+        timeout=config.REDIS_POOL_TIMEOUT,
+        socket_timeout=config.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=config.REDIS_CONNECT_TIMEOUT)
     app["modules"].append("redis_client")
-    app["global"]["redis_client"] = redis.Redis(
-        host=app["config"].REDIS_HOST,
-        port=app["config"].REDIS_PORT)
+    app["global"]["redis_client"] = MeteredRedis(connection_pool=pool)
+    app.on_startup.append(__startup)
+    app["custom_cleanups"].append(__cleanup)
 
 
-def get_redis():
+def get_redis() -> redis.asyncio.Redis:
     assert app_var in copy_context(), "Not in app context"
     app = app_var.get()
     assert "redis_client" in app["modules"], \
            "redis_client module isn't initialized"
     return app["global"]["redis_client"]
+
+
+def get_stats():
+    return get_redis().connection_pool.stats()
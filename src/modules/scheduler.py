@@ -0,0 +1,220 @@
+import os
+import math
+import time
+import logging
+import itertools
+from enum import IntEnum
+from asyncio import PriorityQueue, Semaphore, Task, CancelledError, create_task
+from contextvars import copy_context
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List
+
+import aiohttp.web
+
+from src.application import app_var
+
+
+__all__ = ("init_app", "schedule", "schedule_many", "get_stats",
+        "get_cpu_budget", "Priority", "QueueFull")
+
+
+class Priority(IntEnum):
+    """ Lower value is served first. """
+
+    LIVE = 0
+    REJUDGE = 1
+
+
+class QueueFull(Exception):
+
+    retry_after: int
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Scheduler queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+@dataclass
+class WorkerStats:
+
+    started_at: float
+    busy_time: float = 0.0
+    busy_since: float = None
+    jobs: int = 0
+
+    def utilization(self, now: float) -> float:
+        busy = self.busy_time
+        if self.busy_since is not None:
+            busy += now - self.busy_since
+        elapsed = now - self.started_at
+        return busy / elapsed if elapsed > 0 else 0.0
+
+
+class Scheduler:
+    """ Runs submitted coroutine factories on a fixed number of workers.
+    Pending jobs wait in a bounded priority queue, FIFO inside a priority
+    class. """
+
+    workers_count: int
+    retry_after: int
+    _queue: PriorityQueue
+    _workers: List[Task]
+    _workers_stats: List[WorkerStats]
+
+    def __init__(self, workers: int, queue_size: int, retry_after: int):
+        self.workers_count = workers
+        self.retry_after = retry_after
+        self._queue = PriorityQueue(maxsize=queue_size)
+        self._counter = itertools.count()
+        self._workers = list()
+        self._workers_stats = list()
+        self._queued = {p: 0 for p in Priority}
+        self._rejected = 0
+        self._completed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._job_time_avg = None
+
+    def schedule(self, runner: Callable[[], Awaitable],
+            priority: Priority = Priority.LIVE):
+        if self._queue.full():
+            self._rejected += 1
+            raise QueueFull(self._estimate_retry_after())
+        self._ensure_workers()
+        item = (int(priority), next(self._counter), time.monotonic(), runner)
+        self._queue.put_nowait(item)
+        self._queued[priority] += 1
+
+    def schedule_many(self, runners: List[Callable[[], Awaitable]],
+            priority: Priority = Priority.LIVE):
+        """ Queues all the runners or, if they don't fit, none of them. """
+        if self._queue.maxsize > 0 \
+                and self._queue.qsize() + len(runners) > self._queue.maxsize:
+            self._rejected += len(runners)
+            raise QueueFull(self._estimate_retry_after())
+        for runner in runners:
+            self.schedule(runner, priority)
+
+    def _estimate_retry_after(self) -> int:
+        if self._job_time_avg is None:
+            return self.retry_after
+        drain_time = self._queue.qsize() * self._job_time_avg / self.workers_count
+        return max(self.retry_after, math.ceil(drain_time))
+
+    def _ensure_workers(self):
+        if self._workers:
+            return
+        now = time.monotonic()
+        for i in range(self.workers_count):
+            self._workers_stats.append(WorkerStats(started_at=now))
+            self._workers.append(create_task(self._work(i)))
+
+    async def _work(self, i: int):
+        stats = self._workers_stats[i]
+        while True:
+            priority, _, enqueued_at, runner = await self._queue.get()
+            self._queued[Priority(priority)] -= 1
+            started_at = time.monotonic()
+            wait = started_at - enqueued_at
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            stats.busy_since = started_at
+            try:
+                await runner()
+            except CancelledError:
+                raise
+            except Exception:
+                logging.exception(f"Job {runner} failed")
+            finally:
+                finished_at = time.monotonic()
+                stats.busy_time += finished_at - started_at
+                stats.busy_since = None
+                stats.jobs += 1
+                self._completed += 1
+                self._update_job_time(finished_at - started_at)
+                self._queue.task_done()
+
+    def _update_job_time(self, duration: float):
+        if self._job_time_avg is None:
+            self._job_time_avg = duration
+        else:
+            self._job_time_avg = 0.8 * self._job_time_avg + 0.2 * duration
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            try:
+                await worker
+            except CancelledError:
+                pass
+        self._workers.clear()
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        started = self._completed + sum(1 for s in self._workers_stats
+                                        if s.busy_since is not None)
+        return {
+            "workers": self.workers_count,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "queued_by_priority": {p.name.lower(): n
+                                   for p, n in self._queued.items()},
+            "rejected": self._rejected,
+            "completed": self._completed,
+            "wait_time_avg": self._wait_total / started if started else 0.0,
+            "wait_time_max": self._wait_max,
+            "job_time_avg": self._job_time_avg or 0.0,
+            "utilization": [s.utilization(now) for s in self._workers_stats],
+        }
+
+
+async def __cleanup(app: aiohttp.web.Application):
+    if "scheduler" not in app["global"].keys():
+        return
+    await app["global"]["scheduler"].close()
+
+
+def init_app(app: aiohttp.web.Application, processes: int = 1):
+    """ The CPU budget is split between the `processes` serving the app. """
+    config = app["config"]
+    app["global"]["scheduler"] = Scheduler(
+        workers=config.SCHEDULER_WORKERS or os.cpu_count() or 1,
+        queue_size=config.SCHEDULER_QUEUE_SIZE,
+        retry_after=config.SCHEDULER_RETRY_AFTER)
+    app["global"]["cpu_budget"] = Semaphore(
+        max(1, (config.CPU_BUDGET or os.cpu_count() or 1) // processes))
+    app["custom_cleanups"].append(__cleanup)
+    app["modules"].append("scheduler")
+
+
+def __get_scheduler() -> Scheduler:
+    assert app_var in copy_context(), "Not inside an app context"
+    app = app_var.get()
+    assert "scheduler" in app["modules"], "scheduler module wasn't loaded"
+    return app["global"]["scheduler"]
+
+
+def schedule(runner: Callable[[], Awaitable],
+        priority: Priority = Priority.LIVE):
+    """ Puts `runner` into the queue. Raises `QueueFull` with a retry hint
+    when the queue is at capacity. """
+    __get_scheduler().schedule(runner, priority)
+
+
+def schedule_many(runners: List[Callable[[], Awaitable]],
+        priority: Priority = Priority.LIVE):
+    """ Puts all of `runners` into the queue or raises `QueueFull` leaving
+    it as it was. """
+    __get_scheduler().schedule_many(runners, priority)
+
+
+def get_stats() -> Dict:
+    return __get_scheduler().stats()
+
+
+def get_cpu_budget() -> Semaphore:
+    """ Semaphore every test run holds a slot of, whichever submission it
+    belongs to. """
+    __get_scheduler()
+    return app_var.get()["global"]["cpu_budget"]
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+
+from contextvars import copy_context
+
+import aiohttp.web
+import redis.asyncio
+
+from src import shared_submissions
+from src.application import app_var
+
+
+__all__ = ("init_app", "get_followers")
+
+
+async def __apply(runner):
+    try:
+        await shared_submissions.apply_subscriptions(runner)
+    except Exception:
+        logging.exception(f"Couldn't subscribe to {runner.id}")
+
+
+async def __listen(app: aiohttp.web.Application,
+        pubsub: redis.asyncio.client.PubSub):
+    """ Applies the subscriptions other processes received for the
+    runners of this one, relays snapshots to their new followers and
+    hands the progress of the submissions tested elsewhere to the
+    followers in this process. """
+    pool = app["global"]["tasks_pool"]
+    followers = app["global"]["followers"]
+    async for message in pubsub.listen():
+        if message["type"] != "message":
+            continue
+        channel = message["channel"].decode()
+        if channel.startswith(shared_submissions.PROGRESS_CHANNEL_PREFIX):
+            await followers.dispatch(
+                channel[len(shared_submissions.PROGRESS_CHANNEL_PREFIX):],
+                message["data"])
+            continue
+        try:
+            runner = pool.get(message["data"].decode())
+        except LookupError:
+            continue
+        if channel == shared_submissions.SNAPSHOTS_CHANNEL:
+            shared_submissions.relay_snapshot(runner)
+        else:
+            asyncio.create_task(__apply(runner))
+
+
+async def __startup(app: aiohttp.web.Application):
+    client = app["global"]["redis_client"]
+    pubsub = client.pubsub()
+    await pubsub.subscribe(shared_submissions.SUBSCRIPTIONS_CHANNEL,
+                           shared_submissions.SNAPSHOTS_CHANNEL)
+    app["global"]["followers"] = shared_submissions.Followers(
+        client, pubsub, app["config"].EVENTS_BUFFER_SIZE)
+    app["global"]["shared_subscriptions"] = (pubsub,
+        asyncio.create_task(__listen(app, pubsub)))
+
+
+async def __cleanup(app: aiohttp.web.Application):
+    if "shared_subscriptions" not in app["global"].keys():
+        return
+    pubsub, task = app["global"].pop("shared_subscriptions")
+    app["global"]["followers"].close()
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    except Exception:
+        logging.exception("Subscriptions listener failed")
+    await pubsub.aclose()
+
+
+def init_app(app: aiohttp.web.Application):
+    """ Requires the tasks_pool and redis_client modules. """
+    assert "tasks_pool" in app["modules"], "tasks_pool module wasn't loaded"
+    assert "redis_client" in app["modules"], \
+           "redis_client module wasn't loaded"
+    app.on_startup.append(__startup)
+    # The pubsub is closed before redis_client closes its connections.
+    app["custom_cleanups"].insert(0, __cleanup)
+    app["modules"].append("shared_subscriptions")
+
+
+def get_followers() -> shared_submissions.Followers:
+    assert app_var in copy_context(), "Not inside an app context"
+    app = app_var.get()
+    assert "shared_subscriptions" in app["modules"], \
+           "shared_subscriptions module wasn't loaded"
+    return app["global"]["followers"]
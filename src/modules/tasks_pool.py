@@ -1,53 +1,143 @@
+import time
+import asyncio
 import logging
-from asyncio import coroutine, create_task, CancelledError
+from collections import OrderedDict
 from contextlib import contextmanager
 from contextvars import copy_context
-from typing import Callable, TypeVar
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
 
 import aiohttp.web
 
 from src.application import app_var
+from . import scheduler
+from .scheduler import Priority
 
 
-__all__ = ("init_app", "get", "schedult")
+__all__ = ("init_app", "get", "get_stats", "schedult", "schedult_many",
+        "running", "TasksPool")
 
 
-async def __cleanup(app: aiohttp.web.Application):
-    if "tasks_pool" not in app["global"].keys():
-        return
-    pool = app["global"]["tasks_pool"]
-    for (runner, task) in pool:
-        task.cancel()
+class TasksPool:
+    """ Runners indexed by their `id`. Finished runners stay available for
+    `ttl` seconds, then they are dropped, and handed over to their
+    `archive()` coroutine first if `handoff` is set. """
+
+    ttl: float
+    handoff: bool
+    _active: Dict[str, Any]
+    _finished: "OrderedDict[str, Tuple[Any, float]]"
+
+    def __init__(self, ttl: float, handoff: bool = False):
+        self.ttl = ttl
+        self.handoff = handoff
+        self._active = dict()
+        self._finished = OrderedDict()
+
+    def __len__(self):
+        return len(self._active) + len(self._finished)
+
+    def add(self, runner):
+        self.expire()
+        self._active[runner.id] = runner
+
+    def finish(self, runner):
+        if self._active.pop(runner.id, None) is not None:
+            self._finished[runner.id] = (runner, time.monotonic() + self.ttl)
+
+    def get(self, _id: str):
+        self.expire()
+        if (runner := self._active.get(_id)) is not None:
+            return runner
+        if (entry := self._finished.get(_id)) is not None:
+            return entry[0]
+        raise LookupError(_id)
+
+    def expire(self):
+        now = time.monotonic()
+        while self._finished:
+            _id, (runner, expires_at) = next(iter(self._finished.items()))
+            if expires_at > now:
+                return
+            del self._finished[_id]
+            if self.handoff:
+                asyncio.create_task(self.__archive(runner))
+
+    async def __archive(self, runner):
         try:
-            await task
-        except CancelledError:
-            logging.info(f"Task of {runner} is cancelled.")
+            await runner.archive()
+        except Exception:
+            logging.exception(f"Couldn't archive {runner.id}")
+
+    def stats(self) -> Dict:
+        return {"active": len(self._active), "finished": len(self._finished)}
 
 
 def init_app(app: aiohttp.web.Application):
-    app["global"]["tasks_pool"] = list()
-    app["custom_cleanups"].append(__cleanup)
+    config = app["config"]
+    app["global"]["tasks_pool"] = TasksPool(
+        config.TASKS_POOL_TTL, config.TASKS_POOL_HANDOFF)
     app["modules"].append("tasks_pool")
 
 
-def __get_tasks_pool():
+def __get_tasks_pool() -> TasksPool:
     assert app_var in copy_context(), "Not inside an app context"
     app = app_var.get()
     assert "tasks_pool" in app["modules"], "tasks_pool module wans't loaded"
     return app["global"]["tasks_pool"]
 
 
-def schedult(runner: Callable[..., coroutine], *argv, **kwargs):
+def schedult(runner: Callable[[], Awaitable],
+        priority: Priority = Priority.LIVE):
+    """ Registers the runner and hands it over to the scheduler. Raises
+    `scheduler.QueueFull` if the scheduler can't accept it. """
     pool = __get_tasks_pool()
-    task = create_task(runner(*argv, **kwargs))
-    pool.append((runner, task))
 
+    async def job():
+        try:
+            await runner()
+        finally:
+            pool.finish(runner)
 
-T = TypeVar("T")
+    scheduler.schedule(job, priority)
+    pool.add(runner)
 
 
-def get(pred: Callable[T, bool]) -> T:
-    for (runner, _) in __get_tasks_pool():
-        if pred(runner):
-            return runner
-    raise LookupError()
+def schedult_many(runners: List[Callable[[], Awaitable]],
+        priority: Priority = Priority.LIVE):
+    """ Same as `schedult` for all of `runners` at once, none of them is
+    registered if the scheduler can't accept them all. """
+    pool = __get_tasks_pool()
+
+    def job(runner):
+        async def run():
+            try:
+                await runner()
+            finally:
+                pool.finish(runner)
+        return run
+
+    scheduler.schedule_many([job(runner) for runner in runners], priority)
+    for runner in runners:
+        pool.add(runner)
+
+
+@contextmanager
+def running(runner):
+    """ Registers a runner the caller runs itself for the time of the
+    block. """
+    pool = __get_tasks_pool()
+    pool.add(runner)
+    try:
+        yield runner
+    finally:
+        pool.finish(runner)
+
+
+def get(_id: str):
+    """ Looks a runner up by its id, raises `LookupError` if it's unknown
+    or expired. """
+    return __get_tasks_pool().get(_id)
+
+
+def get_stats() -> Dict:
+    return __get_tasks_pool().stats()
@@ -0,0 +1,173 @@
+import os
+import asyncio
+import hashlib
+import logging
+from uuid import uuid1
+from pathlib import Path
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import copy_context
+from typing import AsyncIterator, BinaryIO, Dict
+
+import aiohttp.web
+
+from src.application import app_var
+from src import file_locks
+from src.testset import Test, write_input
+
+
+__all__ = ("init_app", "get_cache", "TestDataCache")
+
+
+class TestDataCache:
+    """ Test inputs stored on disk under the digest of the test, so the
+    runs get them as their stdin without the input being built in memory.
+    The least recently used files are removed once the total size exceeds
+    `max_size`, except the ones which are open.
+
+    The directory may be shared by several processes, see
+    `src/file_locks.py`. An open file holds a shared lock so the others
+    don't remove it, and a file removed by another process is written
+    again. """
+
+    # Seconds between the attempts to lock a file being removed.
+    LOCK_RETRY_DELAY = 0.01
+
+    root: Path
+    max_size: int
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    _entries: "OrderedDict[str, int]"
+    _pins: Dict[str, int]
+    _staging: Path
+    _staging_lock: int
+
+    def __init__(self, root: Path, max_size: int):
+        self.root = root
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._pins = dict()
+        self.__scan()
+
+    @staticmethod
+    def key(test: Test) -> str:
+        """ The digest of the test, hashing its input only if the test has
+        none yet. Tests loaded from Redis come with one. """
+        if test.digest is None:
+            digest = hashlib.sha256()
+            for token in test.input:
+                digest.update(token.encode())
+                digest.update(b"\0")
+            test.digest = digest.hexdigest()
+        return test.digest
+
+    @property
+    def size(self) -> int:
+        return sum(self._entries.values())
+
+    def __scan(self):
+        self._staging, self._staging_lock = file_locks.staging_dir(
+            self.root / ".staging")
+        files = list()
+        for path in self.root.iterdir():
+            if not path.name.startswith("."):
+                files.append(path)
+            elif path.is_file():
+                # Staged by an older version.
+                path.unlink(missing_ok=True)
+        for path in sorted(files, key=lambda p: p.stat().st_mtime):
+            self._entries[path.name] = path.stat().st_size
+
+    @asynccontextmanager
+    async def open(self, test: Test) -> AsyncIterator[BinaryIO]:
+        """ The input of the test opened for reading, written first if it
+        isn't cached. The file stays while it's open. """
+        key = self.key(test)
+        path = self.root / key
+        # Locked exclusively only while another process removes it.
+        while (fd := file_locks.lock(path)) is None and path.exists():
+            await asyncio.sleep(self.LOCK_RETRY_DELAY)
+        if fd is None:
+            self.misses += 1
+            staged = self._staging / str(uuid1())
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.__write, test, staged)
+            if (fd := file_locks.lock(path)) is not None:
+                # Written by another open meanwhile.
+                staged.unlink()
+            else:
+                # Locked before it's moved, so it can't be removed in
+                # between.
+                fd = file_locks.lock(staged)
+                staged.rename(path)
+            self._entries.pop(key, None)
+            self._entries[key] = os.fstat(fd).st_size
+        else:
+            self.hits += 1
+            os.utime(path)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                # Written by another process.
+                self._entries[key] = os.fstat(fd).st_size
+        self._pins[key] = self._pins.get(key, 0) + 1
+        try:
+            # The runs are given the name of the file as well.
+            with path.open("rb") as f:
+                yield f
+        finally:
+            os.close(fd)
+            if (count := self._pins[key] - 1) > 0:
+                self._pins[key] = count
+            else:
+                del self._pins[key]
+            self.__evict()
+
+    @staticmethod
+    def __write(test: Test, path: Path):
+        with path.open("wb") as f:
+            write_input(test, f)
+
+    def __evict(self):
+        size = self.size
+        for key in list(self._entries.keys()):
+            if size <= self.max_size:
+                return
+            if key in self._pins:
+                continue
+            fd = file_locks.lock(self.root / key, exclusive=True)
+            if fd is None and (self.root / key).exists():
+                # Open in another process.
+                continue
+            size -= self._entries.pop(key)
+            if fd is not None:
+                logging.debug(f"Evicting test input {key}")
+                (self.root / key).unlink(missing_ok=True)
+                os.close(fd)
+                self.evictions += 1
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "size": self.size,
+            "max_size": self.max_size,
+        }
+
+
+def init_app(app: aiohttp.web.Application):
+    config = app["config"]
+    app["global"]["testdata_cache"] = TestDataCache(
+        config.TESTDATA_DIR, config.TESTDATA_CACHE_SIZE)
+    app["modules"].append("testdata_cache")
+
+
+def get_cache() -> TestDataCache:
+    assert app_var in copy_context(), "Not inside an app context"
+    app = app_var.get()
+    assert "testdata_cache" in app["modules"], \
+           "testdata_cache module wasn't loaded"
+    return app["global"]["testdata_cache"]
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from contextvars import copy_context
+from typing import Any, Optional, Tuple
+
+import aiohttp.web
+import redis.asyncio
+from redis.asyncio.retry import Retry
+from redis.backoff import NoBackoff
+
+from src.application import app_var
+
+
+__all__ = ("init_app", "get_cache", "TestSetCache", "INVALIDATION_CHANNEL")
+
+
+INVALIDATION_CHANNEL = "gtesting:testset:invalidate"
+
+
+class TestSetCache:
+    """ LRU cache of deserialized test sets bounded by `max_size` bytes. The
+    size of a test set is an estimate of the memory its tests take. """
+
+    max_size: int
+    size: int = 0
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    _entries: "OrderedDict[str, Tuple[Any, int]]"
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, _id: str) -> Optional[Any]:
+        if (entry := self._entries.get(_id)) is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(_id)
+        return entry[0]
+
+    def put(self, _id: str, ts: Any, size: int):
+        if size > self.max_size:
+            return
+        self.invalidate(_id, count=False)
+        self._entries[_id] = (ts, size)
+        self.size += size
+        while self.size > self.max_size:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def invalidate(self, _id: str, count: bool = True):
+        if (entry := self._entries.pop(_id, None)) is not None:
+            self.size -= entry[1]
+            self.invalidations += count
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "size": self.size,
+            "max_size": self.max_size,
+        }
+
+
+async def __listen(cache: TestSetCache, client: redis.asyncio.Redis,
+        pubsub: redis.asyncio.client.PubSub, delay: float = 0.5,
+        max_delay: float = 30):
+    """ Drops test sets other processes announced as changed. Keyspace
+    notifications are honoured as well when Redis is configured to emit
+    them. When the connection is lost it's subscribed again, backing off
+    from `delay` up to `max_delay` seconds, and the whole cache is dropped
+    since the announcements meanwhile are missed. """
+    retry_in = delay
+    while True:
+        try:
+            if pubsub is None:
+                pubsub = await __subscribe(client)
+                cache.clear()
+                logging.info("Test set invalidation listener reconnected")
+            retry_in = delay
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    cache.invalidate(message["data"].decode())
+                elif message["type"] == "pmessage":
+                    # __keyspace@<db>__:testset:<id>[:tests]
+                    cache.invalidate(message["channel"].decode().split(":")[2])
+        except (redis.exceptions.RedisError, OSError) as err:
+            logging.warning("Test set invalidation listener lost Redis, "
+                            f"reconnecting in {retry_in}s: {err!r}")
+        finally:
+            if pubsub is not None:
+                await pubsub.aclose()
+                pubsub = None
+        await asyncio.sleep(retry_in)
+        retry_in = min(retry_in * 2, max_delay)
+
+
+async def __subscribe(client: redis.asyncio.Redis) -> redis.asyncio.client.PubSub:
+    pubsub = client.pubsub()
+    try:
+        await pubsub.subscribe(INVALIDATION_CHANNEL)
+        await pubsub.psubscribe("__keyspace@*__:testset:*")
+    except BaseException:
+        await pubsub.aclose()
+        raise
+    return pubsub
+
+
+async def __startup(app: aiohttp.web.Application):
+    config = app["config"]
+    # Not retried by the client, which would resubscribe behind the back of
+    # the listener.
+    client = redis.asyncio.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT,
+                                 retry=Retry(NoBackoff(), 0))
+    pubsub = await __subscribe(client)
+    app["global"]["testset_cache_listener"] = (client, asyncio.create_task(
+        __listen(app["global"]["testset_cache"], client, pubsub)))
+
+
+async def __cleanup(app: aiohttp.web.Application):
+    if "testset_cache_listener" not in app["global"].keys():
+        return
+    client, task = app["global"].pop("testset_cache_listener")
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    except Exception:
+        logging.exception("Test set invalidation listener failed")
+    await client.aclose()
+
+
+def init_app(app: aiohttp.web.Application):
+    app["global"]["testset_cache"] = TestSetCache(app["config"].TESTSET_CACHE_SIZE)
+    app.on_startup.append(__startup)
+    app["custom_cleanups"].append(__cleanup)
+    app["modules"].append("testset_cache")
+
+
+def get_cache() -> TestSetCache:
+    assert app_var in copy_context(), "Not inside an app context"
+    app = app_var.get()
+    assert "testset_cache" in app["modules"], \
+           "testset_cache module wasn't loaded"
+    return app["global"]["testset_cache"]
@@ -0,0 +1,61 @@
+from pathlib import Path
+from typing import List
+
+from . import sandbox
+from . import tracing
+from .sandbox import Limits
+from .checkers import Checker
+from .testset import Test
+from .testing_strategy import TestResult
+from .python3_fs_strategy import Python3FSTestingStrategy, State
+from .modules.compile_pool import CompilePool
+from .modules.artifact_cache import ArtifactCache
+from .modules.testdata_cache import TestDataCache
+
+
+SOURCE_NAMES = {"c": "source.c", "cpp": "source.cpp"}
+
+
+class NativeTestingStrategy(Python3FSTestingStrategy):
+    """ C and C++ sources compiled through the shared `CompilePool` and run
+    as executables. The executable is cached along with the source, under
+    the compiler version and flags. """
+
+    pool: CompilePool
+    memory_errors = (b"std::bad_alloc",)
+
+    def __init__(self, language: str, testing_dir: Path, pool: CompilePool,
+            cache: ArtifactCache = None, limits: Limits = None,
+            checker: Checker = None, testdata: TestDataCache = None):
+        super().__init__(testing_dir, cache, limits, checker, testdata)
+        self.language = language
+        self.source_name = SOURCE_NAMES[language]
+        self.pool = pool
+
+    async def toolchain_version(self) -> str:
+        return await self.pool.version(self.language)
+
+    @property
+    def executable(self) -> Path:
+        return self.source_path.parent / "solution"
+
+    async def compile(self) -> List[str]:
+        assert self.state == State.PREPARED
+        if not self.cached:
+            if errors := await self.pool.compile(
+                    self.language, self.source_path, self.executable):
+                return errors
+            self._store_artifact()
+        self.state = State.COMPILED
+        return list()
+
+    async def run(self, test: Test) -> TestResult:
+        assert self.state == State.COMPILED
+        check = self.checker.start(test)
+        async with self.open_input(test) as stdin:
+            with tracing.span("execute"):
+                usage, _, stderr = await sandbox.run(
+                    [str(self.executable.resolve())], stdin, self.limits,
+                    on_output=check.feed)
+        with tracing.span("verdict"):
+            return await self._verdict(usage, check, stderr)
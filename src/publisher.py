@@ -1,8 +1,18 @@
+import json
+import time
+import asyncio
 import logging
-from typing import Dict, List, Callable, TypeVar
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import (AsyncIterator, Deque, Dict, List, Callable, Optional,
+        Set, Tuple, TypeVar)
 
 import aiohttp
 
+from .modules.http_client import HttpClient
+from .modules.metrics import Metrics
+
 
 __all__ = ("Publisher")
 
@@ -10,31 +20,227 @@ __all__ = ("Publisher")
 T = TypeVar("T")
 
 
+@dataclass
+class Subscription:
+    """ A full subscriber receives the whole view on every delivery. A delta
+    subscriber receives `{"events": [...]}` with the events it hasn't seen,
+    starting from a snapshot event. `cursor` is the sequence number of the
+    last event delivered. """
+
+    url: str
+    delta: bool = False
+    cursor: int = 0
+    needs_snapshot: bool = True
+
+
+def sse_frame(event: Dict) -> bytes:
+    return (f"id: {event['seq']}\n"
+            f"event: {event['type']}\n"
+            f"data: {json.dumps(event, separators=(',', ':'))}\n\n").encode()
+
+
+class Watcher:
+    """ In-process subscriber receiving serialized events. At most `maxsize`
+    frames are buffered, when a slow reader falls further behind they are
+    dropped in favour of a single snapshot. """
+
+    maxsize: int
+    overflows: int = 0
+    _frames: Deque[Optional[bytes]]
+    _ready: asyncio.Event
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._frames = deque()
+        self._ready = asyncio.Event()
+
+    def push(self, frame: bytes, snapshot: Callable[[], bytes]):
+        if len(self._frames) >= self.maxsize:
+            self.overflows += 1
+            self._frames.clear()
+            frame = snapshot()
+        self._frames.append(frame)
+        self._ready.set()
+
+    def end(self):
+        self._frames.append(None)
+        self._ready.set()
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        while True:
+            await self._ready.wait()
+            frame = self._frames.popleft()
+            if not self._frames:
+                self._ready.clear()
+            if frame is None:
+                return
+            yield frame
+
+
 class Publisher:
+    """ Delivers the latest state of `data` to the subscribers in the
+    background. Every subscriber has its own sender which is started by an
+    update and sends only the latest view, no more often than once in
+    `min_interval` seconds. Updates arriving in between are coalesced.
+    Notifications go through the shared `client` and are timed into
+    `metrics` if given.
+
+    Updates may carry events, which get consecutive sequence numbers
+    starting from 1 and are kept for delta subscribers and watchers. Each
+    event is serialized once for all the watchers. """
 
     data: T
     view: Callable[T, Dict]
-    subscribers: List[str]
+    subscribers: Dict[str, Subscription]
+    min_interval: float
+    client: HttpClient
+    metrics: Optional[Metrics]
+    events: List[Dict]
+    _version: int
+    _view: Tuple[int, Dict]
+    _dirty: Dict[str, asyncio.Event]
+    _senders: Dict[str, asyncio.Task]
+    _closed: asyncio.Event
+    _watchers: Set[Watcher]
+    _snapshot_frame: Tuple[int, bytes]
 
-    def __init__(self, view: Callable[T, Dict], data: T):
+    def __init__(self, view: Callable[T, Dict], data: T,
+            min_interval: float = 0.0, client: HttpClient = None,
+            metrics: Metrics = None):
         self.view = view
         self.data = data
-        self.subscribers = list()
+        self.subscribers = dict()
+        self.min_interval = min_interval
+        self.client = client
+        self.metrics = metrics
+        self.events = list()
+        self._version = 0
+        self._view = None
+        self._dirty = dict()
+        self._senders = dict()
+        self._closed = asyncio.Event()
+        self._watchers = set()
+        self._snapshot_frame = None
+
+    @property
+    def seq(self) -> int:
+        return len(self.events)
 
-    async def subscribe(self, url: str):
-        self.subscribers.append(url)
-        await self.__notify_single(url)
+    async def subscribe(self, url: str, delta: bool = False,
+            since: Optional[int] = None):
+        """ Subscribing again with the same url replaces the subscription.
+        A delta subscriber passing `since` gets the events after it instead
+        of a snapshot, if they are still known. """
+        assert self.client is not None, "Publisher has no HTTP client"
+        subscription = Subscription(url, delta)
+        if delta and since is not None and 0 <= since <= self.seq:
+            subscription.cursor = since
+            subscription.needs_snapshot = False
+        self.subscribers[url] = subscription
+        if self._closed.is_set():
+            await self.__deliver(subscription)
+        else:
+            self.__schedule(url)
 
-    async def update(self, data: T):
+    async def update(self, data: T, *events: Dict):
         self.data = data
-        for sub in self.subscribers:
-            await self.__notify_single(sub)
-
-    async def __notify_single(self, url: str):
-        data_view = self.view(self.data)
-        async with aiohttp.ClientSession() as s:
-            try:
-                async with s.post(url, json=data_view):
+        self._version += 1
+        for event in events:
+            self.events.append(dict(event, seq=self.seq + 1))
+            if self._watchers:
+                frame = sse_frame(self.events[-1])
+                for watcher in self._watchers:
+                    watcher.push(frame, self.__snapshot_frame)
+        for url in self.subscribers.keys():
+            self.__schedule(url)
+
+    @asynccontextmanager
+    async def watch(self, since: Optional[int] = None,
+            maxsize: int = 64) -> AsyncIterator[Watcher]:
+        """ Yields a watcher iterating over SSE frames until the publisher
+        is closed. It starts with a snapshot unless the events after
+        `since` are known and fit into the buffer. """
+        watcher = Watcher(maxsize)
+        if since is not None and 0 <= since <= self.seq < since + maxsize:
+            for event in self.events[since:]:
+                watcher.push(sse_frame(event), self.__snapshot_frame)
+        else:
+            watcher.push(self.__snapshot_frame(), self.__snapshot_frame)
+        if self._closed.is_set():
+            watcher.end()
+        self._watchers.add(watcher)
+        try:
+            yield watcher
+        finally:
+            self._watchers.discard(watcher)
+
+    async def close(self):
+        """ Stops throttling and waits until the latest state is delivered
+        to every subscriber. """
+        self._closed.set()
+        for watcher in self._watchers:
+            watcher.end()
+        if senders := [s for s in self._senders.values() if not s.done()]:
+            await asyncio.gather(*senders)
+
+    def snapshot(self) -> Dict:
+        return {"seq": self.seq, "type": "snapshot", "data": self.current_view()}
+
+    def __snapshot_frame(self) -> bytes:
+        if self._snapshot_frame is None or self._snapshot_frame[0] != self._version:
+            self._snapshot_frame = (self._version, sse_frame(self.snapshot()))
+        return self._snapshot_frame[1]
+
+    def current_view(self) -> Dict:
+        if self._view is None or self._view[0] != self._version:
+            self._view = (self._version, self.view(self.data))
+        return self._view[1]
+
+    def __schedule(self, url: str):
+        self._dirty.setdefault(url, asyncio.Event()).set()
+        sender = self._senders.get(url)
+        if sender is None or sender.done():
+            self._senders[url] = asyncio.create_task(self.__send(url))
+
+    async def __send(self, url: str):
+        dirty = self._dirty[url]
+        while dirty.is_set():
+            dirty.clear()
+            if (subscription := self.subscribers.get(url)) is None:
+                return
+            await self.__deliver(subscription)
+            if self.min_interval > 0 and not self._closed.is_set():
+                try:
+                    await asyncio.wait_for(self._closed.wait(), self.min_interval)
+                except asyncio.TimeoutError:
                     pass
-            except aiohttp.client_exceptions.ClientConnectorError:
-                logging.warning(f"Couldn't notify the host {url}")
+
+    async def __deliver(self, subscription: Subscription):
+        if not subscription.delta:
+            await self.__notify_single(subscription.url, self.current_view(),
+                                       False)
+            return
+        if subscription.needs_snapshot:
+            events, cursor = [self.snapshot()], self.seq
+        else:
+            events, cursor = self.events[subscription.cursor:], self.seq
+        if not events:
+            return
+        subscription.needs_snapshot = False
+        subscription.cursor = cursor
+        if not await self.__notify_single(subscription.url, {"events": events},
+                                          True):
+            # The receiver may have lost events, resynchronize it.
+            subscription.needs_snapshot = True
+
+    async def __notify_single(self, url: str, data_view: Dict,
+            delta: bool) -> bool:
+        started_at = time.monotonic()
+        try:
+            ok = await self.client.post_json(url, data_view) < 400
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            logging.warning(f"Couldn't notify the host {url}")
+            ok = False
+        if self.metrics is not None:
+            self.metrics.notification(time.monotonic() - started_at, delta, ok)
+        return ok
@@ -0,0 +1,43 @@
+from pathlib import Path
+
+from . import tracing
+from .sandbox import Limits
+from .checkers import Checker
+from .testset import Test
+from .testing_strategy import TestResult
+from .python3_fs_strategy import Python3FSTestingStrategy, State
+from .modules.forkserver_pool import ForkServerPool, ForkServerError
+from .modules.artifact_cache import ArtifactCache
+from .modules.testdata_cache import TestDataCache
+
+
+class Python3ForkServerTestingStrategy(Python3FSTestingStrategy):
+    """ Same as `Python3FSTestingStrategy` but every test is forked from a
+    warm interpreter of the pool instead of starting a new `python3`. The
+    output is bounded by the limit in the worker and compared once the run
+    is over. """
+
+    pool: ForkServerPool
+
+    def __init__(self, testing_dir: Path, pool: ForkServerPool,
+            cache: ArtifactCache = None, limits: Limits = None,
+            checker: Checker = None, testdata: TestDataCache = None):
+        super().__init__(testing_dir, cache, limits, checker, testdata)
+        self.pool = pool
+
+    async def run(self, test: Test) -> TestResult:
+        assert self.state == State.COMPILED
+        try:
+            async with self.open_input(test) as stdin:
+                with tracing.span("execute"):
+                    usage, stdout, stderr = await self.pool.run(
+                        str(self.source_path.resolve()), Path(stdin.name),
+                        self.limits)
+        except ForkServerError as err:
+            # The run may have taken its worker down with it.
+            return TestResult(TestResult.Verdict.RE, [str(err)])
+        with tracing.span("verdict"):
+            check = self.checker.start(test)
+            # Judged as if the run had been stopped on the mismatch.
+            usage.stopped = not check.feed(stdout)
+            return await self._verdict(usage, check, stderr)
@@ -1,13 +1,24 @@
+import time
+import shutil
+import signal
 import logging
 import asyncio
+import tempfile
 from uuid import uuid1
 from enum import Enum
 from pathlib import Path
-from typing import List
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, BinaryIO, List, Optional, Tuple
 
 
-from .testset import Test
+from . import sandbox
+from . import tracing
+from .sandbox import Limits, Usage
+from .checkers import Check, Checker, CheckerError
+from .testset import Test, write_input
 from .testing_strategy import TestingStrategy, TestResult
+from .modules.artifact_cache import ArtifactCache
+from .modules.testdata_cache import TestDataCache
 
 
 class State(Enum):
@@ -18,55 +29,164 @@ class State(Enum):
 
 class Python3FSTestingStrategy(TestingStrategy):
 
+    language: str = "python3"
+    source_name: str = "source.py"
+    # Markers in stderr of a run which failed to allocate memory.
+    memory_errors: Tuple[bytes, ...] = (b"MemoryError",)
     testing_dir: Path
     source_path: Path
+    limits: Limits
     state: State = State.INIT
+    cache: Optional[ArtifactCache]
+    testdata: Optional[TestDataCache]
+    cache_key: Optional[str] = None
+    cached: bool = False
+    _toolchain: Optional[str] = None
 
-    def __init__(self, testing_dir: Path):
+    def __init__(self, testing_dir: Path, cache: ArtifactCache = None,
+            limits: Limits = None, checker: Checker = None,
+            testdata: TestDataCache = None):
         self.testing_dir = testing_dir
+        self.cache = cache
+        self.limits = limits or Limits()
+        self.testdata = testdata
+        if checker is not None:
+            self.checker = checker
+
+    @classmethod
+    async def toolchain_version(cls) -> str:
+        if cls._toolchain is None:
+            proc = await asyncio.create_subprocess_exec(
+                "python3", "-c", "import sys; print(sys.version)",
+                stdout=asyncio.subprocess.PIPE)
+            stdout, _ = await proc.communicate()
+            Python3FSTestingStrategy._toolchain = stdout.decode().strip()
+        return cls._toolchain
 
     async def prepare(self, source: str) -> List[str]:
         assert self.state == State.INIT
-        if not self.testing_dir.exists():
-            logging.debug("Testing directory doesn't exist. Creating "
-                f"{self.testing_dir.resolve()}")
-            self.testing_dir.mkdir(parents=True)
-        source_dir = self.testing_dir / str(uuid1())
-        source_dir.mkdir()
-        self.source_path = source_dir / "source.py"
+        with tracing.span("checker"):
+            errors = await self.checker.prepare()
+        if errors:
+            return errors
+        if self.cache is not None:
+            self.cache_key = self.cache.key(
+                self.language, await self.toolchain_version(), source)
+            if cached_dir := self.cache.lookup(self.cache_key):
+                logging.debug(f"Using the cached artifact {cached_dir}")
+                self.source_path = cached_dir / self.source_name
+                self.cached = True
+                self.state = State.PREPARED
+                return list()
+            source_dir = self.cache.staging_dir()
+        else:
+            if not self.testing_dir.exists():
+                logging.debug("Testing directory doesn't exist. Creating "
+                    f"{self.testing_dir.resolve()}")
+                self.testing_dir.mkdir(parents=True)
+            source_dir = self.testing_dir / str(uuid1())
+            source_dir.mkdir()
+        self.source_path = source_dir / self.source_name
         logging.debug(f"Writing the source code to {self.source_path.resolve()}")
-        with self.source_path.open("w") as f:
+        with tracing.span("write_source"), self.source_path.open("w") as f:
             f.write(source)
         self.state = State.PREPARED
         return list()
 
     async def compile(self) -> List[str]:
         assert self.state == State.PREPARED
+        if self.cached:
+            self.state = State.COMPILED
+            return list()
         command = " ".join(["python3", "-m", "py_compile", str(self.source_path)])
         logging.debug(f"Compiling the source: $ {command}")
-        proc = await asyncio.create_subprocess_shell(
-            command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE)
-        stdout, stderr = await proc.communicate()
+        with tracing.span("py_compile"):
+            proc = await asyncio.create_subprocess_shell(
+                command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE)
+            stdout, stderr = await proc.communicate()
         if proc.returncode != 0:
             return [f"rc: {proc.returncode}", stderr.decode()]
+        self._store_artifact()
         self.state = State.COMPILED
         return list()
 
+    def _store_artifact(self):
+        """ Moves the compiled source directory to the artifact cache. """
+        if self.cache is None:
+            return
+        with tracing.span("store_artifact"):
+            cached_dir = self.cache.store(self.cache_key, self.source_path.parent)
+        self.source_path = cached_dir / self.source_name
+        self.cached = True
+
+    async def cleanup(self):
+        await self.checker.cleanup()
+        if self.cache is None or self.cache_key is None:
+            return
+        if self.cached:
+            self.cache.unpin(self.cache_key)
+        else:
+            shutil.rmtree(self.source_path.parent, ignore_errors=True)
+
     async def run(self, test: Test) -> TestResult:
         assert self.state == State.COMPILED
-        command = " ".join(["python3", str(self.source_path)])
-        data = " ".join(test.input)
-        proc = await asyncio.create_subprocess_shell(
-            command,
-            stdin=asyncio.subprocess.PIPE,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE)
-        stdout, stderr = await proc.communicate(data.encode())
-        if proc.returncode != 0:
-            return TestResult(TestResult.Verdict.RE, stderr.decode())
-        real_output = stdout.decode().split()
-        if real_output != test.output:
-            return TestResult(TestResult.Verdict.WA)
-        return TestResult(TestResult.Verdict.OK)
+        check = self.checker.start(test)
+        async with self.open_input(test) as stdin:
+            with tracing.span("execute"):
+                usage, _, stderr = await sandbox.run(
+                    ["python3", str(self.source_path)], stdin, self.limits,
+                    on_output=check.feed)
+        with tracing.span("verdict"):
+            return await self._verdict(usage, check, stderr)
+
+    @asynccontextmanager
+    async def open_input(self, test: Test) -> AsyncIterator[BinaryIO]:
+        """ The input of the test as a named file, the cached one if there's
+        the test data cache. """
+        started_at = time.monotonic()
+        if self.testdata is not None:
+            async with self.testdata.open(test) as f:
+                tracing.record("input", started_at)
+                yield f
+            return
+        with tempfile.NamedTemporaryFile() as f:
+            write_input(test, f)
+            f.flush()
+            f.seek(0)
+            tracing.record("input", started_at)
+            yield f
+
+    async def _verdict(self, usage: Usage, check: Check,
+            stderr: bytes) -> TestResult:
+        """ A run stopped on the first wrong token is WA whatever else
+        happened to it. The checker only finishes runs which exited
+        normally, CF if it fails to. """
+        result = TestResult(TestResult.Verdict.OK, cpu_time=usage.cpu_time,
+                            wall_time=usage.wall_time, peak_rss=usage.peak_rss)
+        limits = self.limits
+        if usage.stopped:
+            result.verdict = TestResult.Verdict.WA
+            result.messages = check.messages
+        elif usage.timed_out or usage.returncode == -signal.SIGXCPU or (
+                limits.cpu_time is not None and usage.cpu_time > limits.cpu_time):
+            result.verdict = TestResult.Verdict.TLE
+        elif usage.output_exceeded:
+            result.verdict = TestResult.Verdict.OLE
+        elif usage.returncode != 0 and limits.memory is not None and (
+                any(marker in stderr for marker in self.memory_errors)
+                or usage.peak_rss >= limits.memory):
+            result.verdict = TestResult.Verdict.MLE
+        elif usage.returncode != 0:
+            result.verdict = TestResult.Verdict.RE
+            result.messages = [stderr.decode()]
+        else:
+            try:
+                if not await check.finish():
+                    result.verdict = TestResult.Verdict.WA
+                    result.messages = check.messages
+            except CheckerError as err:
+                result.verdict = TestResult.Verdict.CF
+                result.messages = err.messages
+        return result
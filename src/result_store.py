@@ -0,0 +1,120 @@
+import json
+import zlib
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.application import config_var
+from src.modules import redis_client
+
+
+# Storage layout:
+#   report:<id>             hash with the `etag` of the report and its `data`,
+#                           zlib compressed compact json, and the submit
+#                           `request` in the same form; expires in
+#                           RESULT_STORE_TTL seconds
+#   reports:testset:<id>    set of the ids of the test set's submissions whose
+#                           request is stored, expires like the reports
+#
+# The sets used to be `testset:<id>:reports`, which is watched for changes
+# of the test set itself, the ones left are still read until they expire.
+
+
+def _report_key(_id: str) -> str:
+    return f"report:{_id}"
+
+
+def _testset_key(testset_id: str) -> str:
+    return f"reports:testset:{testset_id}"
+
+
+def _legacy_testset_key(testset_id: str) -> str:
+    return f"testset:{testset_id}:reports"
+
+
+def _compress(obj: Dict) -> bytes:
+    return zlib.compress(json.dumps(obj, separators=(",", ":")).encode())
+
+
+def encode(report: Dict) -> Tuple[str, bytes]:
+    """ Returns the etag and the compressed form of `report`. """
+    data = json.dumps(report, separators=(",", ":")).encode()
+    return f'"{hashlib.sha1(data).hexdigest()}"', zlib.compress(data)
+
+
+async def save(_id: str, report: Dict) -> str:
+    r = redis_client.get_redis()
+    etag, data = encode(report)
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.hset(_report_key(_id), mapping={"etag": etag, "data": data})
+        pipe.expire(_report_key(_id), config_var.get().RESULT_STORE_TTL)
+        await pipe.execute()
+    return etag
+
+
+async def save_requests(requests: Dict[str, Dict],
+        reports: Optional[Dict[str, Dict]] = None):
+    """ Stores the submit requests by submission id, and their first
+    reports if given, in a single round trip. """
+    ttl = config_var.get().RESULT_STORE_TTL
+    async with redis_client.get_redis().pipeline(transaction=False) as pipe:
+        for _id, request in requests.items():
+            mapping = {"request": _compress(request)}
+            if reports is not None and _id in reports:
+                mapping["etag"], mapping["data"] = encode(reports[_id])
+            pipe.hset(_report_key(_id), mapping=mapping)
+            pipe.expire(_report_key(_id), ttl)
+            pipe.sadd(_testset_key(request["testset_id"]), _id)
+            pipe.expire(_testset_key(request["testset_id"]), ttl)
+        await pipe.execute()
+
+
+async def load_requests(testset_id: str) -> Dict[str, Dict]:
+    """ The stored submit requests of the test set's submissions by their
+    ids. The ids of the expired ones are dropped. """
+    r = redis_client.get_redis()
+    ids = sorted(_id.decode() for _id in await r.sunion(
+        _testset_key(testset_id), _legacy_testset_key(testset_id)))
+    async with r.pipeline(transaction=False) as pipe:
+        for _id in ids:
+            pipe.hget(_report_key(_id), "request")
+        encoded = await pipe.execute()
+    requests = {_id: json.loads(zlib.decompress(data))
+                for _id, data in zip(ids, encoded) if data is not None}
+    if expired := [_id for _id in ids if _id not in requests]:
+        await forget(testset_id, expired)
+    return requests
+
+
+async def forget(testset_id: str, ids: Iterable[str]):
+    """ Drops the submissions from the ones of the test set, their reports
+    stay. """
+    async with redis_client.get_redis().pipeline(transaction=False) as pipe:
+        pipe.srem(_testset_key(testset_id), *ids)
+        pipe.srem(_legacy_testset_key(testset_id), *ids)
+        await pipe.execute()
+
+
+async def delete(*ids: str):
+    await redis_client.get_redis().delete(*(_report_key(_id) for _id in ids))
+
+
+async def get_etag(_id: str) -> Optional[str]:
+    r = redis_client.get_redis()
+    if etag := await r.hget(_report_key(_id), "etag"):
+        return etag.decode()
+    return None
+
+
+async def load_raw(_id: str) -> Optional[Tuple[str, bytes]]:
+    """ Returns the etag and the report as json bytes. """
+    r = redis_client.get_redis()
+    etag, data = await r.hmget(_report_key(_id), "etag", "data")
+    if etag is None:
+        return None
+    return etag.decode(), zlib.decompress(data)
+
+
+async def load(_id: str) -> Optional[Dict]:
+    if raw := await load_raw(_id):
+        return json.loads(raw[1])
+    return None
@@ -1,18 +1,31 @@
-from typing import Union
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+from uuid import uuid1
+import json
+import asyncio
 import functools
+import collections
 
-from aiohttp import web
+from aiohttp import web, StreamReader
 from marshmallow import ValidationError
 
 from .schemas import *
 
-from .modules import tasks_pool
+from .modules import (tasks_pool, scheduler, forkserver_pool, artifact_cache,
+        testset_cache, testdata_cache, redis_client, http_client, job_queue,
+        metrics, compile_pool, shared_subscriptions)
 from .application import config_var
-from .tester import Tester
+from .tester import Tester, Report, report_view
 from .testing_strategy import TestingStrategy
+from .sandbox import Limits
+from .checkers import Checker
+from . import checkers
 from .python3_fs_strategy import Python3FSTestingStrategy
+from .python3_forkserver_strategy import Python3ForkServerTestingStrategy
+from .native_strategy import NativeTestingStrategy
 from . import testset
-from .testset import TestSet
+from . import result_store
+from . import shared_submissions
+from .testset import Test, TestSet
 
 
 routes = web.RouteTableDef()
@@ -44,48 +57,386 @@ def json_api(req_schema, resp_schema):
     return wrapper
 
 
-def get_strategy(language: str, ts: TestSet) -> Union[TestingStrategy, None]:
-    execution_dir = config_var.get().RUNNERS_DIR
-    if language == "python3":
-        return Python3FSTestingStrategy(execution_dir)
-    return None
+LANGUAGES = ("python3", "c", "cpp")
+
+
+def get_limits(request: Dict) -> Limits:
+    """ The limits asked by a submit request, capped by the configured
+    maximums. """
+    config = config_var.get()
+    return Limits(
+        cpu_time=min(request.get("time_limit", config.TIME_LIMIT),
+                     config.TIME_LIMIT_MAX),
+        wall_time=min(request.get("wall_time_limit", config.WALL_TIME_LIMIT),
+                      config.WALL_TIME_LIMIT_MAX),
+        memory=min(request.get("memory_limit", config.MEMORY_LIMIT),
+                   config.MEMORY_LIMIT_MAX),
+        output=config.OUTPUT_LIMIT)
+
+
+def get_strategy(language: str, limits: Limits = None,
+        checker: Checker = None) -> Union[TestingStrategy, None]:
+    config = config_var.get()
+    execution_dir = config.RUNNERS_DIR
+    cache = artifact_cache.get_cache() if config.ARTIFACT_CACHE else None
+    testdata = testdata_cache.get_cache() if config.TESTDATA_CACHE else None
+    if language == "python3" and config.PYTHON3_FORKSERVER:
+        strategy = Python3ForkServerTestingStrategy(
+            execution_dir, forkserver_pool.get_pool(), cache, limits, checker,
+            testdata)
+    elif language == "python3":
+        strategy = Python3FSTestingStrategy(execution_dir, cache, limits,
+                                            checker, testdata)
+    elif language in ("c", "cpp"):
+        strategy = NativeTestingStrategy(language, execution_dir,
+                                         compile_pool.get_pool(), cache,
+                                         limits, checker, testdata)
+    else:
+        return None
+    if config.METRICS:
+        return metrics.get_metrics().instrument(strategy, language)
+    return strategy
 
 
 @routes.post("/testset")
 @json_api(TestSetSchema(exclude=("_id",)), TestSetSchema())
 async def testset_handler(request):
-    ts = TestSet(**request)
-    testset.save(ts)
+    checker = request.get("checker", checkers.DEFAULT_SPEC)
+    try:
+        checkers.validate(checker, request.get("checker_source"))
+    except ValueError as err:
+        return web.Response(status=500, text=f"Bad request: {err}")
+    ts = TestSet(tests=[Test(**test) for test in request.get("tests", [])],
+                 checker=checker, checker_source=request.get("checker_source"))
+    await testset.save(ts)
     return ts
 
 
+async def read_ndjson(content: StreamReader,
+        max_line: int) -> AsyncIterator[Dict]:
+    """ Parses newline delimited json objects as the body arrives. """
+    buffer = bytearray()
+    scanned = 0
+    async for chunk in content.iter_any():
+        buffer += chunk
+        while (end := buffer.find(b"\n", scanned)) >= 0:
+            line = bytes(buffer[:end])
+            del buffer[:end + 1]
+            scanned = 0
+            if line.strip():
+                yield json.loads(line)
+        scanned = len(buffer)
+        if scanned > max_line:
+            raise ValueError(f"A line is longer than {max_line} bytes")
+    if buffer.strip():
+        yield json.loads(buffer)
+
+
+@routes.post("/testset/stream")
+async def testset_stream_handler(request):
+    """ Uploads a test set as NDJSON, one `{"input": [...], "output": [...]}`
+    test per line. The checker is given by the `checker` and
+    `checker_source` query parameters. """
+    config = config_var.get()
+    schema = TestSchema()
+    checker = request.query.get("checker", checkers.DEFAULT_SPEC)
+    checker_source = request.query.get("checker_source")
+    try:
+        checkers.validate(checker, checker_source)
+        async with testset.TestSetWriter(
+                batch_size=config.TESTSET_UPLOAD_BATCH, checker=checker,
+                checker_source=checker_source) as writer:
+            lines = read_ndjson(request.content, config.TESTSET_MAX_TEST_SIZE)
+            async for test_obj in lines:
+                await writer.add(schema.load(test_obj))
+            await writer.commit()
+    except (ValueError, ValidationError) as err:
+        return web.Response(status=500, text=f"Bad request: {err}")
+    return web.json_response(TestSetUploadRespSchema().dump(
+        { "_id": writer.id, "count": writer.count }))
+
+
 def format_url_template(template: str, **kwargs) -> str:
     for (key, value) in kwargs.items():
         template = template.replace(f"${key}", value)
     return template
 
+
+async def create_tester(request: Dict, _id: Optional[str] = None,
+        checker: Tuple[str, Optional[str]] = None,
+        tests: List[Test] = None) -> Optional[Tester]:
+    """ Builds the tester of a submit request, `None` if there's no
+    strategy for its language. The checker spec and source and the tests
+    of the test set are fetched unless given. """
+    config = config_var.get()
+    spec, source = checker or await testset.get_checker(request["testset_id"])
+    if not (strategy := get_strategy(request["language"], get_limits(request),
+            checkers.create(spec, source, config.RUNNERS_DIR))):
+        return None
+    parallelism = min(request.get("parallel", 1), config.TESTER_MAX_PARALLEL)
+    if tests is None:
+        tests = testset.iter_tests(request["testset_id"],
+                                   config.TESTSET_LOAD_BATCH)
+    return Tester(strategy, request["source"], tests,
+                  parallelism=parallelism,
+                  fail_fast=request.get("fail_fast", False),
+                  cpu_budget=scheduler.get_cpu_budget(),
+                  notify_interval=config.NOTIFY_INTERVAL,
+                  http_client=http_client.get_client(),
+                  store_results=config.RESULT_STORE,
+                  store_interval=config.RESULT_STORE_INTERVAL,
+                  _id=_id,
+                  metrics=metrics.get_metrics() if config.METRICS else None,
+                  trace=config.TRACE_SUBMISSIONS or request.get("trace", False),
+                  trace_dir=config.TRACE_DIR)
+
+
+async def subscribe_callback(submition: Tester, request: Dict):
+    if template := request.get("callback_url_template"):
+        callback_url = format_url_template(template, submition_id=submition.id)
+        await submition.subscribe(callback_url,
+                delta=request.get("callback_mode") == "delta")
+
+
+def queue_full_response(err: scheduler.QueueFull) -> web.Response:
+    return web.Response(status=503,
+            headers={"Retry-After": str(err.retry_after)},
+            text="Too many submissions queued, retry later.")
+
+
+async def submit_many(requests: List[Dict],
+        priority: scheduler.Priority) -> Union[web.Response, List[str]]:
+    """ Accepts all the submit requests or none of them and returns the
+    submission ids. The checkers of the distinct test sets are looked up
+    at once and a test set shared by several submissions is loaded once.
+    The writes to Redis are pipelined and the submissions are queued
+    together, for the judge workers (see `src/judge_worker.py`) with
+    JOB_QUEUE. The submit requests are stored for rejudging. """
+    config = config_var.get()
+    testset_ids = list(dict.fromkeys(r["testset_id"] for r in requests))
+    found = await testset.get_checkers(testset_ids)
+    if missing := [_id for _id in testset_ids if _id not in found]:
+        return web.Response(status=404, text=f"Test set {missing[0]} not found.")
+    if any(r["language"] not in LANGUAGES for r in requests):
+        return web.Response(status=500,
+                text="Couldn't find a testing strategy.")
+    ids = [str(uuid1()) for _ in requests]
+    if config.JOB_QUEUE:
+        await result_store.save_requests(dict(zip(ids, requests)),
+                                         {_id: report_view(Report()) for _id in ids})
+        try:
+            await job_queue.get_queue().put_many(
+                [dict(r, id=_id) for _id, r in zip(ids, requests)], priority)
+        except scheduler.QueueFull as err:
+            await result_store.delete(*ids)
+            return queue_full_response(err)
+        return ids
+    shared = collections.Counter(r["testset_id"] for r in requests)
+    loaded = dict()
+    for _id, count in shared.items():
+        if count > 1 and (ts := await testset.load(_id)) is not None:
+            loaded[_id] = ts.tests
+    submitions = [await create_tester(r, _id, found[r["testset_id"]],
+                                      loaded.get(r["testset_id"]))
+                  for _id, r in zip(ids, requests)]
+    if config.RESULT_STORE:
+        await result_store.save_requests(dict(zip(ids, requests)),
+            {s.id: report_view(s.report) for s in submitions}
+            if config.SHARED_SUBMISSIONS else None)
+    try:
+        tasks_pool.schedult_many(submitions, priority)
+    except scheduler.QueueFull as err:
+        if config.RESULT_STORE:
+            await result_store.delete(*ids)
+        return queue_full_response(err)
+    for submition, request in zip(submitions, requests):
+        if config.SHARED_SUBMISSIONS:
+            asyncio.create_task(shared_submissions.relay(
+                submition, config.EVENTS_BUFFER_SIZE))
+        await subscribe_callback(submition, request)
+    return ids
+
+
 @routes.post("/submit")
 @json_api(SubmitReqSchema(), SubmitRespSchema())
 async def submit(request):
-    if not (ts := testset.load(request["testset_id"])):
+    priority = scheduler.Priority[request.get("priority", "live").upper()]
+    ids = await submit_many([request], priority)
+    if isinstance(ids, web.Response):
+        return ids
+    return { "id": ids[0] }
+
+
+@routes.post("/submit/batch")
+@json_api(BatchSubmitReqSchema(), BatchSubmitRespSchema())
+async def submit_batch(request):
+    """ Many submissions in one request, all of them are accepted or the
+    whole batch is rejected. """
+    requests = request["submissions"]
+    if len(requests) > config_var.get().SUBMIT_BATCH_MAX:
+        return web.Response(status=500, text="Bad request: more than "
+                f"{config_var.get().SUBMIT_BATCH_MAX} submissions.")
+    priority = scheduler.Priority[request.get("priority", "rejudge").upper()]
+    ids = await submit_many(requests, priority)
+    if isinstance(ids, web.Response):
+        return ids
+    return { "ids": ids }
+
+
+@routes.post("/testset/{testset_id}/rejudge")
+async def rejudge(request):
+    """ Submits again every submission of the test set which is still in
+    the result store, with the rejudge priority, in batches of
+    SUBMIT_BATCH_MAX. The new submissions take the place of the old ones for
+    the next rejudge. Once the queue is full the ones submitted so far are
+    returned, the others are left for the next rejudge. """
+    testset_id = request.match_info["testset_id"]
+    if not config_var.get().RESULT_STORE:
+        return web.Response(status=500,
+                text="Rejudging needs the result store.")
+    if not await testset.exists(testset_id):
         return web.Response(status=404, text="Test set not found.")
-    if not (strategy := get_strategy(request["language"], ts)):
-        return web.Response(status=500, 
-                text="Couldn't find a testing strategy.")
-    submition = Tester(strategy, request["source"], ts.tests)
-    if template := request.get("callback_url_template"):
-        callback_url = format_url_template(template, submition_id=submition._id)
-        await submition.subscribe(callback_url)
-    tasks_pool.schedult(submition)
-    return { "id": submition.id }
+    rejudged = dict()
+    old = await result_store.load_requests(testset_id)
+    items = list(old.items())
+    batch_size = config_var.get().SUBMIT_BATCH_MAX
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        ids = await submit_many([r for _, r in batch], scheduler.Priority.REJUDGE)
+        if isinstance(ids, web.Response):
+            if not rejudged:
+                return ids
+            break
+        await result_store.forget(testset_id, [_id for _id, _ in batch])
+        rejudged.update(zip((_id for _id, _ in batch), ids))
+    return web.json_response(RejudgeRespSchema().dump({ "rejudged": rejudged }))
 
 
 @routes.post("/subscribe")
 @json_api(SubcribeReqSchema(), None)
 async def subscribe(request):
+    """ A submission tested by another process gets the subscription
+    through Redis, a finished one is delivered right away. """
+    submition_id = request["submition_id"]
+    url, delta = request["callback_url"], request.get("mode") == "delta"
     try:
-        submition = tasks_pool.get(lambda t: t.id == request["submition_id"])
+        submition = tasks_pool.get(submition_id)
     except LookupError:
+        submition = None
+    if submition is not None:
+        await submition.subscribe(url, delta=delta, since=request.get("since"))
+        return web.Response(status=200)
+    if not config_var.get().SHARED_SUBMISSIONS:
         return web.Response(status=404, text="Submition not found.")
-    await submition.subscribe(request["callback_url"])
+    if (report := await result_store.load(submition_id)) is None:
+        return web.Response(status=404, text="Submition not found.")
+    if shared_submissions.is_final(report):
+        await shared_submissions.deliver_report(url, report, delta)
+    else:
+        await shared_submissions.add_subscription(submition_id, url, delta,
+                                                  request.get("since"))
     return web.Response(status=200)
+
+
+def etag_matches(request: web.Request, etag: str) -> bool:
+    if not (header := request.headers.get("If-None-Match")):
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+@routes.get("/submission/{submition_id}")
+async def submission_report(request):
+    """ Serves the report of a running or recently finished submission from
+    memory and older ones from the result store. Supports `If-None-Match`. """
+    submition_id = request.match_info["submition_id"]
+    headers = { "Cache-Control": "no-cache" }
+    try:
+        submition = tasks_pool.get(submition_id)
+    except LookupError:
+        submition = None
+    if submition is not None:
+        seq, view = submition.snapshot()
+        headers["ETag"] = f'W/"{submition_id}-{seq}"'
+        if etag_matches(request, headers["ETag"]):
+            return web.Response(status=304, headers=headers)
+        return web.json_response(view, headers=headers)
+    if not config_var.get().RESULT_STORE:
+        return web.Response(status=404, text="Submition not found.")
+    if (etag := await result_store.get_etag(submition_id)) is None:
+        return web.Response(status=404, text="Submition not found.")
+    headers["ETag"] = etag
+    if etag_matches(request, etag):
+        return web.Response(status=304, headers=headers)
+    if (raw := await result_store.load_raw(submition_id)) is None:
+        return web.Response(status=404, text="Submition not found.")
+    headers["ETag"] = raw[0]
+    return web.Response(body=raw[1], content_type="application/json",
+                        headers=headers)
+
+
+@routes.get("/submission/{submition_id}/events")
+async def submission_events(request):
+    """ Streams the progress of a submission as Server-Sent Events, starting
+    with a snapshot or, given `Last-Event-ID`, with the missed events. The
+    events of a submission tested by another process are relayed through
+    Redis and always start with a snapshot. """
+    submition_id = request.match_info["submition_id"]
+    config = config_var.get()
+    try:
+        submition = tasks_pool.get(submition_id)
+    except LookupError:
+        submition = None
+    if submition is None:
+        if not config.SHARED_SUBMISSIONS \
+                or await result_store.get_etag(submition_id) is None:
+            return web.Response(status=404, text="Submition not found.")
+        return await stream_events(request,
+                shared_submissions.follow(submition_id,
+                    shared_subscriptions.get_followers()))
+    try:
+        since = int(request.headers.get("Last-Event-ID"))
+    except (TypeError, ValueError):
+        since = None
+    async with submition.watch(since, config.EVENTS_BUFFER_SIZE) as frames:
+        return await stream_events(request, frames)
+
+
+async def stream_events(request: web.Request,
+        frames: AsyncIterator[bytes]) -> web.StreamResponse:
+    resp = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache" })
+    await resp.prepare(request)
+    async for frame in frames:
+        await resp.write(frame)
+    await resp.write_eof()
+    return resp
+
+
+@routes.get("/stats")
+async def stats(request):
+    stats = {
+        "scheduler": scheduler.get_stats(),
+        "tasks_pool": tasks_pool.get_stats(),
+        "redis_pool": redis_client.get_stats(),
+        "http_client": http_client.get_client().stats(),
+        "compile_pool": compile_pool.get_pool().stats(),
+    }
+    if config_var.get().ARTIFACT_CACHE:
+        stats["artifact_cache"] = artifact_cache.get_cache().stats()
+    if config_var.get().TESTDATA_CACHE:
+        stats["testdata_cache"] = testdata_cache.get_cache().stats()
+    if config_var.get().TESTSET_CACHE:
+        stats["testset_cache"] = testset_cache.get_cache().stats()
+    if config_var.get().JOB_QUEUE:
+        stats["job_queue"] = await job_queue.get_queue().stats()
+    return web.json_response(stats)
+
+
+@routes.get("/metrics")
+async def metrics_handler(request):
+    if not config_var.get().METRICS:
+        return web.Response(status=404, text="Metrics are disabled.")
+    return web.Response(body=metrics.get_metrics().render().encode(),
+                        headers={"Content-Type": metrics.CONTENT_TYPE})
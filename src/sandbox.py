@@ -0,0 +1,194 @@
+import os
+import math
+import time
+import signal
+import asyncio
+import resource
+import subprocess
+import tempfile
+import contextlib
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, List, Optional, Tuple, Union
+
+from . import tracing
+
+
+__all__ = ("Limits", "Usage", "run")
+
+
+CHUNK_SIZE = 64 * 1024
+# Bytes of stderr returned, the rest is dropped.
+STDERR_LIMIT = 64 * 1024
+
+
+@dataclass
+class Limits:
+    """ Seconds of CPU and wall clock time, bytes of address space and of
+    output a test run may use, `None` means unlimited. """
+
+    cpu_time: Optional[float] = 2.0
+    wall_time: Optional[float] = 5.0
+    memory: Optional[int] = 256 * 1024 * 1024
+    output: Optional[int] = 64 * 1024 * 1024
+
+
+@dataclass
+class Usage:
+
+    returncode: int
+    cpu_time: float
+    wall_time: float
+    # Bytes.
+    peak_rss: int
+    # Killed after the wall time limit.
+    timed_out: bool = False
+    # Killed for writing more than the output limit.
+    output_exceeded: bool = False
+    # Killed because the output was rejected while it was read.
+    stopped: bool = False
+
+    @classmethod
+    def from_rusage(cls, status: int, rusage: resource.struct_rusage,
+            wall_time: float, **kwargs) -> "Usage":
+        returncode = os.waitstatus_to_exitcode(status)
+        if returncode == -signal.SIGXFSZ:
+            kwargs["output_exceeded"] = True
+        return cls(returncode=returncode,
+                   cpu_time=rusage.ru_utime + rusage.ru_stime,
+                   wall_time=wall_time,
+                   # Kilobytes on Linux.
+                   peak_rss=rusage.ru_maxrss * 1024,
+                   **kwargs)
+
+
+def set_limits(limits: Limits):
+    """ Runs in the child before the exec. The CPU limit kills with
+    SIGXCPU, the hard one a second later with SIGKILL. The output limit
+    bounds the files written, i.e. stderr, with SIGXFSZ or with EFBIG
+    where the signal is ignored. """
+    if limits.cpu_time is not None:
+        seconds = math.ceil(limits.cpu_time)
+        resource.setrlimit(resource.RLIMIT_CPU, (seconds, seconds + 1))
+    if limits.memory is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (limits.memory, limits.memory))
+    if limits.output is not None:
+        resource.setrlimit(resource.RLIMIT_FSIZE, (limits.output, limits.output))
+        # Python ignores it, which would survive the exec.
+        signal.signal(signal.SIGXFSZ, signal.SIG_DFL)
+
+
+def kill(pid: int):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def open_stdin(stdin: Union[bytes, BinaryIO]):
+    if not isinstance(stdin, (bytes, bytearray)):
+        return contextlib.nullcontext(stdin)
+    f = tempfile.TemporaryFile()
+    f.write(stdin)
+    f.seek(0)
+    return f
+
+
+def _wait4(pid: int) -> Tuple[int, resource.struct_rusage, float]:
+    _, status, rusage = os.wait4(pid, 0)
+    return status, rusage, time.monotonic()
+
+
+def wait_exit(pid: int) -> asyncio.Future:
+    """ The exit status, the resource usage and the time the child `pid`
+    exited at, once it's reaped. It's watched through a pidfd on the event
+    loop, so it doesn't wait for a thread of the default executor unless
+    pidfds aren't supported. """
+    loop = asyncio.get_running_loop()
+    try:
+        pidfd = os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        return loop.run_in_executor(None, _wait4, pid)
+    exited = loop.create_future()
+
+    def reap():
+        loop.remove_reader(pidfd)
+        os.close(pidfd)
+        # Readable once it's terminated, so it doesn't block.
+        result = _wait4(pid)
+        if not exited.done():
+            exited.set_result(result)
+
+    loop.add_reader(pidfd, reap)
+    return exited
+
+
+async def run(argv: List[str], stdin: Union[bytes, BinaryIO], limits: Limits,
+        on_output: Callable[[bytes], bool] = None) -> Tuple[Usage, bytes, bytes]:
+    """ Runs `argv` in a new session with `stdin` on its stdin, either the
+    data or a file which is given to the process as it is. The exit status
+    and the resource usage are collected with `wait_exit`, the process
+    group is killed once the wall time is over. The wall time is measured
+    up to the exit of the process.
+
+    Stdout is read in chunks as it's written. Given `on_output` they are
+    passed to it instead of being returned, and the process is killed as
+    soon as it returns `False`. It's killed as well once the output is
+    over the limit. """
+    loop = asyncio.get_running_loop()
+    read_fd, write_fd = os.pipe()
+    with open_stdin(stdin) as stdin, \
+            tempfile.TemporaryFile() as stderr, \
+            open(read_fd, "rb", buffering=0) as stdout_pipe:
+        started_at = time.monotonic()
+        try:
+            with tracing.span("spawn"):
+                proc = subprocess.Popen(argv, stdin=stdin, stdout=write_fd,
+                                        stderr=stderr,
+                                        preexec_fn=lambda: set_limits(limits),
+                                        start_new_session=True)
+        finally:
+            os.close(write_fd)
+        reader = asyncio.StreamReader()
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), stdout_pipe)
+        stdout = bytearray()
+        flags = dict()
+
+        async def read_stdout():
+            size = 0
+            while chunk := await reader.read(CHUNK_SIZE):
+                size += len(chunk)
+                if limits.output is not None and size > limits.output:
+                    flags["output_exceeded"] = True
+                    return kill(proc.pid)
+                if on_output is None:
+                    stdout.extend(chunk)
+                elif not on_output(chunk):
+                    flags["stopped"] = True
+                    return kill(proc.pid)
+
+        waiting = wait_exit(proc.pid)
+        running = asyncio.gather(read_stdout(), waiting)
+        try:
+            await asyncio.wait_for(asyncio.shield(running), limits.wall_time)
+        except asyncio.TimeoutError:
+            flags["timed_out"] = True
+            kill(proc.pid)
+        except asyncio.CancelledError:
+            kill(proc.pid)
+            running.cancel()
+            raise
+        finally:
+            transport.close()
+        status, rusage, exited_at = await waiting
+        # Output of processes which left the group isn't waited for.
+        running.cancel()
+        wall_time = exited_at - started_at
+        # Reaped already, keeps Popen from waiting for it.
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        if limits.output is not None \
+                and os.fstat(stderr.fileno()).st_size >= limits.output:
+            flags["output_exceeded"] = True
+        stderr.seek(0)
+        return (Usage.from_rusage(status, rusage, wall_time, **flags),
+                bytes(stdout), stderr.read(STDERR_LIMIT))
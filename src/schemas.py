@@ -2,12 +2,19 @@ import enum
 from typing import Tuple
 
 from marshmallow_dataclass import class_schema
-from marshmallow import Schema, fields
+from marshmallow import Schema, fields, validate
 
 from .testset import Test, TestSet
 
 
 TestSetSchema = class_schema(TestSet, Schema)
+TestSchema = class_schema(Test, Schema)
+
+
+class TestSetUploadRespSchema(Schema):
+
+    _id = fields.Str()
+    count = fields.Int()
 
 
 class SubmitReqSchema(Schema):
@@ -16,6 +23,20 @@ class SubmitReqSchema(Schema):
     language = fields.Str()
     source = fields.Str()
     callback_url_template = fields.Str(required=False)
+    callback_mode = fields.Str(required=False,
+            validate=validate.OneOf(["full", "delta"]))
+    priority = fields.Str(required=False,
+            validate=validate.OneOf(["live", "rejudge"]))
+    parallel = fields.Int(required=False, validate=validate.Range(min=1))
+    fail_fast = fields.Bool(required=False)
+    # Per test run, seconds and bytes.
+    time_limit = fields.Float(required=False,
+            validate=validate.Range(min=0, min_inclusive=False))
+    wall_time_limit = fields.Float(required=False,
+            validate=validate.Range(min=0, min_inclusive=False))
+    memory_limit = fields.Int(required=False, validate=validate.Range(min=1))
+    # Put the span tree of the testing into the final report.
+    trace = fields.Bool(required=False)
 
 
 class SubmitRespSchema(Schema):
@@ -23,7 +44,32 @@ class SubmitRespSchema(Schema):
     id = fields.Str()
 
 
+class BatchSubmitReqSchema(Schema):
+
+    submissions = fields.List(
+            fields.Nested(SubmitReqSchema(exclude=("priority",))),
+            validate=validate.Length(min=1))
+    # Of the whole batch, `rejudge` if not given.
+    priority = fields.Str(required=False,
+            validate=validate.OneOf(["live", "rejudge"]))
+
+
+class BatchSubmitRespSchema(Schema):
+
+    # In the order of the submissions.
+    ids = fields.List(fields.Str())
+
+
+class RejudgeRespSchema(Schema):
+
+    # Ids of the new submissions by the ids of the rejudged ones.
+    rejudged = fields.Dict(keys=fields.Str(), values=fields.Str())
+
+
 class SubcribeReqSchema(Schema):
 
     submition_id = fields.Str()
     callback_url = fields.Url()
+    mode = fields.Str(required=False, validate=validate.OneOf(["full", "delta"]))
+    # Delta subscribers resuming after the event with this sequence number.
+    since = fields.Int(required=False, validate=validate.Range(min=0))
@@ -0,0 +1,182 @@
+import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Set, Tuple
+
+import redis.asyncio
+import redis.asyncio.client
+
+from src.application import config_var
+from src.modules import redis_client, http_client
+from src.publisher import Publisher, Watcher, sse_frame
+from src.tester import Status, TERMINAL_STATUSES
+from src import result_store
+
+
+# Lets any API process reach a submission tested by another process.
+#
+# Storage layout:
+#   subscriptions:<id>     hash of the callback urls waiting to be applied by
+#                          the process testing the submission, each with a
+#                          json object of the `delta` and `since` arguments
+#
+# Channels:
+#   gtesting:subscriptions     ids of the submissions with new subscriptions
+#   gtesting:snapshots         ids of the submissions whose progress stream
+#                              has a new follower, the process testing one
+#                              relays a fresh snapshot
+#   gtesting:progress:<id>     SSE frames of the submission while it's
+#                              tested, an empty message ends the stream,
+#                              a process follows them through one pubsub
+
+
+SUBSCRIPTIONS_CHANNEL = "gtesting:subscriptions"
+SNAPSHOTS_CHANNEL = "gtesting:snapshots"
+PROGRESS_CHANNEL_PREFIX = "gtesting:progress:"
+
+# Watchers of the submissions relayed by this process.
+_relays: Dict[str, Watcher] = dict()
+
+
+def _subscriptions_key(_id: str) -> str:
+    return f"subscriptions:{_id}"
+
+
+def progress_channel(_id: str) -> str:
+    return f"{PROGRESS_CHANNEL_PREFIX}{_id}"
+
+
+def is_final(report: Dict) -> bool:
+    return Status[report["status"]] in TERMINAL_STATUSES
+
+
+async def add_subscription(_id: str, url: str, delta: bool = False,
+        since: int = None):
+    r = redis_client.get_redis()
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.hset(_subscriptions_key(_id), url,
+                  json.dumps({"delta": delta, "since": since}))
+        pipe.expire(_subscriptions_key(_id), config_var.get().RESULT_STORE_TTL)
+        pipe.publish(SUBSCRIPTIONS_CHANNEL, _id)
+        await pipe.execute()
+
+
+async def take_subscriptions(_id: str) -> List[Tuple[str, Dict]]:
+    r = redis_client.get_redis()
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.hgetall(_subscriptions_key(_id))
+        pipe.delete(_subscriptions_key(_id))
+        subscriptions, _ = await pipe.execute()
+    return [(url.decode(), json.loads(kwargs))
+            for url, kwargs in subscriptions.items()]
+
+
+async def apply_subscriptions(submition):
+    """ Subscribes the callbacks left for `submition` by other processes. """
+    for url, kwargs in await take_subscriptions(submition.id):
+        await submition.subscribe(url, **kwargs)
+
+
+async def deliver_report(url: str, report: Dict, delta: bool = False):
+    """ Sends a stored final report the way a subscription to the finished
+    submission would. """
+    publisher = Publisher(lambda report: report, report,
+                          client=http_client.get_client())
+    await publisher.close()
+    await publisher.subscribe(url, delta)
+
+
+async def relay(submition, maxsize: int = 64):
+    """ Publishes the progress of a submission tested by this process. """
+    r = redis_client.get_redis()
+    channel = progress_channel(submition.id)
+    try:
+        async with submition.watch(maxsize=maxsize) as frames:
+            _relays[submition.id] = frames
+            async for frame in frames:
+                await r.publish(channel, frame)
+    finally:
+        _relays.pop(submition.id, None)
+        await r.publish(channel, b"")
+
+
+def relay_snapshot(submition):
+    """ Puts a snapshot into the relayed progress of `submition`, after
+    the events it includes. """
+    if (watcher := _relays.get(submition.id)) is None:
+        return
+    seq, view = submition.snapshot()
+    frame = sse_frame({"seq": seq, "type": "snapshot", "data": view})
+    watcher.push(frame, lambda: frame)
+
+
+class Followers:
+    """ Follows the progress of the submissions tested by other processes
+    through the single `pubsub` of this process, subscribed to a
+    submission while it has followers here. Every follower reads the
+    frames from a watcher of its own, one which falls behind asks the
+    testing process for a fresh snapshot. """
+
+    client: redis.asyncio.Redis
+    pubsub: redis.asyncio.client.PubSub
+    maxsize: int
+    closed: bool = False
+    _watchers: Dict[str, Set[Watcher]]
+
+    def __init__(self, client: redis.asyncio.Redis,
+            pubsub: redis.asyncio.client.PubSub, maxsize: int = 64):
+        self.client = client
+        self.pubsub = pubsub
+        self.maxsize = maxsize
+        self._watchers = dict()
+
+    @asynccontextmanager
+    async def watch(self, _id: str) -> AsyncIterator[Watcher]:
+        watcher = Watcher(self.maxsize)
+        watchers = self._watchers.setdefault(_id, set())
+        watchers.add(watcher)
+        try:
+            if len(watchers) == 1:
+                await self.pubsub.subscribe(progress_channel(_id))
+            yield watcher
+        finally:
+            watchers.discard(watcher)
+            if not watchers and self._watchers.get(_id) is watchers:
+                del self._watchers[_id]
+                if not self.closed:
+                    await self.pubsub.unsubscribe(progress_channel(_id))
+
+    async def dispatch(self, _id: str, frame: bytes):
+        """ Hands a frame of the progress channel of `_id` to its
+        followers. """
+        lagging = False
+        for watcher in self._watchers.get(_id, ()):
+            if not frame:
+                watcher.end()
+                continue
+            overflows = watcher.overflows
+            watcher.push(frame, lambda: b"")
+            lagging |= watcher.overflows != overflows
+        if lagging:
+            await self.client.publish(SNAPSHOTS_CHANNEL, _id)
+
+    def close(self):
+        self.closed = True
+        for watchers in self._watchers.values():
+            for watcher in watchers:
+                watcher.end()
+
+
+async def follow(_id: str, followers: Followers) -> AsyncIterator[bytes]:
+    """ Yields the SSE frames of a submission tested by another process,
+    starting with the stored report as a snapshot numbered 0, followed by
+    a fresh snapshot from the testing process. Stops at the end of the
+    stream, right away if the stored report is final. """
+    async with followers.watch(_id) as frames:
+        if (report := await result_store.load(_id)) is None:
+            return
+        yield sse_frame({"seq": 0, "type": "snapshot", "data": report})
+        if is_final(report):
+            return
+        await followers.client.publish(SNAPSHOTS_CHANNEL, _id)
+        async for frame in frames:
+            yield frame
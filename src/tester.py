@@ -1,13 +1,22 @@
+import time
 import logging
 from enum import Enum
 from uuid import uuid1
-from typing import List, Iterable
-from asyncio import shield
+from pathlib import Path
+from typing import (Any, AsyncIterable, AsyncIterator, Dict, List, Iterable,
+        Optional, Tuple, Union)
+from asyncio import (Semaphore, Task, FIRST_COMPLETED,
+        create_task, gather, shield, wait)
+from contextlib import nullcontext
 from dataclasses import dataclass, field
 
 from marshmallow_dataclass import class_schema
 
+from . import result_store
+from . import tracing
 from .publisher import Publisher
+from .modules.http_client import HttpClient
+from .modules.metrics import Metrics
 from .testset import Test
 from .testing_strategy import TestingStrategy, TestResult
 
@@ -22,12 +31,33 @@ class Status(Enum):
     Finished = "finished"
 
 
+TERMINAL_STATUSES = (Status.CompilationFailed, Status.Failed, Status.Finished)
+
+
 @dataclass
 class Report:
 
     status: Status = Status.Waiting
     messages: List[str] = field(default_factory=list)
     test_results: List[TestResult] = field(default_factory=list)
+    # Span tree of a traced submission, see `src/tracing.py`.
+    trace: Optional[Dict[str, Any]] = None
+
+
+ReportSchema = class_schema(Report)
+TestResultSchema = class_schema(TestResult)
+report_view = ReportSchema().dump
+test_result_view = TestResultSchema().dump
+
+
+async def aiter_tests(tests: Union[Iterable[Test], AsyncIterable[Test]]
+        ) -> AsyncIterator[Test]:
+    if isinstance(tests, AsyncIterable):
+        async for test in tests:
+            yield test
+    else:
+        for test in tests:
+            yield test
 
 
 class Tester:
@@ -37,50 +67,206 @@ class Tester:
     _publisher: Publisher
     _report: Report
     _source: str
-    _tests: Iterable[Test]
+    _tests: Union[Iterable[Test], AsyncIterable[Test]]
+    _parallelism: int
+    _fail_fast: bool
+    _cpu_budget: Optional[Semaphore]
+    _store_results: bool
+    _store_interval: float
+    _stored_at: float = 0.0
+    _trace: Optional[tracing.Span]
+    _trace_dir: Optional[Path]
 
     @property
     def id(self):
         return self._id
 
+    @property
+    def report(self) -> Report:
+        return self._report
+
     def __init__(self, strategy: object, 
-            source: str, tests: Iterable[Test]):
+            source: str, tests: Union[Iterable[Test], AsyncIterable[Test]],
+            parallelism: int = 1, fail_fast: bool = False,
+            cpu_budget: Optional[Semaphore] = None,
+            notify_interval: float = 0.0,
+            http_client: Optional[HttpClient] = None,
+            store_results: bool = False, store_interval: float = 0.0,
+            _id: Optional[str] = None,
+            metrics: Optional[Metrics] = None, trace: bool = False,
+            trace_dir: Optional[Path] = None):
+        """ `tests` may be an async iterable, it is consumed no further than
+        the running tests. Up to `parallelism` tests are run at once, each of them also
+        holding a slot of the `cpu_budget` shared with other testers.
+        With `fail_fast` the testing stops on the first failed test.
+        Subscribers are notified through `http_client` at most once in
+        `notify_interval` seconds, the final report is always delivered.
+        With `store_results` the report is saved to the result store on
+        every status change, and on new test results at most once in
+        `store_interval` seconds. `_id` is generated unless given. Deliveries
+        to the subscribers are timed into `metrics` if given.
+
+        With `trace` the time from now on is recorded as a span tree and
+        put into the report with the final status. The whole trace, the
+        cleanup included, is also written to `trace_dir` if given. """
         assert isinstance(strategy, (TestingStrategy,))
-        self._id = str(uuid1())
+        assert parallelism >= 1
+        self._id = _id or str(uuid1())
         self._strategy = strategy
         self._source = source
         self._tests = tests
+        self._parallelism = parallelism
+        self._fail_fast = fail_fast
+        self._cpu_budget = cpu_budget
+        self._store_results = store_results
+        self._store_interval = store_interval
         self._report = Report()
-        reportView = class_schema(Report)().dump
-        self._publisher = Publisher(reportView, self._report)
+        self._trace = None
+        self._trace_dir = trace_dir
+        if trace:
+            self._trace = tracing.Span("submission", attrs={"id": self._id})
+            self._trace.child("queued")
+        self._publisher = Publisher(report_view, self._report,
+                                    notify_interval, http_client, metrics)
 
     async def subscribe(self, *argv, **kwargs):
         await self._publisher.subscribe(*argv, **kwargs)
 
+    def watch(self, *argv, **kwargs):
+        return self._publisher.watch(*argv, **kwargs)
+
+    def snapshot(self) -> Tuple[int, Dict]:
+        """ The sequence number of the last event and the report view. """
+        return self._publisher.seq, self._publisher.current_view()
+
+    async def archive(self):
+        """ Moves the report to the result store unless it's already
+        there. """
+        if not self._store_results:
+            await result_store.save(self._id, report_view(self._report))
+
+    async def __set_status(self, status: Status, messages: List[str] = None):
+        self._report.status = status
+        if messages is not None:
+            self._report.messages = messages
+        if self._trace is not None and status in TERMINAL_STATUSES:
+            self._trace.finish()
+            self._report.trace = tracing.trace_view(self._trace)
+        if self._store_results:
+            with tracing.span("store", status=status.value):
+                await self.__store()
+        with tracing.span("publish", status=status.value):
+            await self._publisher.update(self._report, {
+                "type": "status",
+                "status": status.name,
+                "messages": self._report.messages })
+
+    async def __store(self):
+        self._stored_at = time.monotonic()
+        await result_store.save(self._id, report_view(self._report))
+
+    async def __add_result(self, tr: TestResult):
+        self._report.test_results.append(tr)
+        index = len(self._report.test_results) - 1
+        if self._store_results and \
+                time.monotonic() - self._stored_at >= self._store_interval:
+            with tracing.span("store", index=index):
+                await self.__store()
+        with tracing.span("publish", index=index):
+            await self._publisher.update(self._report, {
+                "type": "test_result",
+                "index": index,
+                "result": test_result_view(tr) })
+
     async def __call__(self) -> Report:
-        if errs := (await shield(self._strategy.prepare(self._source))):
-            self._report.status = Status.Failed
-            self._report.message = errs
-            await self._publisher.update(self._report)
+        with tracing.activate(self._trace):
+            if self._trace is not None:
+                self._trace.children[0].finish()
+            try:
+                report = await self.__test()
+            except Exception as err:
+                logging.exception(f"Testing of {self._id} failed")
+                await self.__set_status(Status.Failed, [f"Internal error: {err}"])
+                report = self._report
+            finally:
+                with tracing.span("cleanup"):
+                    await shield(self._strategy.cleanup())
+            with tracing.span("close"):
+                await self._publisher.close()
+        if self._trace is not None and self._trace_dir is not None:
+            self._trace.end = time.monotonic()
+            tracing.write_trace(self._trace_dir, self._id, self._trace)
+        return report
+
+    async def __test(self) -> Report:
+        with tracing.span("prepare"):
+            errs = await shield(self._strategy.prepare(self._source))
+        if errs:
+            await self.__set_status(Status.Failed, errs)
             return self._report
 
-        self._report.status = Status.Compilation
-        await self._publisher.update(self._report)
-            
-        if errs := (await shield(self._strategy.compile())):
-            self._report.status = Status.CompilationFailed
-            self._report.messages = errs
-            await self._publisher.update(self._report)
+        await self.__set_status(Status.Compilation)
+
+        with tracing.span("compile"):
+            errs = await shield(self._strategy.compile())
+        if errs:
+            await self.__set_status(Status.CompilationFailed, errs)
             return self._report
 
-        self._report.status = Status.Running 
-        await self._publisher.update(self._report)
+        await self.__set_status(Status.Running)
 
-        for test in self._tests:
-            tr = await shield(self._strategy.run(test))
-            self._report.test_results.append(tr)
-            await self._publisher.update(self._report)
+        with tracing.span("tests"):
+            await self.__run_tests()
 
-        self._report.status = Status.Finished
-        await self._publisher.update(self._report)
+        await self.__set_status(Status.Finished)
         return self._report
+
+    async def __run_test(self, index: int, test: Test) -> TestResult:
+        with tracing.span("test", index=index):
+            waiting_since = time.monotonic()
+            async with self._cpu_budget or nullcontext():
+                tracing.record("cpu_wait", waiting_since)
+                # Not shielded, a run cancelled on fail-fast has to stop
+                # before its slot and the artifacts it runs are released.
+                return await self._strategy.run(test)
+
+    async def __run_tests(self):
+        """ Keeps at most `_parallelism` tests in flight, never running
+        ahead of the first unreported test by more than that, and reports
+        the results in the test set order. """
+        tests = aiter_tests(self._tests)
+        running: Dict[int, Task] = dict()
+        finished: Dict[int, TestResult] = dict()
+        next_index, reported = 0, 0
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and next_index < reported + self._parallelism:
+                    loading_since = time.monotonic()
+                    try:
+                        test = await anext(tests)
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    tracing.record("load_test", loading_since, index=next_index)
+                    running[next_index] = create_task(
+                        self.__run_test(next_index, test))
+                    next_index += 1
+                if not running:
+                    return
+                await wait(running.values(), return_when=FIRST_COMPLETED)
+                for index, task in list(running.items()):
+                    if task.done():
+                        finished[index] = task.result()
+                        del running[index]
+                while reported in finished:
+                    tr = finished.pop(reported)
+                    reported += 1
+                    await self.__add_result(tr)
+                    if self._fail_fast and tr.verdict != TestResult.Verdict.OK:
+                        return
+        finally:
+            for task in running.values():
+                task.cancel()
+            await gather(*running.values(), return_exceptions=True)
+            await tests.aclose()
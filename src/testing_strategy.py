@@ -1,8 +1,9 @@
 from enum import Enum
-from typing import List, Iterable
+from typing import List, Iterable, Optional
 from dataclasses import dataclass, field
 
 from .testset import Test
+from .checkers import Checker, TokensChecker
 
 
 @dataclass
@@ -13,13 +14,25 @@ class TestResult:
         OK = "Success"
         RE = "Runtime Error"
         WA = "Wrong answer"
+        TLE = "Time limit exceeded"
+        MLE = "Memory limit exceeded"
+        OLE = "Output limit exceeded"
+        # The checker couldn't judge the output.
+        CF = "Checker failed"
 
     verdict: Verdict
     messages: List[str] = field(default_factory=list)
+    # Seconds and bytes used by the run, if measured.
+    cpu_time: Optional[float] = None
+    wall_time: Optional[float] = None
+    peak_rss: Optional[int] = None
 
 
 class TestingStrategy:
 
+    # Compares the outputs of the runs with the expected ones.
+    checker: Checker = TokensChecker()
+
     async def prepare(self, source: str) -> List[str]:
         raise NotImplementedError
 
@@ -28,3 +41,8 @@ class TestingStrategy:
 
     async def run(self, test: Test) -> TestResult:
         raise NotImplementedError
+
+    async def cleanup(self):
+        """ Releases whatever `prepare` and `compile` acquired. Called once
+        the testing is over, whatever its outcome. """
+        pass
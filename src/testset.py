@@ -1,11 +1,18 @@
+import sys
+import zlib
 import uuid
 import json
-from typing import List, Union
+import hashlib
+from typing import AsyncIterator, BinaryIO, Dict, Iterable, List, Optional, \
+        Tuple, Union
 from dataclasses import dataclass, field
 
+import redis
+from marshmallow import ValidationError
 from marshmallow_dataclass import class_schema
 
-from src.modules import redis_client
+from src.application import config_var
+from src.modules import redis_client, testset_cache
 
 
 @dataclass
@@ -13,16 +20,25 @@ class Test():
 
     input: List[str]
     output: List[str]
+    # Names the input in the test data cache, computed once per test. Not
+    # a part of the schema.
+    digest: Optional[str] = field(default=None, init=False, repr=False,
+                                  compare=False)
 
 
 @dataclass
 class TestSet():
 
     tests: List[Test] = field(default_factory=list)
+    # Spec of the checker comparing the outputs, see `src/checkers.py`, and
+    # the source of the `program` one.
+    checker: str = "tokens"
+    checker_source: Optional[str] = None
     _id: str = field(default_factory=lambda: str(uuid.uuid1()))
 
 
 TestSetSchema = class_schema(TestSet)
+TestSchema = class_schema(Test)
 
 
 class TestSetExists(Exception):
@@ -30,18 +46,253 @@ class TestSetExists(Exception):
     pass
 
 
-def load(_id: str) -> Union[TestSet]:
+# Storage layout:
+#   testset:<id>        hash with the test set metadata (`count`,
+#                       `checker` and optionally `checker_source`)
+#   testset:<id>:tests  list of tests, each one is a zlib compressed compact
+#                       json `[input, output]`
+#
+# Test sets saved before as a single json string under `<id>` are moved
+# to this layout the first time they're looked up.
+
+
+def _meta_key(_id: str) -> str:
+    return f"testset:{_id}"
+
+
+def _tests_key(_id: str) -> str:
+    return f"testset:{_id}:tests"
+
+
+async def _migrate_legacy(_id: str) -> bool:
+    """ Moves a test set of the single key format to the current layout,
+    whether there was one. """
     r = redis_client.get_redis()
-    if ts_bytes := r.get(_id):
-        ts_obj = json.loads(ts_bytes)
-        return TestSetSchema().load(ts_obj)
-    return None
+    try:
+        data = await r.get(_id)
+        if data is None:
+            return False
+        ts = TestSetSchema().load(json.loads(data))
+    except (redis.exceptions.ResponseError, ValueError, ValidationError):
+        # Some other key under the same name.
+        return False
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.delete(_tests_key(_id))
+        if ts.tests:
+            pipe.rpush(_tests_key(_id), *[encode_test(t) for t in ts.tests])
+        pipe.hset(_meta_key(_id), mapping={"count": len(ts.tests),
+                                           "checker": ts.checker})
+        pipe.delete(_id)
+        await pipe.execute()
+    return True
+
+
+def encode_test(test: Test) -> bytes:
+    return zlib.compress(json.dumps([test.input, test.output],
+                                    separators=(",", ":")).encode())
+
+
+def decode_test(data: bytes) -> Test:
+    """ The digest of the test is the one of its encoded form, far smaller
+    than the input. """
+    test_input, test_output = json.loads(zlib.decompress(data))
+    test = Test(input=test_input, output=test_output)
+    test.digest = hashlib.sha256(data).hexdigest()
+    return test
+
+
+def write_input(test: Test, f: BinaryIO):
+    """ Writes the stdin of a test run, the input tokens separated by
+    spaces, without joining them in memory. """
+    for i, token in enumerate(test.input):
+        if i:
+            f.write(b" ")
+        f.write(token.encode())
+
+
+def _sizeof_test(test: Test) -> int:
+    """ Rough size of the test in memory, its token lists and the tokens
+    with the overhead of every object counted. """
+    return sys.getsizeof(test.input) + sys.getsizeof(test.output) \
+         + sum(map(sys.getsizeof, test.input)) \
+         + sum(map(sys.getsizeof, test.output))
+
+
+async def exists(_id: str) -> bool:
+    r = redis_client.get_redis()
+    if config_var.get().TESTSET_CACHE and testset_cache.get_cache().get(_id):
+        return True
+    return bool(await r.exists(_meta_key(_id))) or await _migrate_legacy(_id)
+
+
+def _from_meta(_id: str, meta: Dict[bytes, bytes], tests: List[Test]) -> TestSet:
+    source = meta.get(b"checker_source")
+    return TestSet(tests=tests, _id=_id,
+                   checker=meta.get(b"checker", b"tokens").decode(),
+                   checker_source=source.decode() if source is not None else None)
+
+
+async def iter_tests(_id: str, batch_size: int = 16) -> AsyncIterator[Test]:
+    """ Yields the tests of the test set fetching `batch_size` of them from
+    Redis at a time. Cached test sets are served from the cache, the ones
+    no bigger than `TESTSET_CACHE_FILL` are cached once read to the end. """
+    r = redis_client.get_redis()
+    config = config_var.get()
+    cache = testset_cache.get_cache() if config.TESTSET_CACHE else None
+    if cache and (ts := cache.get(_id)):
+        for test in ts.tests:
+            yield test
+        return
+    # Kept for the cache until they get too big.
+    read: Optional[List[Test]] = list() if cache else None
+    size = 0
+    start = 0
+    while True:
+        encoded = await r.lrange(_tests_key(_id), start, start + batch_size - 1)
+        for data in encoded:
+            test = decode_test(data)
+            if read is not None:
+                size += _sizeof_test(test)
+                if size <= config.TESTSET_CACHE_FILL:
+                    read.append(test)
+                else:
+                    read = None
+            yield test
+        if len(encoded) < batch_size:
+            break
+        start += batch_size
+    if read is None:
+        return
+    meta = await r.hgetall(_meta_key(_id))
+    # Left alone if it was deleted or replaced while being read.
+    if meta and int(meta[b"count"]) == len(read):
+        cache.put(_id, _from_meta(_id, meta, read), size)
+
+
+async def get_checkers(ids: Iterable[str]) -> Dict[str, Tuple[str, Optional[str]]]:
+    """ The checker spec and source of the test sets, without loading their
+    tests, in a single round trip. Missing test sets are left out. """
+    cache = testset_cache.get_cache() if config_var.get().TESTSET_CACHE else None
+    checkers, fetched = dict(), list()
+    for _id in ids:
+        if cache and (ts := cache.get(_id)):
+            checkers[_id] = (ts.checker, ts.checker_source)
+        else:
+            fetched.append(_id)
+    if not fetched:
+        return checkers
+    async with redis_client.get_redis().pipeline(transaction=False) as pipe:
+        for _id in fetched:
+            pipe.hmget(_meta_key(_id), "count", "checker", "checker_source")
+        metas = await pipe.execute()
+    for _id, (count, checker, source) in zip(fetched, metas):
+        if count is not None:
+            checkers[_id] = (checker.decode() if checker else "tokens",
+                             source.decode() if source is not None else None)
+        elif await _migrate_legacy(_id):
+            checkers[_id] = ("tokens", None)
+    return checkers
+
+
+async def get_checker(_id: str) -> Tuple[str, Optional[str]]:
+    """ The checker spec and source of the test set, the default checker if
+    it doesn't exist. """
+    return (await get_checkers([_id])).get(_id, ("tokens", None))
+
+
+async def load(_id: str) -> Union[TestSet]:
+    r = redis_client.get_redis()
+    cache = testset_cache.get_cache() if config_var.get().TESTSET_CACHE else None
+    if cache and (ts := cache.get(_id)):
+        return ts
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.hgetall(_meta_key(_id))
+        pipe.lrange(_tests_key(_id), 0, -1)
+        meta, encoded = await pipe.execute()
+    if not meta:
+        if not await _migrate_legacy(_id):
+            return None
+        return await load(_id)
+    tests = [decode_test(data) for data in encoded]
+    ts = _from_meta(_id, meta, tests)
+    if cache:
+        cache.put(_id, ts, sum(_sizeof_test(t) for t in tests))
+    return ts
+
+
+class TestSetWriter:
+    """ Stores a test set test by test keeping at most `batch_size` encoded
+    tests in memory. The tests are written under a temporary key and the
+    test set shows up atomically on `commit`. """
+
+    _id: str
+    count: int = 0
+    batch_size: int
+    checker: str
+    checker_source: Optional[str]
+    _batch: List[bytes]
+
+    def __init__(self, _id: str = None, batch_size: int = 64,
+            checker: str = "tokens", checker_source: Optional[str] = None):
+        self._id = _id or str(uuid.uuid1())
+        self.batch_size = batch_size
+        self.checker = checker
+        self.checker_source = checker_source
+        self._batch = list()
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def upload_key(self) -> str:
+        return f"{_tests_key(self._id)}:upload"
+
+    async def __aenter__(self):
+        if await exists(self._id):
+            raise TestSetExists()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            await redis_client.get_redis().delete(self.upload_key)
+
+    async def add(self, test: Test):
+        self._batch.append(encode_test(test))
+        self.count += 1
+        if len(self._batch) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        if self._batch:
+            await redis_client.get_redis().rpush(self.upload_key, *self._batch)
+            self._batch.clear()
+
+    async def commit(self):
+        await self.flush()
+        async with redis_client.get_redis().pipeline(transaction=True) as pipe:
+            if self.count:
+                pipe.rename(self.upload_key, _tests_key(self._id))
+            meta = {"count": self.count, "checker": self.checker}
+            if self.checker_source is not None:
+                meta["checker_source"] = self.checker_source
+            pipe.hset(_meta_key(self._id), mapping=meta)
+            await pipe.execute()
+
 
+async def save(ts: TestSet):
+    async with TestSetWriter(ts._id, checker=ts.checker,
+                             checker_source=ts.checker_source) as writer:
+        for test in ts.tests:
+            await writer.add(test)
+        await writer.commit()
 
 
-def save(ts: TestSet):
+async def delete(_id: str):
+    """ Removes the test set and tells every process to drop its cached
+    copy. """
     r = redis_client.get_redis()
-    if load(ts._id):
-        raise TestSetExists()
-    ts_obj = TestSetSchema().dump(ts)
-    r.set(ts._id, json.dumps(ts_obj))
+    await r.delete(_meta_key(_id), _tests_key(_id))
+    if config_var.get().TESTSET_CACHE:
+        testset_cache.get_cache().invalidate(_id)
+    await r.publish(testset_cache.INVALIDATION_CHANNEL, _id)
@@ -0,0 +1,136 @@
+import json
+import time
+from uuid import uuid1
+from pathlib import Path
+from contextvars import ContextVar
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+
+__all__ = ("Span", "activate", "span", "record", "trace_view",
+        "chrome_trace", "write_trace")
+
+
+@dataclass
+class Span:
+    """ A timed step of a submission, times are `time.monotonic` seconds.
+    A span which is still open has no `end`. """
+
+    name: str
+    start: float = field(default_factory=time.monotonic)
+    end: Optional[float] = None
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    children: List["Span"] = field(default_factory=list)
+
+    def child(self, name: str, **attrs) -> "Span":
+        span = Span(name, attrs=attrs)
+        self.children.append(span)
+        return span
+
+    def finish(self):
+        if self.end is None:
+            self.end = time.monotonic()
+
+
+# The span new spans are added to, none while nothing is traced.
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span",
+                                                      default=None)
+
+
+@contextmanager
+def activate(span: Optional[Span]) -> Iterator[Optional[Span]]:
+    """ Makes `span` the current one for the block, tasks created inside
+    it add their spans to it as well. """
+    token = current_span.set(span)
+    try:
+        yield span
+    finally:
+        current_span.reset(token)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Optional[Span]]:
+    """ A child of the current span lasting for the block, nothing if no
+    trace is active. A block left with an exception has it in `error`. """
+    if (parent := current_span.get()) is None:
+        yield None
+        return
+    child = parent.child(name, **attrs)
+    token = current_span.set(child)
+    try:
+        yield child
+    except BaseException as err:
+        child.attrs["error"] = type(err).__name__
+        raise
+    finally:
+        child.finish()
+        current_span.reset(token)
+
+
+def record(name: str, start: float, **attrs):
+    """ Adds a child to the current span which started at `start` and ends
+    now. """
+    if (parent := current_span.get()) is not None:
+        child = parent.child(name, **attrs)
+        child.start = start
+        child.finish()
+
+
+def trace_view(root: Span, origin: Optional[float] = None) -> Dict:
+    """ The span tree with the start offsets from `root` and the durations
+    in milliseconds. """
+    origin = root.start if origin is None else origin
+    view = {
+        "name": root.name,
+        "start": round((root.start - origin) * 1000, 3),
+        "duration": round((root.end - root.start) * 1000, 3)
+                    if root.end is not None else None,
+    }
+    if root.attrs:
+        view["attrs"] = dict(root.attrs)
+    if root.children:
+        view["children"] = [trace_view(child, origin) for child in root.children]
+    return view
+
+
+def chrome_trace(root: Span, pid: int = 1) -> Dict:
+    """ The span tree in the Trace Event Format read by chrome://tracing
+    and Perfetto. Spans overlapping their earlier siblings, the tests run
+    in parallel, are put on threads of their own. """
+    events = list()
+    next_tid = 1
+
+    def walk(span: Span, tid: int):
+        nonlocal next_tid
+        end = span.end if span.end is not None else span.start
+        events.append({"name": span.name, "ph": "X", "pid": pid, "tid": tid,
+                       "ts": round((span.start - root.start) * 1e6, 1),
+                       "dur": round((end - span.start) * 1e6, 1),
+                       "args": span.attrs})
+        # Threads the children may go to and when they're free again.
+        lanes = [[tid, span.start]]
+        for child in sorted(span.children, key=lambda s: s.start):
+            for lane in lanes:
+                if lane[1] <= child.start:
+                    break
+            else:
+                next_tid += 1
+                lane = [next_tid, child.start]
+                lanes.append(lane)
+            lane[1] = child.end if child.end is not None else child.start
+            walk(child, lane[0])
+
+    walk(root, next_tid)
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def write_trace(directory: Path, name: str, root: Span) -> Path:
+    """ Writes the Chrome trace of `root` to `directory/<name>.json`. """
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{name}.json"
+    staged = directory / f".{uuid1()}"
+    with staged.open("w") as f:
+        json.dump(chrome_trace(root), f)
+    staged.rename(path)
+    return path
@@ -12,7 +12,8 @@ from src.routes import routes
 from src.application import create_app, app_context
 from src.tester import Report, Status
 from src.testing_strategy import TestResult
-from src.modules import tasks_pool, redis_client
+from src.modules import scheduler, tasks_pool, redis_client, artifact_cache, \
+        testset_cache, testdata_cache, http_client, metrics, compile_pool
 
 class Config: 
 
@@ -39,8 +40,15 @@ class ClientServerFixture(unittest.IsolatedAsyncioTestCase):
 
     async def __run_server(self):
         self.server = create_app(["--config", "config:TestingConfig"], routes)
+        scheduler.init_app(self.server)
         tasks_pool.init_app(self.server)
         redis_client.init_app(self.server)
+        http_client.init_app(self.server)
+        compile_pool.init_app(self.server)
+        artifact_cache.init_app(self.server)
+        testdata_cache.init_app(self.server)
+        testset_cache.init_app(self.server)
+        metrics.init_app(self.server)
         self.server_runner = web.AppRunner(self.server)
         await self.server_runner.setup()
         site = web.TCPSite(self.server_runner, Config.Server.HOST, Config.Server.PORT)
@@ -69,8 +77,8 @@ class ClientServerFixture(unittest.IsolatedAsyncioTestCase):
     async def asyncTearDown(self):
         with app_context(self.server):
             r = redis_client.get_redis()
-            for key in r.keys("*"):
-                r.delete(key)
+            for key in await r.keys("*"):
+                await r.delete(key)
         await self.server_runner.cleanup()
         await self.client_runner.cleanup()
 
@@ -170,3 +178,44 @@ class IntegrationTest(ClientServerFixture):
         await asyncio.wait_for(self._wait_unitl_tested(sub_id), timeout=10)
         report = self.submition_states[sub_id]
         self.assertEqual(report.status, Status.CompilationFailed)
+
+    async def test_events_stream(self):
+        data_dir = Path(__file__).resolve().parent / "data" / "matrix_multiplication"
+        sub_id, ts = await self._execute_python3(data_dir)
+        events = list()
+        async with ClientSession() as s:
+            async with s.get(f"{Config.Server.URL}/submission/{sub_id}/events") as resp:
+                self.assertEqual(resp.status, 200)
+                async for line in resp.content:
+                    if line.startswith(b"data: "):
+                        events.append(json.loads(line[len("data: "):]))
+        self.assertEqual(events[0]["type"], "snapshot")
+        seqs = [e["seq"] for e in events]
+        self.assertEqual(seqs, list(range(seqs[0], seqs[0] + len(seqs))))
+        self.assertEqual(events[-1]["type"], "status")
+        self.assertEqual(events[-1]["status"], Status.Finished.name)
+
+    async def test_submission_report(self):
+        data_dir = Path(__file__).resolve().parent / "data" / "matrix_multiplication"
+        sub_id, ts = await self._execute_python3(data_dir)
+        await asyncio.wait_for(self._wait_unitl_tested(sub_id), timeout=10)
+        url = f"{Config.Server.URL}/submission/{sub_id}"
+        async with ClientSession() as s:
+            async with s.get(url) as resp:
+                self.assertEqual(resp.status, 200)
+                report = class_schema(Report)().load(await resp.json())
+                etag = resp.headers["ETag"]
+            self.assertEqual(report.status, Status.Finished)
+            async with s.get(url, headers={"If-None-Match": etag}) as resp:
+                self.assertEqual(resp.status, 304)
+
+            # Once the submission leaves the memory it's served from Redis.
+            self.server["global"]["tasks_pool"]._finished.clear()
+            async with s.get(url) as resp:
+                self.assertEqual(resp.status, 200)
+                self.assertEqual(class_schema(Report)().load(await resp.json()), report)
+                etag = resp.headers["ETag"]
+            async with s.get(url, headers={"If-None-Match": etag}) as resp:
+                self.assertEqual(resp.status, 304)
+            async with s.get(f"{Config.Server.URL}/submission/unknown") as resp:
+                self.assertEqual(resp.status, 404)
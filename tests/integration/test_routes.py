@@ -1,3 +1,4 @@
+import json
 import unittest
 import asyncio
 import warnings
@@ -6,8 +7,10 @@ from aiohttp import web, ClientSession
 
 from src.schemas import *
 from src.routes import routes
-from src.application import create_app
-from src.modules import tasks_pool, redis_client
+from src.application import create_app, app_context
+from src import testset, result_store
+from src.modules import scheduler, tasks_pool, redis_client, artifact_cache, \
+        testset_cache, testdata_cache, http_client, metrics, compile_pool
 
 
 PROT = "http"
@@ -23,8 +26,15 @@ class RoutesTest(unittest.IsolatedAsyncioTestCase):
 
     async def asyncSetUp(self):
         self.app = create_app(["--config", "config:TestingConfig"], routes)
+        scheduler.init_app(self.app)
         tasks_pool.init_app(self.app)
         redis_client.init_app(self.app)
+        http_client.init_app(self.app)
+        compile_pool.init_app(self.app)
+        artifact_cache.init_app(self.app)
+        testdata_cache.init_app(self.app)
+        testset_cache.init_app(self.app)
+        metrics.init_app(self.app)
         self.runner = web.AppRunner(self.app)
         await self.runner.setup()
         site = web.TCPSite(self.runner, HOST, PORT)
@@ -74,6 +84,43 @@ class RoutesTest(unittest.IsolatedAsyncioTestCase):
             async with s.post(f"{URL}/testset", json=testset) as resp:
                 self.assertEqual(resp.status, 500)
 
+    async def test_upload_testset_stream(self):
+        body = "\n".join(json.dumps({"input": [str(i), "2"], "output": [str(i + 2)]})
+                         for i in range(100))
+        async with ClientSession() as s:
+            async with s.post(f"{URL}/testset/stream", data=body) as resp:
+                self.assertEqual(resp.status, 200)
+                resp_obj = await resp.json()
+        self.assertEqual(resp_obj["count"], 100)
+        with app_context(self.app):
+            ts = await testset.load(resp_obj["_id"])
+        self.assertEqual(ts.tests[42].output, ["44"])
+
+    async def test_upload_testset_checker(self):
+        async with ClientSession() as s:
+            async with s.post(f"{URL}/testset", json={"tests": [],
+                    "checker": "float:0.001"}) as resp:
+                self.assertEqual(resp.status, 200)
+                _id = (await resp.json())["_id"]
+            async with s.post(f"{URL}/testset", json={"tests": [],
+                    "checker": "program"}) as resp:
+                self.assertEqual(resp.status, 500)
+            async with s.post(f"{URL}/testset/stream",
+                    params={"checker": "lines"}, data="") as resp:
+                self.assertEqual(resp.status, 200)
+                stream_id = (await resp.json())["_id"]
+        with app_context(self.app):
+            self.assertEqual(await testset.get_checker(_id), ("float:0.001", None))
+            self.assertEqual(await testset.get_checker(stream_id), ("lines", None))
+
+    async def test_upload_testset_stream_wrong(self):
+        body = json.dumps({"input": ["1"], "output": ["1"]}) + "\n{\"input\": 1}\n"
+        async with ClientSession() as s:
+            async with s.post(f"{URL}/testset/stream", data=body) as resp:
+                self.assertEqual(resp.status, 500)
+        with app_context(self.app):
+            self.assertEqual(await redis_client.get_redis().keys("testset:*:upload"), [])
+
     async def test_upload_testet_empty_body(self):
         async with ClientSession() as s:
             async with s.post(f"{URL}/testset") as resp:
@@ -112,6 +159,113 @@ class RoutesTest(unittest.IsolatedAsyncioTestCase):
                 if errs := SubmitRespSchema().validate(resp_obj):
                     self.fail(f"Wrong response: {errs}")
 
+    async def upload(self, s: ClientSession, tests) -> str:
+        async with s.post(f"{URL}/testset", json={"tests": tests}) as resp:
+            self.assertEqual(resp.status, 200)
+            return (await resp.json())["_id"]
+
+    async def wait_finished(self, s: ClientSession, ids):
+        for _id in ids:
+            for _ in range(100):
+                async with s.get(f"{URL}/submission/{_id}") as resp:
+                    if (await resp.json())["status"] == "Finished":
+                        break
+                await asyncio.sleep(0.05)
+            else:
+                self.fail(f"{_id} didn't finish")
+
+    async def test_submit_batch(self):
+        async with ClientSession() as s:
+            ts1 = await self.upload(s, [{"input": ["1", "2"], "output": ["3"]}])
+            ts2 = await self.upload(s, [{"input": ["5"], "output": ["5"]}])
+            submissions = [{"testset_id": ts, "language": "python3",
+                            "source": "print(sum(map(int, input().split())))"}
+                           for ts in (ts1, ts1, ts2)]
+            async with s.post(f"{URL}/submit/batch", json={
+                    "submissions": submissions}) as resp:
+                self.assertEqual(resp.status, 200)
+                ids = (await resp.json())["ids"]
+            self.assertEqual(len(set(ids)), 3)
+            await self.wait_finished(s, ids)
+            async with s.post(f"{URL}/submit/batch", json={"submissions":
+                    submissions + [dict(submissions[0], testset_id="missing")]}) as resp:
+                self.assertEqual(resp.status, 404)
+            async with s.post(f"{URL}/submit/batch", json={"submissions":
+                    [dict(submissions[0], priority="live")]}) as resp:
+                self.assertEqual(resp.status, 500)
+        with app_context(self.app):
+            self.assertEqual(len(await result_store.load_requests(ts1)), 2)
+
+    async def test_rejudge(self):
+        async with ClientSession() as s:
+            ts = await self.upload(s, [{"input": ["1", "2"], "output": ["3"]}])
+            async with s.post(f"{URL}/submit", json={"testset_id": ts,
+                    "language": "python3",
+                    "source": "print(sum(map(int, input().split())))"}) as resp:
+                _id = (await resp.json())["id"]
+            await self.wait_finished(s, [_id])
+            async with s.post(f"{URL}/testset/{ts}/rejudge") as resp:
+                self.assertEqual(resp.status, 200)
+                rejudged = (await resp.json())["rejudged"]
+            self.assertEqual(list(rejudged), [_id])
+            await self.wait_finished(s, rejudged.values())
+            async with s.post(f"{URL}/testset/missing/rejudge") as resp:
+                self.assertEqual(resp.status, 404)
+        with app_context(self.app):
+            self.assertEqual(list(await result_store.load_requests(ts)),
+                             list(rejudged.values()))
+
+    async def test_metrics(self):
+        async with ClientSession() as s:
+            ts = await self.upload(s, [{"input": ["1", "2"], "output": ["3"]}])
+            async with s.post(f"{URL}/submit", json={"testset_id": ts,
+                    "language": "python3",
+                    "source": "print(sum(map(int, input().split())))"}) as resp:
+                _id = (await resp.json())["id"]
+            await self.wait_finished(s, [_id])
+            async with s.get(f"{URL}/metrics") as resp:
+                self.assertEqual(resp.status, 200)
+                self.assertTrue(resp.headers["Content-Type"].startswith("text/plain"))
+                text = await resp.text()
+        self.assertIn('gtesting_test_verdicts_total{language="python3",verdict="OK"}', text)
+        self.assertIn('gtesting_phase_seconds_count{phase="compile",language="python3"}', text)
+        self.assertIn('gtesting_testers_in_flight{language="python3"} 0', text)
+        self.assertIn('gtesting_redis_command_seconds_count{command="MULTI"}', text)
+
+    async def test_trace(self):
+        async with ClientSession() as s:
+            ts = await self.upload(s, [{"input": ["1", "2"], "output": ["3"]}])
+            async with s.post(f"{URL}/submit", json={"testset_id": ts,
+                    "language": "python3", "trace": True,
+                    "source": "print(sum(map(int, input().split())))"}) as resp:
+                _id = (await resp.json())["id"]
+            await self.wait_finished(s, [_id])
+            async with s.get(f"{URL}/submission/{_id}") as resp:
+                trace = (await resp.json())["trace"]
+        phases = {span["name"]: span for span in trace["children"]}
+        self.assertIn("queued", phases)
+        self.assertIn("compile", phases)
+        test, = [span for span in phases["tests"]["children"]
+                 if span["name"] == "test"]
+        steps = [span["name"] for span in test["children"]]
+        self.assertEqual(steps[-3:], ["input", "execute", "verdict"])
+        spawn, = test["children"][-2]["children"]
+        self.assertEqual(spawn["name"], "spawn")
+
+    async def test_submit_cpp(self):
+        async with ClientSession() as s:
+            ts = await self.upload(s, [{"input": ["1", "2"], "output": ["3"]}])
+            async with s.post(f"{URL}/submit", json={"testset_id": ts,
+                    "language": "cpp",
+                    "source": "int main() { int a, b; std::cin >> a >> b; "
+                              "std::cout << a + b; }"}) as resp:
+                _id = (await resp.json())["id"]
+            await self.wait_finished(s, [_id])
+            async with s.get(f"{URL}/submission/{_id}") as resp:
+                report = await resp.json()
+        self.assertEqual([r["verdict"] for r in report["test_results"]],
+                         ["OK"])
+
     async def test_submit_wrong_testet(self):
         source = ( 
             "a, b, *_ = (int(s) for s in input().split())\n"
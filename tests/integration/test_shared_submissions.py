@@ -0,0 +1,157 @@
+import json
+import asyncio
+import unittest
+from typing import Dict, List
+
+from aiohttp import web, ClientSession
+
+import main
+from config import TestingConfig
+from src.application import app_context
+from src.modules import redis_client
+
+
+HOST = "localhost"
+PORTS = (8083, 8084)
+RECEIVER_PORT = 8085
+RECEIVER_URL = f"http://{HOST}:{RECEIVER_PORT}"
+
+
+class SharedConfig(TestingConfig):
+
+    SHARED_SUBMISSIONS      = True
+    TASKS_POOL_TTL          = 0
+    RESULT_STORE_INTERVAL   = 0
+
+
+class SharedSubmissionsTest(unittest.IsolatedAsyncioTestCase):
+    """ Two API processes sharing submissions through Redis, the first one
+    tests them. """
+
+    apps: List[web.Application]
+    runners: List[web.AppRunner]
+    received: Dict[str, List[Dict]]
+
+    async def asyncSetUp(self):
+        self.apps, self.runners = [], []
+        for port in PORTS:
+            app = main.main(["--config",
+                "tests.integration.test_shared_submissions:SharedConfig"])
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, HOST, port).start()
+            self.apps.append(app)
+            self.runners.append(runner)
+        self.received = dict()
+        receiver = web.Application()
+        receiver.add_routes([web.post("/{name}", self.__receive)])
+        self.runners.append(web.AppRunner(receiver))
+        await self.runners[-1].setup()
+        await web.TCPSite(self.runners[-1], HOST, RECEIVER_PORT).start()
+
+    async def asyncTearDown(self):
+        with app_context(self.apps[0]):
+            r = redis_client.get_redis()
+            for key in await r.keys("*"):
+                await r.delete(key)
+        for runner in self.runners:
+            await runner.cleanup()
+
+    async def __receive(self, request):
+        self.received.setdefault(request.match_info["name"], []).append(
+            await request.json())
+        return web.Response(status=200)
+
+    async def post(self, s: ClientSession, app: int, path: str, obj: Dict):
+        async with s.post(f"http://{HOST}:{PORTS[app]}{path}", json=obj) as resp:
+            self.assertEqual(resp.status, 200)
+            return await resp.json() if path != "/subscribe" else None
+
+    async def submit(self, s: ClientSession, source: str, count: int = 1) -> str:
+        ts = await self.post(s, 0, "/testset", {
+            "tests": [{"input": ["1"], "output": ["1"]}] * count})
+        resp = await self.post(s, 0, "/submit", {"testset_id": ts["_id"],
+            "language": "python3", "source": source})
+        return resp["id"]
+
+    async def wait_final(self, name: str):
+        for _ in range(100):
+            if any(r["status"] == "Finished" for r in self.received.get(name, [])):
+                return
+            await asyncio.sleep(0.05)
+        self.fail(f"{name} wasn't notified")
+
+    async def test_subscribe_running(self):
+        async with ClientSession() as s:
+            _id = await self.submit(s,
+                "import time\ntime.sleep(0.5)\nprint(input())\n")
+            await self.post(s, 1, "/subscribe", {"submition_id": _id,
+                "callback_url": f"{RECEIVER_URL}/running"})
+            async with s.get(f"http://{HOST}:{PORTS[1]}/submission/{_id}/events") as resp:
+                self.assertEqual(resp.status, 200)
+                body = await resp.text()
+        self.assertTrue(body.startswith("id: 0\nevent: snapshot\n"))
+        self.assertIn('"status":"Finished"', body)
+        await self.wait_final("running")
+
+    async def test_subscribe_finished(self):
+        async with ClientSession() as s:
+            _id = await self.submit(s, "print(input())\n")
+            for _ in range(100):
+                async with s.get(f"http://{HOST}:{PORTS[1]}/submission/{_id}") as resp:
+                    if (await resp.json())["status"] == "Finished":
+                        break
+                await asyncio.sleep(0.05)
+            await self.post(s, 1, "/subscribe", {"submition_id": _id,
+                "callback_url": f"{RECEIVER_URL}/finished"})
+        await self.wait_final("finished")
+
+    async def test_subscribe_unknown(self):
+        async with ClientSession() as s:
+            async with s.post(f"http://{HOST}:{PORTS[1]}/subscribe", json={
+                    "submition_id": "unknown",
+                    "callback_url": f"{RECEIVER_URL}/unknown"}) as resp:
+                self.assertEqual(resp.status, 404)
+
+    async def test_follow_running(self):
+        async with ClientSession() as s:
+            _id = await self.submit(s,
+                "import time\ntime.sleep(0.3)\nprint(input())\n", count=4)
+            url = f"http://{HOST}:{PORTS[1]}/submission/{_id}"
+            for _ in range(100):
+                async with s.get(url) as resp:
+                    if (await resp.json())["test_results"]:
+                        break
+                await asyncio.sleep(0.05)
+            else:
+                self.fail("The stored report has no test results")
+            async with s.get(f"{url}/events") as resp:
+                body = await resp.text()
+        events = [json.loads(frame.partition("data: ")[2])
+                  for frame in body.split("\n\n") if frame]
+        snapshots = [i for i, e in enumerate(events) if e["type"] == "snapshot"]
+        self.assertEqual(len(snapshots), 2)
+        fresh = events[snapshots[1]]
+        results = [e for e in events[snapshots[1]:] if e["type"] == "test_result"]
+        self.assertTrue(all(e["seq"] > fresh["seq"] for e in results))
+        self.assertEqual(len(fresh["data"]["test_results"]) + len(results), 4)
+
+    async def test_followers_share_pubsub(self):
+        async with ClientSession() as s:
+            _id = await self.submit(s,
+                "import time\ntime.sleep(0.5)\nprint(input())\n")
+            channel = f"gtesting:progress:{_id}".encode()
+            url = f"http://{HOST}:{PORTS[1]}/submission/{_id}/events"
+            with app_context(self.apps[0]):
+                r = redis_client.get_redis()
+                async with s.get(url) as first, s.get(url) as second:
+                    # Both are subscribed once they got the stored snapshot.
+                    bodies = [await first.content.readuntil(b"\n\n"),
+                              await second.content.readuntil(b"\n\n")]
+                    self.assertEqual(await r.pubsub_numsub(channel),
+                                     [(channel, 1)])
+                    bodies[0] += await first.read()
+                    bodies[1] += await second.read()
+                self.assertEqual(await r.pubsub_numsub(channel), [(channel, 0)])
+        for body in bodies:
+            self.assertIn(b'"status":"Finished"', body)
@@ -0,0 +1,78 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.modules.artifact_cache import ArtifactCache
+
+
+class ArtifactCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, cache: ArtifactCache, key: str, size: int) -> Path:
+        staged = cache.staging_dir()
+        (staged / "artifact").write_bytes(b"x" * size)
+        return cache.store(key, staged)
+
+    def test_key(self):
+        self.assertEqual(ArtifactCache.key("python3", "3.11", "print(1)"),
+                         ArtifactCache.key("python3", "3.11", "print(1)"))
+        self.assertNotEqual(ArtifactCache.key("python3", "3.11", "print(1)"),
+                            ArtifactCache.key("python3", "3.12", "print(1)"))
+
+    def test_hit_miss(self):
+        cache = ArtifactCache(self.root, 1000)
+        self.assertIsNone(cache.lookup("a"))
+        path = self.build(cache, "a", 10)
+        self.assertEqual(cache.lookup("a"), path)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lru_eviction(self):
+        cache = ArtifactCache(self.root, 25)
+        for key in ("a", "b"):
+            self.build(cache, key, 10)
+            cache.unpin(key)
+        cache.lookup("a")
+        cache.unpin("a")
+        self.build(cache, "c", 10)
+        self.assertIsNone(cache.lookup("b"))
+        self.assertIsNotNone(cache.lookup("a"))
+        self.assertFalse((self.root / "b").exists())
+        self.assertEqual(cache.evictions, 1)
+
+    def test_pinned_not_evicted(self):
+        cache = ArtifactCache(self.root, 15)
+        self.build(cache, "a", 10)
+        self.build(cache, "b", 10)
+        self.assertTrue((self.root / "a").exists())
+        cache.unpin("a")
+        self.assertFalse((self.root / "a").exists())
+
+    def test_restore_from_disk(self):
+        cache = ArtifactCache(self.root, 1000)
+        self.build(cache, "a", 10)
+        cache = ArtifactCache(self.root, 1000)
+        self.assertIsNotNone(cache.lookup("a"))
+        self.assertEqual(cache.size, 10)
+
+    def test_shared_directory(self):
+        first = ArtifactCache(self.root, 15)
+        staged = first.staging_dir()
+        second = ArtifactCache(self.root, 15)
+        self.assertTrue(staged.exists())
+        path = self.build(first, "a", 10)
+        self.assertEqual(self.build(second, "a", 10), path)
+        second.unpin("a")
+        self.build(second, "b", 10)
+        second.unpin("b")
+        # Still pinned by the first one.
+        self.assertTrue(path.exists())
+        first.unpin("a")
+        self.build(first, "c", 10)
+        self.assertIsNone(second.lookup("a"))
+        self.assertEqual(second.stats()["entries"], 0)
@@ -0,0 +1,75 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.application import create_app, app_context
+from src.modules import compile_pool
+from src.modules.compile_pool import CompilePool, Toolchain
+
+
+C = Toolchain("gcc", ("-O2",), ("-lm",), ("stdio.h", "math.h"), "c-header")
+SOURCE = ('#include <stdio.h>\n#include <math.h>\n'
+          'int main(void) { printf("%d\\n", (int)sqrt(16.0)); return 0; }\n')
+
+
+class CompilePoolTestCase(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        (self.root / "source.c").write_text(SOURCE)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def test_precompiled_headers(self):
+        pool = CompilePool(2, self.root / "pch", {"c": C})
+        self.assertEqual(await pool.compile(
+            "c", self.root / "source.c", self.root / "solution"), [])
+        proc = await asyncio.create_subprocess_exec(
+            str(self.root / "solution"), stdout=asyncio.subprocess.PIPE)
+        stdout, _ = await proc.communicate()
+        self.assertEqual(stdout, b"4\n")
+        self.assertEqual(len(list((self.root / "pch").glob("*/stdio.h.gch"))), 1)
+        self.assertEqual(pool.stats()["pch"], {"c": True})
+
+        # Another pool reuses the headers built by the first one.
+        other = CompilePool(1, self.root / "pch", {"c": C})
+        await other.warmup()
+        self.assertEqual(other.stats()["pch"], {"c": True})
+
+    async def test_parallel(self):
+        pool = CompilePool(2, self.root / "pch", {"c": C})
+        outputs = [self.root / f"solution{i}" for i in range(4)]
+        results = await asyncio.gather(*[
+            pool.compile("c", self.root / "source.c", output)
+            for output in outputs])
+        self.assertEqual(results, [[]] * 4)
+        self.assertTrue(all(output.exists() for output in outputs))
+        self.assertEqual(pool.stats()["compiled"], 4)
+        self.assertEqual(pool.stats()["waiting"], 0)
+
+    async def test_errors(self):
+        (self.root / "broken.c").write_text("int main(void) { return x; }\n")
+        pool = CompilePool(1, self.root / "pch", {
+            "c": C, "missing": Toolchain("no-such-compiler")})
+        errors = await pool.compile("c", self.root / "broken.c",
+                                    self.root / "solution")
+        self.assertEqual(errors[0], "rc: 1")
+        self.assertIn("undeclared", errors[1])
+        errors = await pool.compile("missing", self.root / "source.c",
+                                    self.root / "solution")
+        self.assertIn("no-such-compiler", errors[0])
+        self.assertEqual(pool.stats()["failed"], 2)
+
+    def test_pool_wno_context(self):
+        with self.assertRaises(AssertionError):
+            compile_pool.get_pool()
+
+    def test_init_app(self):
+        app = create_app(["--config", "config:TestingConfig"])
+        compile_pool.init_app(app)
+        with app_context(app):
+            pool = compile_pool.get_pool()
+        self.assertEqual(set(pool.toolchains), {"c", "cpp"})
@@ -0,0 +1,133 @@
+import os
+import sys
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.modules.forkserver_pool import ForkServerPool, ForkServerError
+from src.sandbox import Limits
+
+
+class ForkServerPoolTests(unittest.IsolatedAsyncioTestCase):
+
+    pool: ForkServerPool
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = ForkServerPool(2, sys.executable)
+        await self.pool.start()
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+        self.tmp.cleanup()
+
+    def source(self, text: str) -> str:
+        path = Path(self.tmp.name) / f"source{len(list(Path(self.tmp.name).iterdir()))}.py"
+        path.write_text(text)
+        return str(path)
+
+    async def test_echo(self):
+        path = self.source("import sys\nprint(sum(map(int, sys.stdin.read().split())))")
+        usage, stdout, stderr = await self.pool.run(path, b"1 2 3")
+        self.assertEqual((usage.returncode, stdout, stderr), (0, b"6\n", b""))
+        self.assertGreater(usage.peak_rss, 0)
+        self.assertFalse(usage.timed_out)
+
+    async def test_stdin_file(self):
+        path = self.source("import sys\nprint(sum(map(int, sys.stdin.read().split())))")
+        stdin = Path(self.tmp.name) / "input"
+        stdin.write_bytes(b"4 5")
+        _, stdout, _ = await self.pool.run(path, stdin)
+        self.assertEqual(stdout, b"9\n")
+
+    async def test_exception(self):
+        path = self.source("raise ValueError('boom')")
+        usage, stdout, stderr = await self.pool.run(path, b"")
+        self.assertEqual(usage.returncode, 1)
+        self.assertIn(b"ValueError: boom", stderr)
+
+    async def test_exit_code(self):
+        path = self.source("import sys\nprint('x')\nsys.exit(3)")
+        usage, stdout, _ = await self.pool.run(path, b"")
+        self.assertEqual((usage.returncode, stdout), (3, b"x\n"))
+
+    async def test_isolation(self):
+        path = self.source(
+            "import math\nprint(hasattr(math, 'leak'))\nmath.leak = 1")
+        for _ in range(4):
+            _, stdout, _ = await self.pool.run(path, b"")
+            self.assertEqual(stdout, b"False\n")
+
+    async def test_worker_restart(self):
+        path = self.source("print('ok')")
+        for worker in self.pool._workers:
+            worker.proc.kill()
+            await worker.proc.wait()
+        for _ in range(3):
+            usage, stdout, _ = await self.pool.run(path, b"")
+            self.assertEqual((usage.returncode, stdout), (0, b"ok\n"))
+
+    async def test_wall_time_limit(self):
+        path = self.source("import time\ntime.sleep(10)")
+        usage, _, _ = await self.pool.run(path, b"", Limits(wall_time=0.2))
+        self.assertTrue(usage.timed_out)
+        self.assertLess(usage.wall_time, 1)
+
+    async def test_cpu_time_limit(self):
+        path = self.source("while True: pass")
+        usage, _, _ = await self.pool.run(path, b"", Limits(cpu_time=1))
+        self.assertFalse(usage.timed_out)
+        self.assertNotEqual(usage.returncode, 0)
+        self.assertGreaterEqual(usage.cpu_time, 0.9)
+
+    async def wait_pid(self, pid_file: Path) -> int:
+        for _ in range(200):
+            if pid_file.exists() and pid_file.read_text():
+                return int(pid_file.read_text())
+            await asyncio.sleep(0.01)
+        self.fail("The test run didn't start")
+
+    @staticmethod
+    def running(pid: int) -> bool:
+        """ Whether `pid` is alive, a zombie nobody reaped yet isn't. """
+        try:
+            stat = Path(f"/proc/{pid}/stat").read_text()
+        except FileNotFoundError:
+            return False
+        return stat.rpartition(")")[2].split()[0] != "Z"
+
+    async def test_cancel_kills_run(self):
+        pid_file = Path(self.tmp.name) / "pid"
+        path = self.source("import os, time\n"
+            f"open({str(pid_file)!r}, 'w').write(str(os.getpid()))\n"
+            "time.sleep(300)")
+        workers = [worker.proc.pid for worker in self.pool._workers]
+        task = asyncio.create_task(self.pool.run(path, b""))
+        pid = await self.wait_pid(pid_file)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        with self.assertRaises(ProcessLookupError):
+            os.kill(pid, 0)
+        # Reaped by its worker, which is kept.
+        self.assertEqual([worker.proc.pid for worker in self.pool._workers],
+                         workers)
+
+    async def test_dead_worker_kills_run(self):
+        pid_file = Path(self.tmp.name) / "pid"
+        path = self.source("import os, time\n"
+            f"open({str(pid_file)!r}, 'w').write(str(os.getpid()))\n"
+            "time.sleep(300)")
+        task = asyncio.create_task(self.pool.run(path, b""))
+        pid = await self.wait_pid(pid_file)
+        for worker in self.pool._workers:
+            if worker.child == pid:
+                worker.proc.kill()
+        with self.assertRaises(ForkServerError):
+            await task
+        for _ in range(100):
+            if not self.running(pid):
+                break
+            await asyncio.sleep(0.01)
+        self.assertFalse(self.running(pid))
@@ -0,0 +1,96 @@
+import asyncio
+import unittest
+
+from src.application import create_app, app_context
+from src.modules import redis_client, job_queue
+from src.modules.job_queue import JobQueue, stream_key
+from src.modules.scheduler import Priority, QueueFull
+from config import TestingConfig
+
+
+class JobQueueConfig(TestingConfig):
+
+    JOB_VISIBILITY_TIMEOUT  = 0.1
+    JOB_MAX_DELIVERIES      = 2
+    SCHEDULER_QUEUE_SIZE    = 2
+
+
+class JobQueueTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.app = create_app(
+            ["--config", "tests.modules.test_job_queue:JobQueueConfig"])
+        redis_client.init_app(self.app)
+        job_queue.init_app(self.app)
+        self.redis = self.app["global"]["redis_client"]
+        for priority in Priority:
+            await self.redis.delete(stream_key(priority))
+        self.app.freeze()
+        await self.app.startup()
+        with app_context(self.app):
+            self.queue = job_queue.get_queue()
+
+    async def asyncTearDown(self):
+        for priority in Priority:
+            await self.redis.delete(stream_key(priority))
+        await self.app.cleanup()
+        await self.redis.aclose()
+
+    def other_consumer(self) -> JobQueue:
+        return JobQueue(self.redis, "other",
+                        visibility_timeout=self.queue.visibility_timeout,
+                        max_deliveries=self.queue.max_deliveries)
+
+    async def test_put_get_ack(self):
+        await self.queue.put({"id": "1"})
+        job = await self.queue.get(block=0.1)
+        self.assertEqual(job.data, {"id": "1"})
+        self.assertEqual(job.deliveries, 1)
+        await self.queue.ack(job)
+        self.assertIsNone(await self.queue.get(block=0.1))
+        stats = await self.queue.stats()
+        self.assertEqual(stats["live"], {"length": 0, "pending": 0})
+
+    async def test_priority(self):
+        await self.queue.put({"id": "rejudge"}, Priority.REJUDGE)
+        await self.queue.put({"id": "live"}, Priority.LIVE)
+        self.assertEqual((await self.queue.get()).data["id"], "live")
+        self.assertEqual((await self.queue.get()).data["id"], "rejudge")
+
+    async def test_queue_full(self):
+        await self.queue.put({"id": "1"})
+        await self.queue.put({"id": "2"})
+        with self.assertRaises(QueueFull):
+            await self.queue.put({"id": "3"})
+        await self.queue.put({"id": "3"}, Priority.REJUDGE)
+
+    async def test_put_many(self):
+        with self.assertRaises(QueueFull):
+            await self.queue.put_many([{"id": str(i)} for i in range(3)])
+        await self.queue.put_many([{"id": "1"}, {"id": "2"}])
+        self.assertEqual([(await self.queue.get()).data["id"] for _ in range(2)],
+                         ["1", "2"])
+
+    async def test_redelivery(self):
+        await self.queue.put({"id": "1"})
+        job = await self.queue.get(block=0.1)
+        other = self.other_consumer()
+        self.assertIsNone(await other.get(block=0.1))
+        await asyncio.sleep(0.15)
+        redelivered = await other.get(block=0.1)
+        self.assertEqual(redelivered.message_id, job.message_id)
+        self.assertEqual(redelivered.deliveries, 2)
+        self.assertFalse(other.exhausted(redelivered))
+        await asyncio.sleep(0.15)
+        redelivered = await self.queue.get(block=0.1)
+        self.assertEqual(redelivered.deliveries, 3)
+        self.assertTrue(self.queue.exhausted(redelivered))
+
+    async def test_touch(self):
+        await self.queue.put({"id": "1"})
+        job = await self.queue.get(block=0.1)
+        other = self.other_consumer()
+        for _ in range(3):
+            await asyncio.sleep(0.06)
+            await self.queue.touch(job)
+        self.assertIsNone(await other.get(block=0.01))
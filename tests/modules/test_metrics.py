@@ -0,0 +1,82 @@
+import unittest
+
+from src.application import create_app, app_context
+from src.modules import metrics, redis_client
+from src.testset import Test
+from src.testing_strategy import TestingStrategy, TestResult
+
+
+class StubStrategy(TestingStrategy):
+
+    async def prepare(self, source):
+        return []
+
+    async def compile(self):
+        return []
+
+    async def run(self, test):
+        return TestResult(TestResult.Verdict.WA)
+
+
+class MetricsTestCase(unittest.IsolatedAsyncioTestCase):
+
+    def test_render(self):
+        registry = metrics.Metrics(buckets=(0.1, 1))
+        registry.verdicts.inc("python3", "OK")
+        registry.verdicts.inc("python3", "OK")
+        registry.phase_seconds.observe(0.05, "run", "python3")
+        registry.phase_seconds.observe(0.5, "run", "python3")
+        registry.phase_seconds.observe(5, "run", "python3")
+        text = registry.render()
+        self.assertIn("# TYPE gtesting_test_verdicts_total counter", text)
+        self.assertIn('gtesting_test_verdicts_total{language="python3",verdict="OK"} 2',
+                      text)
+        labels = 'phase="run",language="python3"'
+        self.assertIn(f'gtesting_phase_seconds_bucket{{{labels},le="0.1"}} 1', text)
+        self.assertIn(f'gtesting_phase_seconds_bucket{{{labels},le="1"}} 2', text)
+        self.assertIn(f'gtesting_phase_seconds_bucket{{{labels},le="+Inf"}} 3', text)
+        self.assertIn(f'gtesting_phase_seconds_sum{{{labels}}} 5.55', text)
+        self.assertIn(f'gtesting_phase_seconds_count{{{labels}}} 3', text)
+
+    def test_escaping(self):
+        counter = metrics.Counter("c", "Help.", ("label",))
+        counter.inc('a"b\\c')
+        self.assertIn('c{label="a\\"b\\\\c"} 1', counter.render())
+
+    async def test_instrumented_strategy(self):
+        registry = metrics.Metrics()
+        strategy = registry.instrument(StubStrategy(), "python3")
+        await strategy.prepare("")
+        self.assertEqual(registry.testers_in_flight.value("python3"), 1)
+        await strategy.compile()
+        result = await strategy.run(Test(["1"], ["1"]))
+        await strategy.cleanup()
+        await strategy.cleanup()
+        self.assertEqual(result.verdict, TestResult.Verdict.WA)
+        self.assertEqual(registry.testers_in_flight.value("python3"), 0)
+        self.assertEqual(registry.runs_in_flight.value("python3"), 0)
+        self.assertEqual(registry.verdicts.value("python3", "WA"), 1)
+        for phase in ("prepare", "compile", "run"):
+            self.assertEqual(registry.phase_seconds.count(phase, "python3"), 1)
+        self.assertIs(strategy.checker, StubStrategy.checker)
+
+    async def test_redis_commands(self):
+        app = create_app(["--config", "config:TestingConfig"])
+        redis_client.init_app(app)
+        metrics.init_app(app)
+        with app_context(app):
+            r = redis_client.get_redis()
+            try:
+                await r.ping()
+                async with r.pipeline() as pipe:
+                    await pipe.ping().ping().execute()
+            finally:
+                await r.aclose()
+            registry = metrics.get_metrics()
+        self.assertEqual(registry.redis_seconds.count("PING"), 1)
+        self.assertEqual(registry.redis_seconds.count("MULTI"), 1)
+        self.assertIn("gtesting_redis_pool_connections", registry.render())
+
+    def test_metrics_wno_context(self):
+        with self.assertRaises(AssertionError):
+            metrics.get_metrics()
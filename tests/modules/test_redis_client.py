@@ -6,16 +6,30 @@ from src.application import create_app, app_context
 from src.modules import redis_client
 
 
-class RedisClientTestCase(unittest.TestCase):
+class RedisClientTestCase(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
         self.app = create_app(["--config", "config:TestingConfig"])
         redis_client.init_app(self.app)
 
-    def test_redis_available(self):
+    async def asyncTearDown(self):
+        await self.app["global"]["redis_client"].aclose()
+
+    async def test_redis_available(self):
+        with app_context(self.app):
+            r = redis_client.get_redis()
+            await r.ping()
+
+    async def test_pool_stats(self):
         with app_context(self.app):
             r = redis_client.get_redis()
-            r.ping()
+            await r.ping()
+            stats = redis_client.get_stats()
+        self.assertEqual(stats["in_use"], 0)
+        self.assertEqual(stats["idle"], 1)
+        self.assertEqual(stats["acquired"], 1)
+        self.assertEqual(stats["max_connections"],
+                         self.app["config"].REDIS_POOL_SIZE)
 
     def test_redis_wno_context(self):
         with self.assertRaises(AssertionError):
@@ -0,0 +1,103 @@
+import asyncio
+import unittest
+from contextlib import contextmanager
+from typing import List
+
+from aiohttp import web
+
+from src.application import create_app, app_var
+from src.modules import scheduler
+from src.modules.scheduler import Priority, QueueFull
+from config import TestingConfig
+
+
+class SchedulerConfig(TestingConfig):
+
+    SCHEDULER_WORKERS       = 1
+    SCHEDULER_QUEUE_SIZE    = 2
+
+
+class BudgetConfig(TestingConfig):
+
+    CPU_BUDGET              = 7
+
+
+class MockRunner():
+
+    def __init__(self, name: str, log: List[str], event: asyncio.Event = None):
+        self.name = name
+        self.log = log
+        self.event = event
+
+    async def __call__(self):
+        if self.event:
+            await self.event.wait()
+        self.log.append(self.name)
+
+
+class SchedulerTests(unittest.IsolatedAsyncioTestCase):
+
+    app: web.Application
+
+    @contextmanager
+    def __app_context(self):
+        app_var.set(self.app)
+        yield
+
+    def setUp(self):
+        self.app = create_app(
+            ["--config", "tests.modules.test_scheduler:SchedulerConfig"])
+        scheduler.init_app(self.app)
+
+    async def asyncTearDown(self):
+        await self.app["global"]["scheduler"].close()
+
+    def test_cpu_budget_split(self):
+        app = create_app(["--config", "tests.modules.test_scheduler:BudgetConfig"])
+        scheduler.init_app(app, processes=3)
+        self.assertEqual(app["global"]["cpu_budget"]._value, 2)
+
+    def test_no_app(self):
+        with self.assertRaises(AssertionError):
+            scheduler.schedule(MockRunner("a", []))
+
+    async def test_priority(self):
+        log, gate = list(), asyncio.Event()
+        with self.__app_context():
+            scheduler.schedule(MockRunner("blocker", log, gate))
+            await asyncio.sleep(0)
+            scheduler.schedule(MockRunner("rejudge", log), Priority.REJUDGE)
+            scheduler.schedule(MockRunner("live", log))
+            gate.set()
+            await asyncio.sleep(0.1)
+        self.assertEqual(log, ["blocker", "live", "rejudge"])
+
+    async def test_queue_full(self):
+        log, gate = list(), asyncio.Event()
+        with self.__app_context():
+            scheduler.schedule(MockRunner("blocker", log, gate))
+            await asyncio.sleep(0)
+            scheduler.schedule(MockRunner("a", log))
+            scheduler.schedule(MockRunner("b", log))
+            with self.assertRaises(QueueFull) as ctx:
+                scheduler.schedule(MockRunner("c", log))
+            self.assertGreater(ctx.exception.retry_after, 0)
+            stats = scheduler.get_stats()
+            gate.set()
+        self.assertEqual(stats["queue_depth"], 2)
+        self.assertEqual(stats["rejected"], 1)
+        self.assertEqual(len(stats["utilization"]), 1)
+
+    async def test_schedule_many(self):
+        log, gate = list(), asyncio.Event()
+        with self.__app_context():
+            scheduler.schedule(MockRunner("blocker", log, gate))
+            await asyncio.sleep(0)
+            with self.assertRaises(QueueFull):
+                scheduler.schedule_many([MockRunner(n, log) for n in "abc"])
+            scheduler.schedule_many([MockRunner(n, log) for n in "ab"])
+            stats = scheduler.get_stats()
+            gate.set()
+            await asyncio.sleep(0.1)
+        self.assertEqual(stats["rejected"], 3)
+        self.assertEqual(log, ["blocker", "a", "b"])
@@ -7,13 +7,14 @@ from typing import Dict, List, Callable
 from aiohttp import web
 
 from src.application import create_app, app_var
-from src.modules import tasks_pool
+from src.modules import scheduler, tasks_pool
 
 
 class MockRunner():
 
     id: str
     executed = False
+    archived = False
 
     def __init__(self):
         self.id = str(uuid.uuid1())
@@ -21,9 +22,8 @@ class MockRunner():
     async def __call__(self):
         self.executed = True
 
-
-def get_runner(id: str) -> Callable[MockRunner, bool]:
-    return lambda r: r.id == id
+    async def archive(self):
+        self.archived = True
 
 
 
@@ -40,8 +40,12 @@ class TesterPoolTests(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
         self.runner = MockRunner()
         self.app = create_app(["--config", "config:TestingConfig"])
+        scheduler.init_app(self.app)
         tasks_pool.init_app(self.app)
 
+    async def asyncTearDown(self):
+        await self.app["global"]["scheduler"].close()
+
     def test_no_app(self):
         with self.assertRaises(AssertionError):
             tasks_pool.get("fake")
@@ -67,14 +71,36 @@ class TesterPoolTests(unittest.IsolatedAsyncioTestCase):
         with self.__app_context():
             tasks_pool.schedult(runner1)
             tasks_pool.schedult(runner2)
-            _t1 = tasks_pool.get(get_runner(runner1.id))
+            _t1 = tasks_pool.get(runner1.id)
             self.assertEqual(_t1.id, runner1.id)
-            _t2 = tasks_pool.get(get_runner(runner2.id))
+            _t2 = tasks_pool.get(runner2.id)
             self.assertEqual(_t2.id, runner2.id)
             with self.assertRaises(LookupError):
-                _t3 = tasks_pool.get(get_runner(runner3.id))
+                _t3 = tasks_pool.get(runner3.id)
 
     async def test_get_empty(self):
         with self.__app_context():
             with self.assertRaises(LookupError):
-                tasks_pool.get(get_runner("123"))
+                tasks_pool.get("123")
+
+    async def test_retention(self):
+        pool = tasks_pool.TasksPool(ttl=0.1, handoff=True)
+        runner = MockRunner()
+        pool.add(runner)
+        pool.finish(runner)
+        self.assertIs(pool.get(runner.id), runner)
+        await asyncio.sleep(0.15)
+        with self.assertRaises(LookupError):
+            pool.get(runner.id)
+        self.assertEqual(len(pool), 0)
+        await asyncio.sleep(0)
+        self.assertTrue(runner.archived)
+
+    async def test_finished_removed(self):
+        runner = MockRunner()
+        with self.__app_context():
+            tasks_pool.schedult(runner)
+            await asyncio.sleep(0.1)
+            pool = self.app["global"]["tasks_pool"]
+            self.assertEqual(pool.stats(), {"active": 0, "finished": 1})
+            self.assertIs(tasks_pool.get(runner.id), runner)
@@ -0,0 +1,105 @@
+import os
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+from src import file_locks
+from src.modules.testdata_cache import TestDataCache
+from src.testset import Test, encode_test, decode_test
+
+
+class TestDataCacheTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key(self):
+        self.assertEqual(TestDataCache.key(Test(["1", "2"], ["3"])),
+                         TestDataCache.key(Test(["1", "2"], ["4"])))
+        self.assertNotEqual(TestDataCache.key(Test(["1", "2"], [])),
+                            TestDataCache.key(Test(["12"], [])))
+
+    def test_key_computed_once(self):
+        test = Test(["1", "2"], ["3"])
+        key = TestDataCache.key(test)
+        test.input = None
+        self.assertEqual(TestDataCache.key(test), key)
+        decoded = decode_test(encode_test(Test(["1", "2"], ["3"])))
+        decoded.input = None
+        self.assertEqual(TestDataCache.key(decoded), decoded.digest)
+        self.assertIsNotNone(decoded.digest)
+
+    async def test_open(self):
+        cache = TestDataCache(self.root, 1000)
+        test = Test(["1", "22"], ["23"])
+        for _ in range(2):
+            async with cache.open(test) as f:
+                self.assertEqual(f.read(), b"1 22")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(cache.size, 4)
+
+    async def test_eviction(self):
+        cache = TestDataCache(self.root, 25)
+        tests = [Test(["x" * 10, str(i)], []) for i in range(3)]
+        async with cache.open(tests[0]):
+            for test in tests[1:]:
+                async with cache.open(test):
+                    pass
+            self.assertEqual(cache.stats()["entries"], 2)
+        self.assertEqual(cache.evictions, 1)
+        async with cache.open(tests[0]):
+            pass
+        self.assertEqual(cache.hits, 1)
+
+    async def test_scan(self):
+        cache = TestDataCache(self.root, 1000)
+        async with cache.open(Test(["1"], [])):
+            pass
+        (self.root / ".staged").write_bytes(b"x")
+        (self.root / ".staging" / "gone").mkdir()
+        cache = TestDataCache(self.root, 1000)
+        self.assertEqual(cache.size, 1)
+        self.assertEqual(len(list(self.root.iterdir())), 2)
+        self.assertFalse((self.root / ".staging" / "gone").exists())
+
+    async def test_shared_directory(self):
+        tests = [Test(["x" * 10, str(i)], []) for i in range(2)]
+        first = TestDataCache(self.root, 15)
+        async with first.open(tests[0]):
+            pass
+        second = TestDataCache(self.root, 15)
+        async with first.open(tests[0]):
+            async with second.open(tests[1]):
+                pass
+            # Open in the first one.
+            self.assertTrue((self.root / TestDataCache.key(tests[0])).exists())
+        async with second.open(tests[0]):
+            pass
+        async with first.open(tests[1]) as f:
+            self.assertEqual(f.read(), b"xxxxxxxxxx 1")
+        self.assertEqual((first.hits, first.misses), (1, 2))
+
+    async def test_open_waits_for_removal(self):
+        cache = TestDataCache(self.root, 1000)
+        test = Test(["1"], [])
+        async with cache.open(test):
+            pass
+
+        async def read() -> bytes:
+            async with cache.open(test) as f:
+                return f.read()
+
+        # Another process is removing it.
+        fd = file_locks.lock(self.root / cache.key(test), exclusive=True)
+        reading = asyncio.create_task(read())
+        await asyncio.sleep(0.05)
+        self.assertFalse(reading.done())
+        (self.root / cache.key(test)).unlink()
+        os.close(fd)
+        self.assertEqual(await reading, b"1")
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
@@ -0,0 +1,90 @@
+import asyncio
+import unittest
+
+import redis
+
+from src.application import create_app, app_context
+from src.modules import redis_client, testset_cache
+from src.modules.testset_cache import TestSetCache, INVALIDATION_CHANNEL
+
+
+class TestSetCacheTests(unittest.TestCase):
+
+    def test_lru(self):
+        cache = TestSetCache(max_size=20)
+        cache.put("a", "A", 10)
+        cache.put("b", "B", 10)
+        self.assertEqual(cache.get("a"), "A")
+        cache.put("c", "C", 10)
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.get("a"), "A")
+        self.assertEqual(cache.get("c"), "C")
+        self.assertEqual(cache.size, 20)
+
+    def test_too_big(self):
+        cache = TestSetCache(max_size=20)
+        cache.put("a", "A", 21)
+        self.assertEqual(cache.get("a"), None)
+
+    def test_clear(self):
+        cache = TestSetCache(max_size=20)
+        cache.put("a", "A", 10)
+        cache.clear()
+        self.assertEqual(cache.get("a"), None)
+        self.assertEqual(cache.size, 0)
+
+    def test_hit_rate(self):
+        cache = TestSetCache(max_size=20)
+        cache.put("a", "A", 1)
+        cache.get("a")
+        cache.get("b")
+        self.assertEqual(cache.stats()["hit_rate"], 0.5)
+
+
+class TestSetCacheInvalidationTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.app = create_app(["--config", "config:TestingConfig"])
+        redis_client.init_app(self.app)
+        testset_cache.init_app(self.app)
+        self.app.freeze()
+        await self.app.startup()
+
+    async def asyncTearDown(self):
+        await self.app.cleanup()
+
+    async def test_invalidation(self):
+        with app_context(self.app):
+            cache = testset_cache.get_cache()
+        cache.put("ts", "TS", 1)
+        config = self.app["config"]
+        redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT) \
+            .publish(INVALIDATION_CHANNEL, "ts")
+        for _ in range(50):
+            if cache.get("ts") is None:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(cache.get("ts"), None)
+        self.assertEqual(cache.invalidations, 1)
+
+    async def test_reconnect(self):
+        with app_context(self.app):
+            cache = testset_cache.get_cache()
+        cache.put("ts", "TS", 1)
+        config = self.app["config"]
+        client = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT)
+        with self.assertLogs(level="WARNING"):
+            client.client_kill_filter(_type="pubsub")
+            # Dropped as the invalidations might have been missed.
+            for _ in range(200):
+                if not cache.stats()["entries"]:
+                    break
+                await asyncio.sleep(0.01)
+        self.assertEqual(cache.stats()["entries"], 0)
+        cache.put("ts", "TS", 1)
+        client.publish(INVALIDATION_CHANNEL, "ts")
+        for _ in range(50):
+            if cache.get("ts") is None:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(cache.get("ts"), None)
@@ -0,0 +1,135 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from src import checkers
+from src.checkers import CheckerError, TokenMatcher
+from src.testset import Test
+
+
+class TokenMatcherTests(unittest.IsolatedAsyncioTestCase):
+
+    async def match(self, expected, chunks) -> bool:
+        matcher = TokenMatcher(expected)
+        for chunk in chunks:
+            matcher.feed(chunk)
+        return await matcher.finish()
+
+    async def test_split_tokens(self):
+        self.assertTrue(await self.match(["12", "345"], [b"1", b"2 3", b"4", b"5\n"]))
+        self.assertTrue(await self.match(["12", "345"], [b"  12\n\n345  "]))
+        self.assertTrue(await self.match([], [b"\n"]))
+
+    async def test_mismatch(self):
+        self.assertFalse(await self.match(["12"], [b"13"]))
+        self.assertFalse(await self.match(["12"], [b"12 3"]))
+        self.assertFalse(await self.match(["12", "3"], [b"12"]))
+        self.assertFalse(await self.match(["12"], [b"1", b"2", b"3"]))
+
+    async def test_early_mismatch(self):
+        matcher = TokenMatcher(["1", "2"])
+        self.assertTrue(matcher.feed(b"1 "))
+        self.assertFalse(matcher.feed(b"3"))
+        matcher = TokenMatcher(["abc"])
+        self.assertFalse(matcher.feed(b"abcd"))
+        matcher = TokenMatcher(["abc"])
+        self.assertTrue(matcher.feed(b"a"))
+        self.assertTrue(matcher.feed(b"b"))
+        self.assertFalse(matcher.feed(b"d"))
+
+    async def test_long_token(self):
+        token = "x" * 1024 * 1024
+        chunks = [b"x" * 64] * (len(token) // 64) + [b" "]
+        self.assertTrue(await self.match([token], chunks))
+        self.assertFalse(await self.match([token], chunks[:-2] + [b"xy"]))
+
+
+class CheckersTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    async def check(self, spec: str, expected, chunks, source: str = None) -> bool:
+        checker = checkers.create(spec, source, Path(self.tmp.name))
+        self.assertEqual(await checker.prepare(), [])
+        try:
+            check = checker.start(Test(["2", "3"], expected))
+            for chunk in chunks:
+                check.feed(chunk)
+            return await check.finish()
+        finally:
+            await checker.cleanup()
+
+    async def test_lines(self):
+        self.assertTrue(await self.check("lines", ["a b", "c"], [b"a b  \nc", b"\n\n"]))
+        self.assertFalse(await self.check("lines", ["a b", "c"], [b"a  b\nc\n"]))
+        self.assertFalse(await self.check("lines", ["a", "c"], [b"a\n"]))
+        self.assertFalse(await self.check("lines", ["a"], [b"a\nb\n"]))
+        self.assertTrue(await self.check("lines", ["ab", "cd", "e"],
+                                         [b"a", b"b\nc", b"d", b"\ne", b""]))
+        line = "x" * 1024 * 1024
+        self.assertTrue(await self.check("lines", [line],
+                                         [b"x" * 64] * (len(line) // 64)))
+
+    async def test_float(self):
+        self.assertTrue(await self.check("float", ["0.5", "x"], [b"0.5000001 ", b"x"]))
+        self.assertTrue(await self.check("float:0.1", ["1000"], [b"1050"]))
+        self.assertFalse(await self.check("float:0.01", ["1"], [b"1.1"]))
+        self.assertFalse(await self.check("float", ["nan"], [b"nan"]))
+        self.assertFalse(await self.check("float", ["x", "1"], [b"y 1"]))
+        self.assertFalse(await self.check("float", ["1"], [b"1 2"]))
+        self.assertTrue(await self.check("float", ["12.5", "3"],
+                                         [b"1", b"2.", b"5 ", b"3"]))
+
+    async def test_float_batches(self):
+        expected = [str(i / 3) for i in range(10000)]
+        output = " ".join(f"{i / 3:.9f}" for i in range(10000)).encode()
+        self.assertTrue(await self.check("float", expected, [output]))
+        self.assertFalse(await self.check("float", expected, [output + b" 0"]))
+
+    async def test_float_infinity(self):
+        self.assertTrue(await self.check("float", ["inf", "-inf"], [b"inf -inf"]))
+        self.assertFalse(await self.check("float", ["inf"], [b"-inf"]))
+        self.assertFalse(await self.check("float", ["inf"], [b"1e308"]))
+        expected = ["inf"] * 10000
+        self.assertTrue(await self.check("float", expected,
+                                         [b" ".join([b"inf"] * 10000)]))
+        self.assertFalse(await self.check("float", expected,
+                                          [b" ".join([b"inf"] * 9999 + [b"0"])]))
+
+    async def test_program(self):
+        source = ("import sys\n"
+                  "a, b = map(int, open(sys.argv[1]).read().split())\n"
+                  "if int(open(sys.argv[3]).read()) != a + b:\n"
+                  "    print('wrong sum')\n"
+                  "    sys.exit(1)\n")
+        self.assertTrue(await self.check("program", [], [b"5\n"], source))
+        checker = checkers.create("program", source, Path(self.tmp.name))
+        await checker.prepare()
+        check = checker.start(Test(["2", "3"], []))
+        check.feed(b"6")
+        self.assertFalse(await check.finish())
+        self.assertEqual(check.messages, ["wrong sum\n"])
+        await checker.cleanup()
+        self.assertEqual(list(Path(self.tmp.name).iterdir()), [])
+
+    async def test_program_errors(self):
+        checker = checkers.create("program", "def (:", Path(self.tmp.name))
+        self.assertNotEqual(await checker.prepare(), [])
+        await checker.cleanup()
+        with self.assertRaises(CheckerError) as raised:
+            await self.check("program", [], [b"5"], "exit(3)")
+        self.assertEqual(raised.exception.messages[0], "Checker failed with 3")
+
+    def test_validate(self):
+        for spec in ("tokens", "lines", "float", "float:1e-9"):
+            checkers.validate(spec)
+        for spec, source in (("unknown", None), ("float:x", None),
+                             ("float:-1", None), ("program", None),
+                             ("tokens:1", None)):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                checkers.validate(spec, source)
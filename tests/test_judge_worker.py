@@ -0,0 +1,96 @@
+import asyncio
+import unittest
+
+import redis
+
+import worker
+from src import result_store, testset
+from src.application import app_context
+from src.judge_worker import JudgeWorker
+from src.shared_submissions import progress_channel
+from src.modules import job_queue, redis_client
+from src.modules.job_queue import Job, stream_key
+from src.modules.scheduler import Priority
+from src.testset import Test, TestSet
+
+
+class JudgeWorkerTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.app = worker.main(["--config", "config:TestingConfig"])
+        self.app.freeze()
+        await self.app.startup()
+        with app_context(self.app):
+            self.queue = job_queue.get_queue()
+            self.redis = redis_client.get_redis()
+            self.ts = TestSet(tests=[Test(["1 2"], ["3"]), Test(["2 2"], ["4"])])
+            await testset.save(self.ts)
+
+    async def asyncTearDown(self):
+        with app_context(self.app):
+            await testset.delete(self.ts._id)
+            for priority in Priority:
+                await self.redis.delete(stream_key(priority))
+            for key in await self.redis.keys("report:*"):
+                await self.redis.delete(key)
+        await self.app.cleanup()
+
+    async def judge(self, job):
+        with app_context(self.app):
+            pubsub = self.redis.pubsub()
+            await pubsub.subscribe(progress_channel(job["id"]))
+            await self.queue.put(job)
+            task = asyncio.create_task(JudgeWorker(self.queue).run())
+            frames = []
+            try:
+                while b'"status":"Finished"' not in b"".join(frames):
+                    message = await asyncio.wait_for(
+                        pubsub.get_message(ignore_subscribe_messages=True,
+                                           timeout=1), 10)
+                    if message:
+                        frames.append(message["data"])
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await pubsub.aclose()
+            return frames, await result_store.load(job["id"])
+
+    async def test_judge(self):
+        source = "a, b = map(int, input().split())\nprint(a + b)\n"
+        frames, report = await self.judge({"id": "judged",
+            "testset_id": self.ts._id, "language": "python3", "source": source})
+        self.assertTrue(frames[0].startswith(b"id: 0\nevent: snapshot\n"))
+        self.assertEqual(report["status"], "Finished")
+        self.assertEqual([tr["verdict"] for tr in report["test_results"]],
+                         ["OK", "OK"])
+        with app_context(self.app):
+            stats = await self.queue.stats()
+        self.assertEqual(stats["live"], {"length": 0, "pending": 0})
+
+
+class HeartbeatTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_heartbeat_survives_errors(self):
+
+        class FlakyQueue:
+
+            visibility_timeout = 0.03
+            touched = 0
+
+            async def touch(self, job):
+                self.touched += 1
+                if self.touched == 1:
+                    raise redis.exceptions.ConnectionError("Connection lost")
+
+        queue = FlakyQueue()
+        job = Job(stream_key(Priority.LIVE), "0-1", {"id": "job"}, 1)
+        heartbeat = asyncio.create_task(
+            JudgeWorker(queue)._JudgeWorker__heartbeat(job))
+        with self.assertLogs(level="WARNING"):
+            for _ in range(100):
+                if queue.touched >= 3:
+                    break
+                await asyncio.sleep(0.01)
+        self.assertGreaterEqual(queue.touched, 3)
+        self.assertFalse(heartbeat.done())
+        heartbeat.cancel()
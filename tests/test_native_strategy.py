@@ -0,0 +1,129 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from config import TestingConfig
+from src.testset import Test
+from src.testing_strategy import TestResult
+from src.native_strategy import NativeTestingStrategy
+from src.modules.compile_pool import CompilePool, Toolchain
+from src.modules.artifact_cache import ArtifactCache
+from src.sandbox import Limits
+
+
+CPP = Toolchain(TestingConfig.CPP_COMPILER, TestingConfig.CPP_FLAGS,
+                TestingConfig.CPP_LDFLAGS, TestingConfig.CPP_PCH_HEADERS,
+                "c++-header")
+C = Toolchain(TestingConfig.C_COMPILER, TestingConfig.C_FLAGS,
+              TestingConfig.C_LDFLAGS, TestingConfig.C_PCH_HEADERS, "c-header")
+
+SUM_CPP = """
+#include <bits/stdc++.h>
+int main() {
+    long long a, b;
+    std::cin >> a >> b;
+    if (a < 0) return 1;
+    if (a == 0) { std::vector<int> v(1 << 30); return v[b]; }
+    if (a == 1) { volatile long long x = 0; while (true) x++; }
+    std::cout << a + b << std::endl;
+}
+"""
+SUM_C = """
+#include <stdio.h>
+int main(void) {
+    long long a, b;
+    scanf("%lld %lld", &a, &b);
+    printf("%lld\\n", a + b);
+    return 0;
+}
+"""
+
+# The precompiled headers aren't included into the sources which don't
+# include them.
+COUNT_CPP = """
+#include <iostream>
+using namespace std;
+int count = 3;
+int main() { cout << count << endl; }
+"""
+BESSEL_C = """
+#include <stdio.h>
+int y1 = 1, j0 = 2;
+int main(void) { printf("%d\\n", y1 + j0); return 0; }
+"""
+VECTOR_CPP = """
+int main() { std::vector<int> v(2); std::cout << v.size() << std::endl; }
+"""
+
+
+class NativeStrategyTestCase(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = CompilePool(2, TestingConfig.PCH_DIR, {"c": C, "cpp": CPP})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def strategy(self, language: str, **kwargs) -> NativeTestingStrategy:
+        return NativeTestingStrategy(language, Path(self.tmp.name), self.pool,
+                                     **kwargs)
+
+    async def test_verdicts(self):
+        strategy = self.strategy("cpp", limits=Limits(
+            cpu_time=1, wall_time=2, memory=256 * 1024 * 1024))
+        self.assertEqual(await strategy.prepare(SUM_CPP), [])
+        self.assertEqual(await strategy.compile(), [])
+        tests = [(["2", "3"], ["5"], TestResult.Verdict.OK),
+                 (["2", "3"], ["6"], TestResult.Verdict.WA),
+                 (["-1", "3"], ["2"], TestResult.Verdict.RE),
+                 (["0", "3"], ["3"], TestResult.Verdict.MLE),
+                 (["1", "3"], ["4"], TestResult.Verdict.TLE)]
+        for input, output, verdict in tests:
+            with self.subTest(input=input):
+                result = await strategy.run(Test(input, output))
+                self.assertEqual(result.verdict, verdict)
+        await strategy.cleanup()
+        self.assertTrue(self.pool.stats()["pch"]["cpp"])
+
+    async def test_c(self):
+        strategy = self.strategy("c")
+        self.assertEqual(await strategy.prepare(SUM_C), [])
+        self.assertEqual(await strategy.compile(), [])
+        result = await strategy.run(Test(["2", "3"], ["5"]))
+        self.assertEqual(result.verdict, TestResult.Verdict.OK)
+
+    async def test_compilation_error(self):
+        strategy = self.strategy("cpp")
+        self.assertEqual(await strategy.prepare("int main() { return x; }"), [])
+        errors = await strategy.compile()
+        self.assertEqual(errors[0], "rc: 1")
+        self.assertIn("was not declared", errors[1])
+
+    async def test_headers_not_included(self):
+        for language, source, output in (("cpp", COUNT_CPP, "3"),
+                                         ("c", BESSEL_C, "3")):
+            with self.subTest(language=language):
+                strategy = self.strategy(language)
+                await strategy.prepare(source)
+                self.assertEqual(await strategy.compile(), [])
+                result = await strategy.run(Test([], [output]))
+                self.assertEqual(result.verdict, TestResult.Verdict.OK)
+                await strategy.cleanup()
+        strategy = self.strategy("cpp")
+        await strategy.prepare(VECTOR_CPP)
+        errors = await strategy.compile()
+        self.assertEqual(errors[0], "rc: 1")
+        self.assertIn("vector", errors[1])
+
+    async def test_artifact_cache(self):
+        cache = ArtifactCache(Path(self.tmp.name) / "artifacts", 1 << 30)
+        for cached in (False, True):
+            strategy = self.strategy("c", cache=cache)
+            await strategy.prepare(SUM_C)
+            self.assertEqual(strategy.cached, cached)
+            self.assertEqual(await strategy.compile(), [])
+            result = await strategy.run(Test(["1", "1"], ["2"]))
+            self.assertEqual(result.verdict, TestResult.Verdict.OK)
+            await strategy.cleanup()
+        self.assertEqual(self.pool.stats()["compiled"], 1)
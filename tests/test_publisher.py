@@ -0,0 +1,136 @@
+import time
+import asyncio
+import unittest
+from typing import Dict, List, Tuple
+
+from aiohttp import web
+
+from src.publisher import Publisher
+from src.modules.http_client import HttpClient
+
+
+HOST = "localhost"
+PORT = 8082
+URL = f"http://{HOST}:{PORT}"
+
+
+class PublisherTestCase(unittest.IsolatedAsyncioTestCase):
+
+    received: Dict[str, List[Tuple[float, Dict]]]
+
+    async def asyncSetUp(self):
+        self.received = dict()
+        app = web.Application()
+        app.add_routes([web.post("/{name}", self.__receive)])
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, HOST, PORT).start()
+        self.client = HttpClient()
+        await self.client.start()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.runner.cleanup()
+
+    async def __receive(self, request):
+        name = request.match_info["name"]
+        if name == "slow":
+            await asyncio.sleep(0.2)
+        self.received.setdefault(name, list()).append(
+            (time.monotonic(), await request.json()))
+        return web.Response(status=200)
+
+    async def test_coalescing(self):
+        publisher = Publisher(lambda d: {"value": d}, 0, min_interval=0.1, client=self.client)
+        await publisher.subscribe(f"{URL}/a")
+        for i in range(1, 20):
+            await publisher.update(i)
+            await asyncio.sleep(0.01)
+        await publisher.close()
+        values = [view["value"] for _, view in self.received["a"]]
+        self.assertLess(len(values), 10)
+        self.assertEqual(values[-1], 19)
+        times = [t for t, _ in self.received["a"]]
+        self.assertTrue(all(b - a >= 0.09 for a, b in zip(times, times[1:-1])))
+
+    async def test_slow_subscriber(self):
+        publisher = Publisher(lambda d: {"value": d}, 0, client=self.client)
+        await publisher.subscribe(f"{URL}/slow")
+        await publisher.subscribe(f"{URL}/fast")
+        started_at = time.monotonic()
+        for i in range(1, 5):
+            await publisher.update(i)
+        self.assertLess(time.monotonic() - started_at, 0.1)
+        await publisher.close()
+        self.assertEqual(self.received["slow"][-1][1]["value"], 4)
+        self.assertEqual(self.received["fast"][-1][1]["value"], 4)
+        self.assertLess(self.received["fast"][-1][0], self.received["slow"][0][0])
+
+    async def test_subscribe_closed(self):
+        publisher = Publisher(lambda d: {"value": d}, 0, client=self.client)
+        await publisher.update(5)
+        await publisher.close()
+        await publisher.subscribe(f"{URL}/late")
+        self.assertEqual(self.received["late"][-1][1]["value"], 5)
+
+    async def test_host_stats(self):
+        publisher = Publisher(lambda d: {"value": d}, 0, client=self.client)
+        await publisher.subscribe(f"{URL}/a")
+        await publisher.subscribe("http://localhost:1/unreachable")
+        await publisher.close()
+        stats = self.client.stats()
+        self.assertEqual(stats["localhost"]["requests"], 2)
+        self.assertEqual(stats["localhost"]["errors"], 1)
+
+    async def test_delta(self):
+        publisher = Publisher(lambda d: {"value": d}, 0, client=self.client)
+        await publisher.update(1, {"type": "set", "value": 1})
+        await publisher.subscribe(f"{URL}/d", delta=True)
+        await publisher.close()
+        for i in range(2, 5):
+            await publisher.update(i, {"type": "set", "value": i})
+            await publisher.close()
+        events = [e for _, view in self.received["d"] for e in view["events"]]
+        self.assertEqual(events[0], {"seq": 1, "type": "snapshot",
+                                     "data": {"value": 1}})
+        self.assertEqual([e["seq"] for e in events], [1, 2, 3, 4])
+        self.assertEqual(events[-1], {"seq": 4, "type": "set", "value": 4})
+
+    async def test_delta_resume(self):
+        publisher = Publisher(lambda d: {"value": d}, 0, client=self.client)
+        for i in range(1, 4):
+            await publisher.update(i, {"type": "set", "value": i})
+        await publisher.close()
+        await publisher.subscribe(f"{URL}/r", delta=True, since=1)
+        events = self.received["r"][-1][1]["events"]
+        self.assertEqual([e["seq"] for e in events], [2, 3])
+
+    async def test_watch(self):
+        publisher = Publisher(lambda d: {"value": d}, 0)
+        received = list()
+
+        async def read():
+            async with publisher.watch() as frames:
+                async for frame in frames:
+                    received.append(frame)
+
+        reader = asyncio.create_task(read())
+        await asyncio.sleep(0)
+        for i in range(1, 4):
+            await publisher.update(i, {"type": "set", "value": i})
+        await publisher.close()
+        await asyncio.wait_for(reader, timeout=1)
+        self.assertEqual(len(received), 4)
+        self.assertTrue(received[0].startswith(b"id: 0\nevent: snapshot\n"))
+        self.assertTrue(received[3].startswith(b"id: 3\nevent: set\n"))
+
+    async def test_watch_overflow(self):
+        publisher = Publisher(lambda d: {"value": d}, 0)
+        async with publisher.watch(maxsize=2) as watcher:
+            for i in range(1, 6):
+                await publisher.update(i, {"type": "set", "value": i})
+            await publisher.close()
+            frames = [frame async for frame in watcher]
+        self.assertEqual(watcher.overflows, 2)
+        self.assertTrue(frames[0].startswith(b"id: 4\nevent: snapshot\n"))
+        self.assertTrue(frames[-1].startswith(b"id: 5\nevent: set\n"))
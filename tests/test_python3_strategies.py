@@ -0,0 +1,164 @@
+import sys
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+
+from src.testset import Test, TestSetSchema
+from src.testing_strategy import TestingStrategy, TestResult
+from src.python3_fs_strategy import Python3FSTestingStrategy
+from src.python3_forkserver_strategy import Python3ForkServerTestingStrategy
+from src.modules.forkserver_pool import ForkServerPool
+from src.modules.artifact_cache import ArtifactCache
+from src.modules.testdata_cache import TestDataCache
+from src.sandbox import Limits
+from src import checkers
+
+
+DATA_DIR = Path(__file__).resolve().parent / "integration" / "data"
+
+
+def read_tests(name: str) -> List[Test]:
+    with (DATA_DIR / name / "testset.json").open("r") as f:
+        return TestSetSchema().load(json.load(f)).tests
+
+
+class Python3StrategiesTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = ForkServerPool(1, sys.executable)
+        await self.pool.start()
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+        self.tmp.cleanup()
+
+    def strategies(self, limits: Limits = None) -> List[TestingStrategy]:
+        testing_dir = Path(self.tmp.name)
+        return [Python3FSTestingStrategy(testing_dir, limits=limits),
+                Python3ForkServerTestingStrategy(testing_dir, self.pool,
+                                                 limits=limits)]
+
+    async def verdicts(self, strategy: TestingStrategy,
+            source: str, tests: List[Test]) -> List[TestResult.Verdict]:
+        self.assertEqual(await strategy.prepare(source), [])
+        self.assertEqual(await strategy.compile(), [])
+        return [(await strategy.run(test)).verdict for test in tests]
+
+    async def test_same_verdicts(self):
+        source = (DATA_DIR / "matrix_multiplication" / "source").read_text()
+        tests = read_tests("matrix_multiplication")
+        tests.append(Test(input=["1", "1", "2", "3"], output=["7"]))
+        tests.append(Test(input=["x"], output=["0"]))
+        expected = [TestResult.Verdict.OK] * (len(tests) - 2) + \
+                   [TestResult.Verdict.WA, TestResult.Verdict.RE]
+        for strategy in self.strategies():
+            with self.subTest(strategy=type(strategy).__name__):
+                self.assertEqual(
+                    await self.verdicts(strategy, source, tests), expected)
+
+    async def test_limits(self):
+        limits = Limits(cpu_time=0.5, wall_time=1, memory=256 * 1024 * 1024,
+                        output=1024 * 1024)
+        sources = [
+            ("while True: pass", TestResult.Verdict.TLE),
+            ("import time\ntime.sleep(5)", TestResult.Verdict.TLE),
+            ("x = bytearray(512 * 1024 * 1024)", TestResult.Verdict.MLE),
+            ("print(0)\nwhile True: print(' ' * 4096)", TestResult.Verdict.OLE),
+            ("print(0)\nwhile True: print(0)", TestResult.Verdict.WA),
+        ]
+        for strategy_type in (0, 1):
+            for source, verdict in sources:
+                strategy = self.strategies(limits)[strategy_type]
+                with self.subTest(strategy=type(strategy).__name__, source=source):
+                    self.assertEqual(
+                        await self.verdicts(strategy, source, [Test([], ["0"])]),
+                        [verdict])
+
+    async def test_stop_on_wrong_answer(self):
+        strategy = Python3FSTestingStrategy(Path(self.tmp.name),
+                                            limits=Limits(wall_time=5))
+        await strategy.prepare("import time\nprint(1, flush=True)\ntime.sleep(5)")
+        await strategy.compile()
+        result = await strategy.run(Test([], ["0"]))
+        self.assertEqual(result.verdict, TestResult.Verdict.WA)
+        self.assertLess(result.wall_time, 2)
+
+    async def test_usage_recorded(self):
+        for strategy in self.strategies():
+            with self.subTest(strategy=type(strategy).__name__):
+                await strategy.prepare("print(input())")
+                await strategy.compile()
+                result = await strategy.run(Test(["1"], ["1"]))
+                self.assertEqual(result.verdict, TestResult.Verdict.OK)
+                self.assertGreater(result.wall_time, 0)
+                self.assertGreater(result.peak_rss, 0)
+                self.assertIsNotNone(result.cpu_time)
+
+    async def test_artifact_cache(self):
+        cache = ArtifactCache(Path(self.tmp.name) / "artifacts", 1024 * 1024)
+        source = (DATA_DIR / "matrix_multiplication" / "source").read_text()
+        tests = read_tests("matrix_multiplication")[:1]
+        for _ in range(2):
+            strategy = Python3FSTestingStrategy(Path(self.tmp.name), cache)
+            self.assertEqual(await self.verdicts(strategy, source, tests),
+                             [TestResult.Verdict.OK])
+            await strategy.cleanup()
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertTrue(strategy.cached)
+
+    async def test_artifact_cache_compilation_error(self):
+        cache = ArtifactCache(Path(self.tmp.name) / "artifacts", 1024 * 1024)
+        strategy = Python3FSTestingStrategy(Path(self.tmp.name), cache)
+        await strategy.prepare("def (:")
+        self.assertNotEqual(await strategy.compile(), [])
+        await strategy.cleanup()
+        self.assertEqual(cache.stats()["entries"], 0)
+        self.assertFalse(strategy.source_path.parent.exists())
+
+    async def test_checker(self):
+        checker = checkers.create("float:0.01", None, Path(self.tmp.name))
+        testing_dir = Path(self.tmp.name)
+        for strategy in (Python3FSTestingStrategy(testing_dir, checker=checker),
+                Python3ForkServerTestingStrategy(testing_dir, self.pool,
+                                                 checker=checker)):
+            with self.subTest(strategy=type(strategy).__name__):
+                self.assertEqual(
+                    await self.verdicts(strategy, "print(1 / 3)",
+                        [Test([], ["0.333"]), Test([], ["0.5"])]),
+                    [TestResult.Verdict.OK, TestResult.Verdict.WA])
+
+    async def test_checker_failed(self):
+        checker = checkers.create("program", "import sys\nsys.exit(2)\n",
+                                  Path(self.tmp.name))
+        self.assertEqual(await checker.prepare(), [])
+        strategy = Python3FSTestingStrategy(Path(self.tmp.name), checker=checker)
+        self.assertEqual(await self.verdicts(strategy, "print(1)",
+                                             [Test([], ["1"])]),
+                         [TestResult.Verdict.CF])
+        await strategy.cleanup()
+
+    async def test_testdata_cache(self):
+        testdata = TestDataCache(Path(self.tmp.name) / "testdata", 1024 * 1024)
+        testing_dir = Path(self.tmp.name)
+        tests = [Test(["1", "2"], ["3"]), Test(["1", "2"], ["3"])]
+        for strategy in (Python3FSTestingStrategy(testing_dir, testdata=testdata),
+                Python3ForkServerTestingStrategy(testing_dir, self.pool,
+                                                 testdata=testdata)):
+            with self.subTest(strategy=type(strategy).__name__):
+                self.assertEqual(
+                    await self.verdicts(strategy,
+                        "print(sum(map(int, input().split())))", tests),
+                    [TestResult.Verdict.OK] * 2)
+        self.assertEqual((testdata.hits, testdata.misses), (3, 1))
+
+    async def test_forkserver_worker_killed(self):
+        strategy = Python3ForkServerTestingStrategy(Path(self.tmp.name), self.pool)
+        source = "import os, signal\nos.kill(os.getppid(), signal.SIGKILL)"
+        self.assertEqual(await strategy.prepare(source), [])
+        self.assertEqual(await strategy.compile(), [])
+        with self.assertLogs(level="WARNING"):
+            result = await strategy.run(Test(input=[], output=[]))
+        self.assertEqual(result.verdict, TestResult.Verdict.RE)
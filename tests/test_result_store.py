@@ -0,0 +1,68 @@
+import unittest
+
+from src import result_store
+from src.modules import redis_client
+from src.application import create_app, app_context
+
+
+class ResultStoreTestCase(unittest.IsolatedAsyncioTestCase):
+
+    report = {"status": "finished", "messages": [], "test_results": []}
+
+    def setUp(self):
+        self.app = create_app(["--config", "config:TestingConfig"])
+        redis_client.init_app(self.app)
+
+    async def asyncTearDown(self):
+        with app_context(self.app):
+            r = redis_client.get_redis()
+            for key in await r.keys("report*:*") + await r.keys("testset:*"):
+                await r.delete(key)
+            await r.aclose()
+
+    async def test_save_load(self):
+        with app_context(self.app):
+            etag = await result_store.save("sub", self.report)
+            self.assertEqual(await result_store.load("sub"), self.report)
+            self.assertEqual(await result_store.get_etag("sub"), etag)
+            ttl = await redis_client.get_redis().ttl("report:sub")
+        self.assertGreater(ttl, 0)
+
+    async def test_etag_changes(self):
+        with app_context(self.app):
+            etag1 = await result_store.save("sub", self.report)
+            etag2 = await result_store.save("sub", dict(self.report, status="failed"))
+            etag3 = await result_store.save("sub", dict(self.report, status="failed"))
+        self.assertNotEqual(etag1, etag2)
+        self.assertEqual(etag2, etag3)
+
+    async def test_missing(self):
+        with app_context(self.app):
+            self.assertIsNone(await result_store.load("missing"))
+            self.assertIsNone(await result_store.get_etag("missing"))
+
+    async def test_requests(self):
+        requests = {_id: {"testset_id": "ts", "source": _id}
+                    for _id in ("a", "b", "c")}
+        with app_context(self.app):
+            await result_store.save_requests(requests, {"a": self.report})
+            self.assertEqual(await result_store.load("a"), self.report)
+            self.assertIsNone(await result_store.load("b"))
+            await result_store.delete("c")
+            self.assertEqual(await result_store.load_requests("ts"),
+                             {"a": requests["a"], "b": requests["b"]})
+            await result_store.forget("ts", ["a"])
+            self.assertEqual(list(await result_store.load_requests("ts")), ["b"])
+            members = await redis_client.get_redis().smembers("reports:testset:ts")
+        self.assertEqual(members, {b"b"})
+
+    async def test_legacy_requests_key(self):
+        request = {"testset_id": "ts", "source": "a"}
+        with app_context(self.app):
+            await result_store.save_requests({"a": request})
+            r = redis_client.get_redis()
+            await r.rename("reports:testset:ts", "testset:ts:reports")
+            self.assertEqual(await result_store.load_requests("ts"),
+                             {"a": request})
+            await result_store.forget("ts", ["a"])
+            self.assertEqual(await result_store.load_requests("ts"), {})
@@ -0,0 +1,95 @@
+import sys
+import time
+import asyncio
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from src import sandbox
+from src.sandbox import Limits
+
+
+class SandboxTests(unittest.IsolatedAsyncioTestCase):
+
+    async def run_python(self, source: str, stdin=b"",
+            limits: Limits = Limits(), on_output=None):
+        return await sandbox.run([sys.executable, "-c", source], stdin, limits,
+                                 on_output)
+
+    async def test_usage(self):
+        usage, stdout, stderr = await self.run_python(
+            "import sys\nx = bytearray(64 * 1024 * 1024)\nprint(sys.stdin.read())",
+            b"hello")
+        self.assertEqual((usage.returncode, stdout, stderr), (0, b"hello\n", b""))
+        self.assertGreater(usage.peak_rss, 64 * 1024 * 1024)
+        self.assertGreater(usage.wall_time, 0)
+        self.assertFalse(usage.timed_out)
+
+    async def test_stdin_file(self):
+        with tempfile.TemporaryFile() as stdin:
+            stdin.write(b"hello")
+            stdin.seek(0)
+            _, stdout, _ = await self.run_python(
+                "import sys\nprint(sys.stdin.read())", stdin)
+        self.assertEqual(stdout, b"hello\n")
+
+    async def test_wall_time_limit(self):
+        usage, _, _ = await self.run_python("import time\ntime.sleep(10)",
+                                            limits=Limits(wall_time=0.2))
+        self.assertTrue(usage.timed_out)
+        self.assertEqual(usage.returncode, -9)
+        self.assertLess(usage.wall_time, 1)
+
+    async def test_busy_executor(self):
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            loop.set_default_executor(executor)
+            busy = loop.run_in_executor(None, time.sleep, 2)
+            usage, _, _ = await sandbox.run(["true"], b"",
+                                            Limits(wall_time=0.5))
+            await busy
+        self.assertFalse(usage.timed_out)
+        self.assertLess(usage.wall_time, 0.5)
+
+    async def test_cpu_time_limit(self):
+        usage, _, _ = await self.run_python("while True: pass",
+                                            limits=Limits(cpu_time=1))
+        self.assertFalse(usage.timed_out)
+        self.assertLess(usage.returncode, 0)
+        self.assertGreaterEqual(usage.cpu_time, 0.9)
+
+    async def test_memory_limit(self):
+        usage, _, stderr = await self.run_python(
+            "x = bytearray(512 * 1024 * 1024)",
+            limits=Limits(memory=128 * 1024 * 1024))
+        self.assertEqual(usage.returncode, 1)
+        self.assertIn(b"MemoryError", stderr)
+
+    async def test_output_limit(self):
+        usage, stdout, _ = await self.run_python(
+            "import sys\nwhile True: sys.stdout.write('x' * 4096)",
+            limits=Limits(output=1024 * 1024))
+        self.assertTrue(usage.output_exceeded)
+        self.assertFalse(usage.timed_out)
+        self.assertLessEqual(len(stdout), 1024 * 1024)
+
+    async def test_stderr_limit(self):
+        usage, _, stderr = await self.run_python(
+            "import sys\nwhile True: sys.stderr.write('x' * 4096)",
+            limits=Limits(output=1024 * 1024))
+        self.assertTrue(usage.output_exceeded)
+        self.assertLessEqual(len(stderr), sandbox.STDERR_LIMIT)
+
+    async def test_stop_on_output(self):
+        chunks = []
+
+        def on_output(chunk: bytes) -> bool:
+            chunks.append(chunk)
+            return False
+
+        usage, stdout, _ = await self.run_python(
+            "import sys, time\nprint('x', flush=True)\ntime.sleep(10)",
+            limits=Limits(wall_time=5), on_output=on_output)
+        self.assertTrue(usage.stopped)
+        self.assertFalse(usage.timed_out)
+        self.assertEqual((chunks[0][:1], stdout), (b"x", b""))
@@ -0,0 +1,158 @@
+import json
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+
+from src.testset import Test
+from src.tester import Tester, Status
+from src.testing_strategy import TestingStrategy, TestResult
+
+
+class MockStrategy(TestingStrategy):
+    """ Sleeps `input[0]` seconds and answers with the verdict named in
+    `output[0]`. """
+
+    running: int = 0
+    max_running: int = 0
+    started: List[str]
+
+    def __init__(self):
+        self.started = list()
+
+    async def prepare(self, source: str) -> List[str]:
+        return list()
+
+    async def compile(self) -> List[str]:
+        return list()
+
+    async def run(self, test: Test) -> TestResult:
+        self.started.append(test.input[1])
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(float(test.input[0]))
+        finally:
+            self.running -= 1
+        return TestResult(TestResult.Verdict[test.output[0]], [test.input[1]])
+
+
+def make_tests(*specs) -> List[Test]:
+    return [Test(input=[str(delay), str(i)], output=[verdict])
+            for i, (delay, verdict) in enumerate(specs)]
+
+
+class TesterTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def test_sequential(self):
+        strategy = MockStrategy()
+        tests = make_tests((0.01, "OK"), (0, "WA"), (0, "OK"))
+        report = await Tester(strategy, "", tests)()
+        self.assertEqual(report.status, Status.Finished)
+        self.assertEqual([r.messages[0] for r in report.test_results],
+                         ["0", "1", "2"])
+        self.assertEqual(strategy.max_running, 1)
+
+    async def test_parallel_keeps_order(self):
+        strategy = MockStrategy()
+        tests = make_tests((0.1, "OK"), (0, "OK"), (0.05, "OK"), (0, "OK"))
+        report = await Tester(strategy, "", tests, parallelism=3)()
+        self.assertEqual([r.messages[0] for r in report.test_results],
+                         ["0", "1", "2", "3"])
+        self.assertEqual(strategy.max_running, 3)
+
+    async def test_cpu_budget(self):
+        strategy = MockStrategy()
+        tests = make_tests(*[(0.01, "OK")] * 6)
+        report = await Tester(strategy, "", tests, parallelism=4,
+                              cpu_budget=asyncio.Semaphore(2))()
+        self.assertEqual(len(report.test_results), 6)
+        self.assertEqual(strategy.max_running, 2)
+
+    async def test_fail_fast(self):
+        strategy = MockStrategy()
+        tests = make_tests((0.05, "OK"), (0, "WA"), (0.5, "OK"), (0, "OK"))
+        report = await asyncio.wait_for(Tester(strategy, "", tests,
+                parallelism=3, fail_fast=True)(), timeout=0.4)
+        self.assertEqual(report.status, Status.Finished)
+        self.assertEqual([r.verdict for r in report.test_results],
+                         [TestResult.Verdict.OK, TestResult.Verdict.WA])
+        self.assertNotIn("3", strategy.started)
+        # The cancelled runs are over before the tester returns.
+        self.assertEqual(strategy.running, 0)
+
+    async def test_async_iterable_consumed_lazily(self):
+        pulled = list()
+        specs = [(0.01, "OK"), (0.01, "WA")] + [(0.01, "OK")] * 8
+
+        async def tests():
+            for i, test in enumerate(make_tests(*specs)):
+                pulled.append(i)
+                yield test
+
+        report = await Tester(MockStrategy(), "", tests(),
+                              parallelism=2, fail_fast=True)()
+        self.assertEqual(len(report.test_results), 2)
+        self.assertLessEqual(len(pulled), 4)
+
+        pulled.clear()
+        report = await Tester(MockStrategy(), "", tests(), parallelism=2)()
+        self.assertEqual(len(report.test_results), 10)
+        self.assertEqual(len(pulled), 10)
+
+    async def test_trace(self):
+        tests = make_tests((0.05, "OK"), (0.05, "OK"), (0, "OK"))
+        with tempfile.TemporaryDirectory() as trace_dir:
+            tester = Tester(MockStrategy(), "", tests, parallelism=2,
+                            trace=True, trace_dir=Path(trace_dir))
+            report = await tester()
+            with (Path(trace_dir) / f"{tester.id}.json").open() as f:
+                events = json.load(f)["traceEvents"]
+        trace = report.trace
+        self.assertEqual(trace["name"], "submission")
+        self.assertEqual(trace["attrs"], {"id": tester.id})
+        phases = [span["name"] for span in trace["children"]]
+        self.assertEqual(phases[:2], ["queued", "prepare"])
+        self.assertIn("compile", phases)
+        self.assertNotIn("cleanup", phases)
+        runs = [span for span in trace["children"][phases.index("tests")]["children"]
+                if span["name"] == "test"]
+        self.assertEqual([span["attrs"]["index"] for span in runs], [0, 1, 2])
+        self.assertGreaterEqual(runs[0]["duration"], 50)
+        self.assertIn("cleanup", [e["name"] for e in events])
+        # The first two tests overlap and go to different threads.
+        tids = [e["tid"] for e in events if e["name"] == "test"]
+        self.assertNotEqual(tids[0], tids[1])
+
+    async def test_no_trace(self):
+        report = await Tester(MockStrategy(), "", make_tests((0, "OK")))()
+        self.assertIsNone(report.trace)
+
+    async def test_strategy_error(self):
+
+        class BrokenStrategy(MockStrategy):
+
+            async def run(self, test: Test) -> TestResult:
+                raise RuntimeError("worker died")
+
+        with self.assertLogs(level="ERROR"):
+            report = await Tester(BrokenStrategy(), "", make_tests((0, "OK")))()
+        self.assertEqual(report.status, Status.Failed)
+        self.assertEqual(report.messages, ["Internal error: worker died"])
+
+    async def test_status_events(self):
+
+        class CompilationFailed(MockStrategy):
+
+            async def compile(self) -> List[str]:
+                return ["error"]
+
+        tester = Tester(CompilationFailed(), "", make_tests((0, "OK")))
+        async with tester.watch() as watcher:
+            await tester()
+            events = [json.loads(frame.decode().partition("data: ")[2])
+                      async for frame in watcher]
+        statuses = [e["status"] for e in events if e["type"] == "status"]
+        self.assertEqual(statuses[-1], tester.snapshot()[1]["status"])
+        self.assertEqual(statuses[-1], Status.CompilationFailed.name)
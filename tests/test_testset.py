@@ -1,13 +1,22 @@
+import io
+import sys
+import json
 import unittest
 
 from aiohttp import web
 
 from src.testset import *
-from src.modules import redis_client
+from src.modules import redis_client, testset_cache
 from src.application import create_app, app_context
+from config import TestingConfig
 
 
-class TestSetTestCase(unittest.TestCase):
+class FillConfig(TestingConfig):
+
+    TESTSET_CACHE_FILL      = 1 << 14
+
+
+class TestSetTestCase(unittest.IsolatedAsyncioTestCase):
 
     app: web.Application
 
@@ -23,36 +32,146 @@ class TestSetTestCase(unittest.TestCase):
     def setUp(self):
         self.app = create_app(["--config", "config:TestingConfig"])
         redis_client.init_app(self.app)
+        testset_cache.init_app(self.app)
 
-    def tearDown(self):
+    async def asyncTearDown(self):
         with app_context(self.app):
             r = redis_client.get_redis()
-            for key in r.keys("*"):
-                r.delete(key)
+            for key in await r.keys("*"):
+                await r.delete(key)
+            await r.aclose()
 
-    def test_save(self):
+    async def test_save(self):
         with app_context(self.app):
-            save(self.test_ts)
+            await save(self.test_ts)
 
-    def test_save_wno_context(self):
+    async def test_save_wno_context(self):
         with self.assertRaises(AssertionError):
-            save(self.test_ts)
+            await save(self.test_ts)
 
-    def test_save_dupliacation(self):
+    async def test_save_dupliacation(self):
         with app_context(self.app):
-            save(self.test_ts)
+            await save(self.test_ts)
             with self.assertRaises(TestSetExists):
-                save(self.test_ts)
+                await save(self.test_ts)
 
-    def test_save_load(self):
+    async def test_save_load(self):
         with app_context(self.app):
-            save(self.test_ts)
-            test_ts2 = load(self.test_ts._id)
+            await save(self.test_ts)
+            test_ts2 = await load(self.test_ts._id)
         self.assertEqual(test_ts2, self.test_ts)
 
-    def test_load_wrong(self):
+    async def test_load_wrong(self):
         with app_context(self.app):
-            r1 = load(self.test_ts._id)
-            r2 = load("hello-world")
+            r1 = await load(self.test_ts._id)
+            r2 = await load("hello-world")
         self.assertEqual(r1, None)
         self.assertEqual(r2, None)
+
+    async def test_load_cached(self):
+        with app_context(self.app):
+            await save(self.test_ts)
+            await load(self.test_ts._id)
+            await redis_client.get_redis().delete(
+                f"testset:{self.test_ts._id}", f"testset:{self.test_ts._id}:tests")
+            test_ts2 = await load(self.test_ts._id)
+            stats = testset_cache.get_cache().stats()
+        self.assertEqual(test_ts2, self.test_ts)
+        self.assertEqual(stats["hits"], 1)
+
+    async def test_legacy_format(self):
+        legacy = json.dumps({"_id": "legacy", "tests": [
+            {"input": ["1", "2"], "output": ["3"]}]})
+        with app_context(self.app):
+            r = redis_client.get_redis()
+            await r.set("legacy", legacy)
+            self.assertEqual(await get_checkers(["legacy"]),
+                             {"legacy": ("tokens", None)})
+            tests = [test async for test in iter_tests("legacy")]
+            ts = await load("legacy")
+            self.assertIsNone(await r.get("legacy"))
+            await r.set("not-a-testset", "plain")
+            self.assertIsNone(await load("not-a-testset"))
+        self.assertEqual(tests, [Test(input=["1", "2"], output=["3"])])
+        self.assertEqual(ts.tests, tests)
+
+    async def test_delete(self):
+        with app_context(self.app):
+            await save(self.test_ts)
+            await load(self.test_ts._id)
+            await delete(self.test_ts._id)
+            r = await load(self.test_ts._id)
+        self.assertEqual(r, None)
+
+    async def test_encode_decode(self):
+        test = self.test_ts.tests[0]
+        self.assertEqual(decode_test(encode_test(test)), test)
+
+    async def test_write_input(self):
+        f = io.BytesIO()
+        write_input(Test(input=["1", "22", "333"], output=[]), f)
+        self.assertEqual(f.getvalue(), b"1 22 333")
+
+    async def test_writer(self):
+        with app_context(self.app):
+            async with TestSetWriter(batch_size=1) as writer:
+                for test in self.test_ts.tests:
+                    await writer.add(test)
+                self.assertFalse(await exists(writer.id))
+                await writer.commit()
+            ts = await load(writer.id)
+        self.assertEqual(ts.tests, self.test_ts.tests)
+        self.assertEqual(writer.count, 2)
+
+    async def test_writer_abort(self):
+        with app_context(self.app):
+            with self.assertRaises(ValueError):
+                async with TestSetWriter(batch_size=1) as writer:
+                    await writer.add(self.test_ts.tests[0])
+                    raise ValueError()
+            r = redis_client.get_redis()
+            self.assertEqual(await r.keys("*"), [])
+
+    async def test_iter_tests(self):
+        tests = [Test(input=[str(i)], output=[str(i)]) for i in range(7)]
+        with app_context(self.app):
+            await save(TestSet(tests=tests, _id="ts"))
+            iterated = [t async for t in iter_tests("ts", batch_size=3)]
+            missing = [t async for t in iter_tests("missing", batch_size=3)]
+        self.assertEqual(iterated, tests)
+        self.assertEqual(missing, [])
+
+    async def test_iter_tests_cached(self):
+        tests = [Test(input=[str(i)], output=[str(i)]) for i in range(7)]
+        self.app["config"] = FillConfig
+        with app_context(self.app):
+            await save(TestSet(tests=tests, _id="ts", checker="lines"))
+            await save(TestSet(tests=tests * 1000, _id="big"))
+            [t async for t in iter_tests("ts", batch_size=3)]
+            [t async for t in iter_tests("big", batch_size=3)]
+            await redis_client.get_redis().delete(
+                "testset:ts", "testset:ts:tests")
+            iterated = [t async for t in iter_tests("ts", batch_size=3)]
+            checkers = await get_checkers(["ts", "big"])
+            stats = testset_cache.get_cache().stats()
+        self.assertEqual(iterated, tests)
+        self.assertEqual(checkers, {"ts": ("lines", None),
+                                    "big": ("tokens", None)})
+        self.assertEqual(stats["entries"], 1)
+        self.assertEqual(stats["hits"], 2)
+
+    def test_sizeof_test(self):
+        from src.testset import _sizeof_test
+        # A token takes far more than its characters.
+        size = _sizeof_test(Test(input=["1"] * 100, output=["1"]))
+        self.assertGreater(size, 100 * (sys.getsizeof("1") + 8))
+
+    async def test_checker(self):
+        ts = TestSet(tests=self.test_ts.tests, _id="ts", checker="program",
+                     checker_source="import sys\n")
+        with app_context(self.app):
+            await save(ts)
+            self.assertEqual(await get_checker("ts"), ("program", "import sys\n"))
+            self.assertEqual(await load("ts"), ts)
+            await save(TestSet(_id="default"))
+            self.assertEqual(await get_checker("default"), ("tokens", None))
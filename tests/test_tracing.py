@@ -0,0 +1,46 @@
+import asyncio
+import unittest
+
+from src import tracing
+
+
+class TracingTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def test_no_trace(self):
+        with tracing.span("step") as span:
+            self.assertIsNone(span)
+        tracing.record("step", 0.0)
+
+    async def test_span_tree(self):
+        root = tracing.Span("root")
+
+        async def child(name):
+            with tracing.span(name):
+                await asyncio.sleep(0.01)
+
+        with tracing.activate(root):
+            with tracing.span("outer", n=1):
+                await asyncio.gather(child("a"), child("b"))
+            with self.assertRaises(ValueError):
+                with tracing.span("failing"):
+                    raise ValueError()
+        self.assertIsNone(tracing.current_span.get())
+        root.finish()
+        view = tracing.trace_view(root)
+        outer, failing = view["children"]
+        self.assertEqual(outer["attrs"], {"n": 1})
+        self.assertEqual([c["name"] for c in outer["children"]], ["a", "b"])
+        self.assertGreaterEqual(outer["duration"], 10)
+        self.assertEqual(failing["attrs"], {"error": "ValueError"})
+
+    def test_chrome_trace(self):
+        root = tracing.Span("root", start=0.0, end=1.0)
+        root.children = [tracing.Span("a", start=0.0, end=0.5),
+                         tracing.Span("b", start=0.1, end=0.3),
+                         tracing.Span("c", start=0.5, end=0.8)]
+        events = {e["name"]: e for e in tracing.chrome_trace(root)["traceEvents"]}
+        self.assertEqual(events["root"]["dur"], 1e6)
+        self.assertEqual(events["b"]["ts"], 1e5)
+        self.assertEqual(events["a"]["tid"], events["root"]["tid"])
+        self.assertNotEqual(events["b"]["tid"], events["a"]["tid"])
+        self.assertEqual(events["c"]["tid"], events["a"]["tid"])
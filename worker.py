@@ -0,0 +1,78 @@
+import sys
+import asyncio
+import logging
+
+from aiohttp import web
+
+from src.application import create_app, app_context
+from src.judge_worker import JudgeWorker
+from src.modules import scheduler, tasks_pool, redis_client, \
+        forkserver_pool, artifact_cache, testset_cache, testdata_cache, \
+        http_client, job_queue, shared_subscriptions, metrics, compile_pool
+
+def main(argv):
+    """ Judge worker consuming the submissions the API enqueues with
+    JOB_QUEUE enabled, see `src/judge_worker.py`. """
+    app = create_app(argv)
+    scheduler.init_app(app)
+    tasks_pool.init_app(app)
+    redis_client.init_app(app)
+    http_client.init_app(app)
+    compile_pool.init_app(app)
+    shared_subscriptions.init_app(app)
+    job_queue.init_app(app)
+    if app["config"].ARTIFACT_CACHE:
+        artifact_cache.init_app(app)
+    if app["config"].TESTSET_CACHE:
+        testset_cache.init_app(app)
+    if app["config"].TESTDATA_CACHE:
+        testdata_cache.init_app(app)
+    if app["config"].PYTHON3_FORKSERVER:
+        forkserver_pool.init_app(app)
+    if app["config"].METRICS:
+        metrics.init_app(app)
+    return app
+
+
+async def serve_metrics(port: int) -> web.AppRunner:
+    """ Serves GET /metrics of the worker, to be called in its app
+    context. """
+    registry = metrics.get_metrics()
+
+    async def handler(request):
+        return web.Response(body=registry.render().encode(),
+                            headers={"Content-Type": metrics.CONTENT_TYPE})
+
+    metrics_app = web.Application()
+    metrics_app.router.add_get("/metrics", handler)
+    runner = web.AppRunner(metrics_app)
+    await runner.setup()
+    await web.TCPSite(runner, port=port).start()
+    return runner
+
+
+async def run(app):
+    app.freeze()
+    await app.startup()
+    runner = None
+    try:
+        with app_context(app):
+            config = app["config"]
+            if config.METRICS and config.WORKER_METRICS_PORT is not None:
+                runner = await serve_metrics(config.WORKER_METRICS_PORT)
+            worker = JudgeWorker(job_queue.get_queue(),
+                                 jobs=config.JUDGE_WORKER_JOBS,
+                                 events_buffer=config.EVENTS_BUFFER_SIZE)
+            await worker.run()
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+        await app.cleanup()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(run(main(sys.argv[1:])))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,3 @@
+#!/bin/bash
+export APP_CONFIG=config:DevelopmentConfig
+python worker.py